@@ -0,0 +1,110 @@
+"""
+Compara los dos modos de destino de los elementos 'rango' sobre los mismos TSS:
+
+- imagen: dibujar el rango con Pillow y guardarlo como PNG (lo que se inserta en el SID)
+- celdas: copiar valores, estilos, combinadas y medidas con openpyxl en una hoja nueva
+
+Uso: python benchmark_rangos.py --config config.json --tss TSS --repeticiones 3
+"""
+import argparse
+import io
+import os
+import time
+from collections import defaultdict
+
+from openpyxl import Workbook
+from openpyxl.utils.cell import range_boundaries
+
+from copia_celdas import BloqueCeldas
+from plan_extraccion import cargar_plan
+from render_rangos import RenderizadorRangos, colores_tema
+from sesion_tss import SesionTSS
+
+
+def _medir(funcion, repeticiones):
+    """Mejor tiempo en ms de varias repeticiones y el resultado de la última"""
+    mejor = None
+    resultado = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        transcurrido = (time.perf_counter() - inicio) * 1000
+        mejor = transcurrido if mejor is None else min(mejor, transcurrido)
+    return mejor, resultado
+
+
+def medir_tss(path, plan, repeticiones):
+    """{nombre: (ms imagen, bytes PNG, ms celdas, celdas copiadas)} de los rangos del TSS"""
+    sesion = SesionTSS(path)
+    try:
+        renderizador = RenderizadorRangos(sesion.workbook)
+        tema = colores_tema(sesion.workbook)
+        medios = sesion.medios
+        resultados = {}
+
+        for elemento in plan.por_tipo['rango']:
+            sheet_index = plan.indice_origen(elemento)
+            hoja = sesion.hoja(sheet_index)
+            rango = elemento['origen']['rango']
+
+            def _imagen():
+                min_col, min_row, max_col, max_row = range_boundaries(rango)
+                imagenes = [(e.valor, medios.leer_bytes(e.valor)) for e in
+                            medios.indice_imagenes(sheet_index).superpuestos(min_row, min_col, max_row, max_col)]
+                salida = io.BytesIO()
+                renderizador.renderizar(hoja, rango, imagenes).save(salida, format='PNG')
+                return salida.tell()
+
+            def _celdas():
+                bloque = BloqueCeldas.desde_hoja(hoja, rango, tema)
+                bloque.aplicar_openpyxl(Workbook().active, 'A1')
+                return len(bloque.celdas)
+
+            ms_imagen, bytes_png = _medir(_imagen, repeticiones)
+            ms_celdas, total_celdas = _medir(_celdas, repeticiones)
+            resultados[elemento['nombre']] = (ms_imagen, bytes_png, ms_celdas, total_celdas)
+        return resultados
+    finally:
+        sesion.cerrar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de rangos: imagen (Pillow) vs copia de celdas")
+    parser.add_argument("--config", default="config.json", help="Archivo de configuración JSON")
+    parser.add_argument("--tss", default="TSS", help="Carpeta con los TSS")
+    parser.add_argument("--repeticiones", type=int, default=3, help="Repeticiones por medición (se toma la mejor)")
+    args = parser.parse_args()
+
+    plan = cargar_plan(args.config)
+    archivos = sorted(os.path.join(args.tss, f) for f in os.listdir(args.tss)
+                      if f.endswith('.xlsx') and not f.startswith('~$'))
+    if not archivos:
+        print(f"⚠️ No hay TSS en {args.tss}")
+        return
+
+    totales = defaultdict(lambda: [0.0, 0, 0.0])
+    for path in archivos:
+        print(f"\n📄 {os.path.basename(path)}")
+        print(f"   {'rango':<40} {'imagen ms':>10} {'PNG KB':>8} {'celdas ms':>10} {'celdas':>7}")
+        for nombre, (ms_imagen, bytes_png, ms_celdas, total_celdas) in medir_tss(path, plan, args.repeticiones).items():
+            print(f"   {nombre:<40} {ms_imagen:>10.1f} {bytes_png / 1024:>8.1f} {ms_celdas:>10.1f} {total_celdas:>7}")
+            acumulado = totales[nombre]
+            acumulado[0] += ms_imagen
+            acumulado[1] += bytes_png
+            acumulado[2] += ms_celdas
+
+    print("\n" + "=" * 50)
+    print(" TOTAL POR MODO ")
+    print("=" * 50)
+    ms_imagen = sum(t[0] for t in totales.values())
+    ms_celdas = sum(t[2] for t in totales.values())
+    bytes_png = sum(t[1] for t in totales.values())
+    print(f"🖼️ imagen: {ms_imagen:.1f} ms, {bytes_png / 1024 / 1024:.2f} MB de PNG a insertar")
+    print(f"🔢 celdas: {ms_celdas:.1f} ms, sin imágenes")
+    if ms_celdas:
+        print(f"⚡ celdas es {ms_imagen / ms_celdas:.1f}x más rápido en extracción + escritura")
+    print("ℹ️ No incluye la inserción en el SID por Excel (Pictures.add vs pegado de celdas)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+from copia_celdas import BloqueCeldas
+from imagenes import OPCIONES_SALIDA, MetadatosImagen
+
+CACHE_FOLDER = "cache_extraccion"
+CACHE_MAX_MB = 2048
+# Subir si cambia el formato de lo guardado para invalidar entradas antiguas
+VERSION_CACHE = 4
+
+
+def hash_archivo(path, bloque=1024 * 1024):
+    """SHA-256 del contenido del archivo, leído por bloques"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(bloque), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def hash_config_extraccion(config, captura=None):
+    """
+    Hash de la parte de la configuración que afecta a la extracción.
+
+    Solo cuentan el origen y tipo de cada elemento, su tamaño destino (las
+    imágenes se reducen a él), el modo de los rangos (imagen o celdas), las hojas TSS, los campos de nombre/id y las
+    opciones de imágenes: cambiar celdas destino o la plantilla no invalida la cache.
+    captura es el backend de captura de rangos ya resuelto (config o CLI): cada
+    backend tiene sus propias entradas, así se comparan con las mismas entradas.
+    """
+    relevante = {
+        'version': VERSION_CACHE,
+        'captura': captura,
+        'elementos': [
+            {'nombre': e['nombre'], 'tipo': e['tipo'], 'origen': e['origen'],
+             'tamano': [e['destino'].get('ancho'), e['destino'].get('alto')],
+             'modo': e['destino'].get('modo')}
+            for e in config['elementos']
+        ],
+        'hojas_tss': config['hojas']['tss'],
+        'campos': config['nombre_sid']['campos'],
+        'imagenes': {k: v for k, v in config.get('imagenes', {}).items() if k in OPCIONES_SALIDA},
+    }
+    texto = json.dumps(relevante, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+
+def _tamano_carpeta(path):
+    total = 0
+    for raiz, _, archivos in os.walk(path):
+        for archivo in archivos:
+            try:
+                total += os.path.getsize(os.path.join(raiz, archivo))
+            except OSError:
+                pass
+    return total
+
+
+class CacheExtraccion:
+    """
+    Cache en disco de lo extraído de cada TSS (textos, imágenes, fotos de antenas
+    y metadatos de las imágenes).
+
+    La clave es hash(contenido del TSS) + hash(config de extracción). Cada entrada
+    es una carpeta con entrada.json y los archivos copiados; la fecha de
+    modificación de entrada.json marca el último uso para el desalojo LRU por tamaño.
+    """
+
+    def __init__(self, config, folder=CACHE_FOLDER, max_mb=CACHE_MAX_MB, captura=None):
+        self.folder = folder
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hash_config = hash_config_extraccion(config, captura)
+        self.aciertos = 0
+        self.fallos = 0
+        os.makedirs(self.folder, exist_ok=True)
+
+    def clave(self, hash_tss):
+        """Clave de la entrada a partir del hash del contenido del TSS (ver hash_archivo)"""
+        return f"{hash_tss[:32]}_{self.hash_config[:16]}"
+
+    def restaurar(self, clave, tss_instance):
+        """Copia la entrada cacheada a resultados_dir y rellena tss_instance.data. True si hubo acierto"""
+        entrada_dir = os.path.join(self.folder, clave)
+        entrada_path = os.path.join(entrada_dir, "entrada.json")
+        if not os.path.exists(entrada_path):
+            self.fallos += 1
+            return False
+
+        try:
+            with open(entrada_path, encoding='utf-8') as f:
+                entrada = json.load(f)
+
+            destino = tss_instance.resultados_dir
+            for relativo in entrada['archivos']:
+                origen = os.path.join(entrada_dir, relativo)
+                final = os.path.join(destino, relativo)
+                os.makedirs(os.path.dirname(final), exist_ok=True)
+                shutil.copyfile(origen, final)
+
+            tss_instance.data['textos'].update(entrada['textos'])
+            tss_instance.data['celdas'].update(
+                {nombre: BloqueCeldas.desde_dict(bloque) for nombre, bloque in entrada['celdas'].items()})
+            for nombre, relativo in entrada['imagenes'].items():
+                tss_instance.data['imagenes'][nombre] = os.path.join(destino, relativo)
+            tss_instance.data['antenas'] = [
+                dict(foto, archivo=os.path.join(destino, foto['archivo'])) for foto in entrada['antenas']
+            ]
+            tss_instance.data['metadatos'].update(
+                {relativo: MetadatosImagen(*valores) for relativo, valores in entrada['metadatos'].items()})
+
+            os.utime(entrada_path)  # Marca de uso para LRU
+            self.aciertos += 1
+            return True
+
+        except Exception as e:
+            print(f"⚠️ Entrada de cache corrupta {clave}, se vuelve a extraer: {str(e)}")
+            shutil.rmtree(entrada_dir, ignore_errors=True)
+            self.fallos += 1
+            return False
+
+    def guardar(self, clave, tss_instance):
+        """Guarda textos, imágenes y fotos de antenas de la instancia bajo la clave"""
+        origen_dir = tss_instance.resultados_dir
+        entrada_dir = os.path.join(self.folder, clave)
+        temporal = f"{entrada_dir}.tmp{os.getpid()}"
+
+        try:
+            shutil.rmtree(temporal, ignore_errors=True)
+            os.makedirs(temporal)
+            archivos = []
+
+            def _copiar(path):
+                relativo = os.path.relpath(path, origen_dir)
+                final = os.path.join(temporal, relativo)
+                os.makedirs(os.path.dirname(final), exist_ok=True)
+                shutil.copyfile(path, final)
+                archivos.append(relativo)
+                return relativo
+
+            imagenes = {nombre: _copiar(path) for nombre, path in tss_instance.data['imagenes'].items()
+                        if path and os.path.exists(path)}
+            antenas = [dict(foto, archivo=_copiar(foto['archivo'])) for foto in tss_instance.data.get('antenas', [])
+                       if os.path.exists(foto['archivo'])]
+
+            entrada = {
+                'tss': os.path.basename(tss_instance.file_path),
+                'creado': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'textos': tss_instance.data['textos'],
+                'celdas': {nombre: bloque.a_dict() for nombre, bloque in tss_instance.data['celdas'].items()},
+                'imagenes': imagenes,
+                'antenas': antenas,
+                'metadatos': {relativo: list(m) for relativo, m in tss_instance.data['metadatos'].items()
+                              if relativo in archivos},
+                'archivos': archivos,
+            }
+            with open(os.path.join(temporal, "entrada.json"), 'w', encoding='utf-8') as f:
+                json.dump(entrada, f, ensure_ascii=False, indent=2)
+
+            shutil.rmtree(entrada_dir, ignore_errors=True)
+            os.replace(temporal, entrada_dir)
+            self._desalojar()
+
+        except Exception as e:
+            print(f"⚠️ No se pudo guardar en cache {clave}: {str(e)}")
+            shutil.rmtree(temporal, ignore_errors=True)
+
+    def _desalojar(self):
+        """Elimina las entradas menos usadas hasta quedar bajo el tamaño máximo"""
+        entradas = []
+        for nombre in os.listdir(self.folder):
+            entrada_path = os.path.join(self.folder, nombre, "entrada.json")
+            if os.path.exists(entrada_path):
+                ruta = os.path.join(self.folder, nombre)
+                entradas.append((os.path.getmtime(entrada_path), _tamano_carpeta(ruta), ruta))
+
+        total = sum(tamano for _, tamano, _ in entradas)
+        for _, tamano, ruta in sorted(entradas):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(ruta, ignore_errors=True)
+            total -= tamano
+            print(f"🧹 Cache: desalojada {os.path.basename(ruta)} ({tamano / 1024 / 1024:.1f} MB)")
@@ -0,0 +1,74 @@
+import os
+import shutil
+from collections import defaultdict
+
+CACHE_RANGOS_FOLDER = "cache_rangos"
+CACHE_RANGOS_MAX_MB = 512
+
+
+class CacheRangos:
+    """
+    Cache en disco de las imágenes de elementos 'rango', compartida por todo el lote.
+
+    La clave es la huella del rango (RenderizadorRangos.huella), así que un rango
+    repetido entre ejecuciones o entre sitios con el mismo texto fijo se copia
+    sin volver a dibujarlo. Cada entrada es un PNG; su fecha de modificación
+    marca el último uso para el desalojo LRU por tamaño.
+    """
+
+    def __init__(self, folder=CACHE_RANGOS_FOLDER, max_mb=CACHE_RANGOS_MAX_MB):
+        self.folder = folder
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.por_elemento = defaultdict(lambda: [0, 0])  # nombre -> [aciertos, fallos]
+        os.makedirs(self.folder, exist_ok=True)
+
+    def _ruta(self, huella):
+        return os.path.join(self.folder, f"{huella}.png")
+
+    def restaurar(self, nombre, huella, destino):
+        """Copia la imagen cacheada a destino. True si hubo acierto"""
+        ruta = self._ruta(huella)
+        if not os.path.exists(ruta):
+            self.por_elemento[nombre][1] += 1
+            return False
+        try:
+            shutil.copyfile(ruta, destino)
+            os.utime(ruta)  # Marca de uso para LRU
+        except OSError as e:
+            print(f"⚠️ No se pudo leer la cache del rango '{nombre}': {str(e)}")
+            self.por_elemento[nombre][1] += 1
+            return False
+        self.por_elemento[nombre][0] += 1
+        return True
+
+    def guardar(self, huella, origen):
+        ruta = self._ruta(huella)
+        temporal = f"{ruta}.tmp{os.getpid()}"
+        try:
+            shutil.copyfile(origen, temporal)
+            os.replace(temporal, ruta)
+            self._desalojar()
+        except OSError as e:
+            print(f"⚠️ No se pudo guardar el rango en cache: {str(e)}")
+            if os.path.exists(temporal):
+                os.remove(temporal)
+
+    def _desalojar(self):
+        """Elimina las imágenes menos usadas hasta quedar bajo el tamaño máximo"""
+        entradas = []
+        for nombre in os.listdir(self.folder):
+            ruta = os.path.join(self.folder, nombre)
+            if nombre.endswith('.png'):
+                entradas.append((os.path.getmtime(ruta), os.path.getsize(ruta), ruta))
+
+        total = sum(tamano for _, tamano, _ in entradas)
+        for _, tamano, ruta in sorted(entradas):
+            if total <= self.max_bytes:
+                break
+            os.remove(ruta)
+            total -= tamano
+
+    def imprimir_resumen(self):
+        print("🗃️ Cache de rangos (aciertos/fallos por elemento):")
+        for nombre, (aciertos, fallos) in sorted(self.por_elemento.items()):
+            print(f"   {nombre}: {aciertos}/{fallos}")
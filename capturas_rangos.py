@@ -0,0 +1,282 @@
+import os
+import shutil
+import time
+
+from openpyxl.utils.cell import range_boundaries
+from PIL import ImageGrab
+
+from imagenes import MetadatosImagen, metadatos_de_archivo
+from render_rangos import RenderizadorRangos
+
+# pywin32 solo existe en Windows: sin él no hay backend 'excel', el resto funciona igual
+try:
+    import win32com.client as win32
+    import win32con
+    import win32gui
+except ImportError:
+    win32 = win32con = win32gui = None
+
+CAPTURAS_GRABADAS = "capturas_grabadas"
+OPCIONES_CAPTURA = {
+    'backend': 'pillow',
+    'grabar': False,  # Copia cada captura a carpeta_grabaciones para reproducirla luego con 'replay'
+    'carpeta_grabaciones': CAPTURAS_GRABADAS,
+}
+
+
+def listar_ventanas_office():
+    office_windows = []
+
+    def callback(hwnd, _):
+        title = win32gui.GetWindowText(hwnd)
+        class_name = win32gui.GetClassName(hwnd)
+        if (win32gui.IsWindowVisible(hwnd) and title and
+                ("Excel" in title or "Office" in title or class_name in ['NUIDialog', '#32770'])):
+            office_windows.append((hwnd, title, class_name))
+
+    win32gui.EnumWindows(callback, None)
+    return office_windows
+
+
+def cerrar_dialogos_office():
+    dialogs_closed = 0
+    windows = listar_ventanas_office()
+    for hwnd, title, class_name in windows:
+        try:
+            if class_name in ['NUIDialog', '#32770'] and "Excel" not in title:
+                win32gui.PostMessage(hwnd, win32con.WM_CLOSE, 0, 0)
+                time.sleep(2)
+                if win32gui.IsWindow(hwnd):
+                    win32gui.SendMessage(hwnd, win32con.WM_SYSCOMMAND, win32con.SC_CLOSE, 0)
+                    time.sleep(1)
+                if not win32gui.IsWindow(hwnd):
+                    dialogs_closed += 1
+        except:
+            pass
+    return dialogs_closed
+
+
+def clave_grabacion(tss_instance):
+    """Carpeta de grabación de un TSS: su nombre de archivo, estable entre máquinas"""
+    return os.path.splitext(os.path.basename(tss_instance.file_path))[0]
+
+
+class CapturaRangos:
+    """
+    Backend de captura de elementos 'rango'.
+
+    capturar recibe {nombre: {'rango', 'hoja', 'indice'}} (índice de hoja TSS base 0),
+    guarda un PNG por rango en la carpeta de resultados de la instancia,
+    registra sus metadatos y devuelve {nombre: ruta o None}.
+    """
+
+    nombre = None
+
+    def capturar(self, tss_instance, rangos):
+        raise NotImplementedError
+
+    def cerrar(self):
+        pass
+
+    @staticmethod
+    def _ruta_salida(tss_instance, nombre):
+        os.makedirs(tss_instance.resultados_dir, exist_ok=True)
+        return os.path.join(tss_instance.resultados_dir, f"{nombre}.png")
+
+    @staticmethod
+    def _registrar(tss_instance, ruta, img=None):
+        if img is None:
+            metadatos = metadatos_de_archivo(ruta)
+        else:
+            metadatos = MetadatosImagen(img.width, img.height, 'PNG', os.path.getsize(ruta))
+        tss_instance.registrar_metadatos(ruta, metadatos)
+
+
+class CapturaExcel(CapturaRangos):
+    """CopyPicture de Excel por COM y lectura del portapapeles (solo Windows con Excel)"""
+
+    nombre = 'excel'
+
+    def __init__(self):
+        if win32 is None:
+            raise ValueError("El backend de captura 'excel' requiere pywin32 y Excel (solo Windows)")
+
+    def capturar(self, tss_instance, rangos):
+        excel = None
+        resultados = {}
+        wb = None
+
+        try:
+            excel = win32.gencache.EnsureDispatch('Excel.Application')
+            excel.Visible = True
+            excel.DisplayAlerts = False
+
+            wb = excel.Workbooks.Open(os.path.abspath(tss_instance.file_path))
+            cerrar_dialogos_office()
+
+            for nombre, config in rangos.items():
+                output_path = self._ruta_salida(tss_instance, nombre)
+                sheet = wb.Sheets(config['indice'] + 1)
+
+                for intento in range(3):
+                    try:
+                        sheet.Range(config['rango']).CopyPicture(Appearance=1, Format=2)
+                        time.sleep(2)
+
+                        img = ImageGrab.grabclipboard()
+                        if img:
+                            img.save(output_path)
+                            self._registrar(tss_instance, output_path, img)
+                            resultados[nombre] = output_path
+                            print(f"✅ {nombre} guardado en {output_path}")
+                            break
+                    except Exception as e:
+                        print(f"⚠️ Intento {intento + 1} para {nombre}: {str(e)}")
+                        time.sleep(1)
+                else:
+                    resultados[nombre] = None
+                    print(f"❌ No se pudo capturar el rango '{nombre}'")
+
+            return resultados
+
+        except Exception as e:
+            print(f"❌ Error crítico en captura de rangos: {str(e)}")
+            return {}  # Retornar diccionario vacío en caso de error crítico
+
+        finally:
+            # Cerrar todo correctamente
+            try:
+                if wb is not None:
+                    wb.Close(SaveChanges=False)
+            except Exception as e:
+                print(f"⚠️ Error cerrando libro: {str(e)}")
+            try:
+                if excel is not None:
+                    excel.DisplayAlerts = False
+                    excel.Quit()
+            except Exception as e:
+                print(f"⚠️ Error cerrando Excel: {str(e)}")
+            # Liberar recursos COM
+            del wb
+            del excel
+
+
+class CapturaPillow(CapturaRangos):
+    """Dibuja los rangos con el workbook de la sesión (sin Excel ni portapapeles)"""
+
+    nombre = 'pillow'
+
+    def __init__(self, cache_rangos=None):
+        self.cache_rangos = cache_rangos
+
+    def capturar(self, tss_instance, rangos):
+        sesion = tss_instance.sesion
+        medios = sesion.medios
+        renderizador = RenderizadorRangos(sesion.workbook)
+        resultados = {}
+
+        for nombre, config in rangos.items():
+            output_path = self._ruta_salida(tss_instance, nombre)
+            try:
+                min_col, min_row, max_col, max_row = range_boundaries(config['rango'])
+                hoja = sesion.hoja(config['indice'])
+                # Imágenes que se solapan con el rango (ej. fotos dentro de una tabla)
+                anclas = [e.valor for e in
+                          medios.indice_imagenes(config['indice']).superpuestos(min_row, min_col, max_row, max_col)]
+
+                inicio = time.monotonic()
+                huella = None
+                if self.cache_rangos:
+                    huella = renderizador.huella(hoja, config['rango'],
+                                                 [(ancla, medios.firma_medio(ancla)) for ancla in anclas])
+                    if self.cache_rangos.restaurar(nombre, huella, output_path):
+                        self._registrar(tss_instance, output_path)
+                        resultados[nombre] = output_path
+                        print(f"🗃️ {nombre} tomado de la cache en {time.monotonic() - inicio:.2f} s")
+                        continue
+
+                img = renderizador.renderizar(hoja, config['rango'],
+                                              [(ancla, medios.leer_bytes(ancla)) for ancla in anclas])
+                img.save(output_path)
+                if huella:
+                    self.cache_rangos.guardar(huella, output_path)
+                self._registrar(tss_instance, output_path, img)
+                resultados[nombre] = output_path
+                print(f"✅ {nombre} dibujado en {time.monotonic() - inicio:.2f} s ({img.width}x{img.height})")
+            except Exception as e:
+                resultados[nombre] = None
+                print(f"❌ No se pudo dibujar el rango '{nombre}': {str(e)}")
+
+        return resultados
+
+
+class CapturaGrabada(CapturaRangos):
+    """
+    Sirve PNG capturados antes (carpeta_grabaciones/<TSS>/<nombre>.png).
+
+    Permite medir el resto del pipeline sin Excel ni renderizado, y comparar
+    backends con las mismas imágenes de entrada.
+    """
+
+    nombre = 'replay'
+
+    def __init__(self, carpeta=CAPTURAS_GRABADAS):
+        if not os.path.isdir(carpeta):
+            raise ValueError(f"No existe la carpeta de capturas grabadas: {carpeta}")
+        self.carpeta = carpeta
+
+    def capturar(self, tss_instance, rangos):
+        resultados = {}
+        origen_tss = os.path.join(self.carpeta, clave_grabacion(tss_instance))
+        for nombre in rangos:
+            grabada = os.path.join(origen_tss, f"{nombre}.png")
+            if not os.path.exists(grabada):
+                resultados[nombre] = None
+                print(f"⚠️ Sin captura grabada para '{nombre}' en {origen_tss}")
+                continue
+            output_path = self._ruta_salida(tss_instance, nombre)
+            shutil.copyfile(grabada, output_path)
+            self._registrar(tss_instance, output_path)
+            resultados[nombre] = output_path
+        return resultados
+
+
+class GrabadorCapturas(CapturaRangos):
+    """Envuelve otro backend y guarda una copia de cada captura para el backend 'replay'"""
+
+    def __init__(self, backend, carpeta=CAPTURAS_GRABADAS):
+        self.backend = backend
+        self.nombre = backend.nombre
+        self.carpeta = carpeta
+
+    def capturar(self, tss_instance, rangos):
+        resultados = self.backend.capturar(tss_instance, rangos)
+        destino_tss = os.path.join(self.carpeta, clave_grabacion(tss_instance))
+        os.makedirs(destino_tss, exist_ok=True)
+        for nombre, ruta in resultados.items():
+            if ruta and os.path.exists(ruta):
+                shutil.copyfile(ruta, os.path.join(destino_tss, f"{nombre}.png"))
+        return resultados
+
+    def cerrar(self):
+        self.backend.cerrar()
+
+
+BACKENDS_CAPTURA = ('excel', 'pillow', 'replay')
+
+
+def crear_captura(opciones, cache_rangos=None):
+    """Backend según las opciones 'captura_rangos' (ver OPCIONES_CAPTURA)"""
+    backend = opciones['backend']
+    if backend == 'excel':
+        captura = CapturaExcel()
+    elif backend == 'pillow':
+        captura = CapturaPillow(cache_rangos)
+    elif backend == 'replay':
+        captura = CapturaGrabada(opciones['carpeta_grabaciones'])
+    else:
+        raise ValueError(f"Backend de captura desconocido {backend!r}; opciones: {BACKENDS_CAPTURA}")
+
+    if opciones['grabar'] and backend != 'replay':
+        captura = GrabadorCapturas(captura, opciones['carpeta_grabaciones'])
+    return captura
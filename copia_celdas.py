@@ -0,0 +1,295 @@
+import datetime
+
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+from openpyxl.utils import column_index_from_string, get_column_letter
+from openpyxl.utils.cell import coordinate_to_tuple, range_boundaries
+
+from render_rangos import color_rgb
+
+LADOS_BORDE = ('left', 'right', 'top', 'bottom')
+
+# Constantes de Excel para aplicar los estilos por COM (xlwings)
+XL_BORDES = {'left': 7, 'top': 8, 'bottom': 9, 'right': 10}
+XL_HORIZONTAL = {'general': 1, 'left': -4131, 'center': -4108, 'right': -4152, 'fill': 5,
+                 'justify': -4130, 'centerContinuous': 7, 'distributed': -4117}
+XL_VERTICAL = {'top': -4160, 'center': -4108, 'bottom': -4107, 'justify': -4130, 'distributed': -4117}
+# Estilo de borde de openpyxl -> (LineStyle, Weight)
+XL_LINEAS = {
+    'hair': (1, 1), 'thin': (1, 2), 'medium': (1, -4138), 'thick': (1, 4), 'double': (-4119, 4),
+    'dashed': (-4115, 2), 'mediumDashed': (-4115, -4138), 'dotted': (-4118, 2),
+    'dashDot': (4, 2), 'mediumDashDot': (4, -4138), 'dashDotDot': (5, 2), 'mediumDashDotDot': (5, -4138),
+    'slantDashDot': (13, -4138),
+}
+XL_SUBRAYADO = {True: 2, False: -4142}
+# Excel limita la dirección de un Range a 255 caracteres
+MAX_DIRECCION = 250
+
+_TIPOS_FECHA = (('datetime', datetime.datetime), ('date', datetime.date), ('time', datetime.time))
+
+
+def _hex(rgb):
+    return None if rgb is None else '%02X%02X%02X' % rgb
+
+
+def _rgb(hexa):
+    return tuple(int(hexa[i:i + 2], 16) for i in (0, 2, 4))
+
+
+def _valor_a_json(valor):
+    for tipo, clase in _TIPOS_FECHA:
+        if isinstance(valor, clase):
+            return {tipo: valor.isoformat()}
+    return valor
+
+
+def _valor_desde_json(valor):
+    if isinstance(valor, dict):
+        tipo, iso = next(iter(valor.items()))
+        return dict(_TIPOS_FECHA)[tipo].fromisoformat(iso)
+    return valor
+
+
+class BloqueCeldas:
+    """
+    Copia de un rango de celdas (valores, estilos, combinadas, anchos y altos)
+    independiente del libro de origen, para pegarlo como celdas en el SID.
+
+    Los colores de tema se resuelven a RGB con el tema del TSS, así que el
+    resultado no depende del tema de la plantilla. Se serializa a JSON para
+    la cache de extracción (a_dict / desde_dict).
+    """
+
+    def __init__(self, filas, columnas, anchos, altos, combinadas, celdas, estilos):
+        self.filas = filas
+        self.columnas = columnas
+        self.anchos = anchos  # Ancho en caracteres por columna; None = por defecto, 0 = oculta
+        self.altos = altos  # Alto en puntos por fila; None = por defecto, 0 = oculta
+        self.combinadas = combinadas  # [(fila, col, fila_fin, col_fin)] relativas al rango, base 0
+        self.celdas = celdas  # [(fila, col, valor, índice de estilo o None)] relativas, base 0
+        self.estilos = estilos
+
+    @classmethod
+    def desde_hoja(cls, ws, rango, tema):
+        """:param tema: colores del tema del libro (ver render_rangos.colores_tema)"""
+        min_col, min_row, max_col, max_row = range_boundaries(rango)
+
+        anchos_hoja = {}
+        for dimension in ws.column_dimensions.values():
+            # min/max solo vienen rellenos en hojas leídas de archivo
+            desde = dimension.min or column_index_from_string(dimension.index)
+            ancho = 0 if dimension.hidden else dimension.width
+            for col in range(desde, (dimension.max or desde) + 1):
+                anchos_hoja[col] = ancho
+        anchos = [anchos_hoja.get(col) for col in range(min_col, max_col + 1)]
+
+        altos = []
+        for fila in range(min_row, max_row + 1):
+            dimension = ws.row_dimensions.get(fila)  # get: no crea filas vacías en la hoja
+            if dimension is None:
+                altos.append(None)
+            else:
+                altos.append(0 if dimension.hidden else dimension.height)
+
+        combinadas = []
+        for combinado in sorted(ws.merged_cells.ranges, key=lambda c: c.bounds):
+            if (combinado.min_row >= min_row and combinado.max_row <= max_row
+                    and combinado.min_col >= min_col and combinado.max_col <= max_col):
+                combinadas.append((combinado.min_row - min_row, combinado.min_col - min_col,
+                                   combinado.max_row - min_row, combinado.max_col - min_col))
+
+        # Un estilo por combinación de estilos del libro, como en RenderizadorRangos.huella
+        estilos, por_estilo, indices = [], {}, {}
+        celdas = []
+        for fila_celdas in ws.iter_rows(min_row=min_row, max_row=max_row, min_col=min_col, max_col=max_col):
+            for celda in fila_celdas:
+                if celda.value is None and not celda.has_style:
+                    continue
+                indice = None
+                if celda.has_style:
+                    clave = tuple(celda._style)
+                    if clave not in indices:
+                        estilo = cls._estilo_de_celda(celda, tema)
+                        firma = repr(sorted(estilo.items()))
+                        if firma not in por_estilo:
+                            por_estilo[firma] = len(estilos)
+                            estilos.append(estilo)
+                        indices[clave] = por_estilo[firma]
+                    indice = indices[clave]
+                celdas.append((celda.row - min_row, celda.column - min_col, celda.value, indice))
+
+        return cls(max_row - min_row + 1, max_col - min_col + 1, anchos, altos, combinadas, celdas, estilos)
+
+    @staticmethod
+    def _estilo_de_celda(celda, tema):
+        font = celda.font
+        fill = celda.fill
+        relleno = None
+        if fill is not None and fill.fill_type == 'solid':
+            relleno = _hex(color_rgb(fill.fgColor, tema))
+        bordes = {}
+        for lado in LADOS_BORDE:
+            borde = getattr(celda.border, lado)
+            if borde is not None and borde.style:
+                bordes[lado] = [borde.style, _hex(color_rgb(borde.color, tema))]
+        alineacion = celda.alignment
+        return {
+            'fuente': [font.name, font.sz, bool(font.b), bool(font.i), bool(font.u),
+                       _hex(color_rgb(font.color, tema))],
+            'relleno': relleno,
+            'bordes': bordes,
+            'alineacion': [alineacion.horizontal, alineacion.vertical, bool(alineacion.wrap_text)],
+            'formato': celda.number_format,
+        }
+
+    def a_dict(self):
+        return {
+            'filas': self.filas,
+            'columnas': self.columnas,
+            'anchos': self.anchos,
+            'altos': self.altos,
+            'combinadas': [list(c) for c in self.combinadas],
+            'celdas': [[f, c, _valor_a_json(v), e] for f, c, v, e in self.celdas],
+            'estilos': self.estilos,
+        }
+
+    @classmethod
+    def desde_dict(cls, datos):
+        return cls(datos['filas'], datos['columnas'], datos['anchos'], datos['altos'],
+                   [tuple(c) for c in datos['combinadas']],
+                   [(f, c, _valor_desde_json(v), e) for f, c, v, e in datos['celdas']],
+                   datos['estilos'])
+
+    # Escritura con openpyxl
+
+    def aplicar_openpyxl(self, ws, celda):
+        """Pega el bloque con su esquina superior izquierda en la celda destino"""
+        fila0, col0 = coordinate_to_tuple(celda)
+        fila_fin, col_fin = fila0 + self.filas - 1, col0 + self.columnas - 1
+
+        # Deshacer combinadas que tocan el área y vaciarla antes de pegar
+        for combinado in list(ws.merged_cells.ranges):
+            if not (combinado.max_row < fila0 or combinado.min_row > fila_fin
+                    or combinado.max_col < col0 or combinado.min_col > col_fin):
+                ws.unmerge_cells(combinado.coord)
+        for fila_celdas in ws.iter_rows(min_row=fila0, max_row=fila_fin, min_col=col0, max_col=col_fin):
+            for destino in fila_celdas:
+                destino.value = None
+
+        for i, ancho in enumerate(self.anchos):
+            if ancho is not None:
+                dimension = ws.column_dimensions[get_column_letter(col0 + i)]
+                if ancho:
+                    dimension.width = ancho
+                else:
+                    dimension.hidden = True
+        for i, alto in enumerate(self.altos):
+            if alto is not None:
+                dimension = ws.row_dimensions[fila0 + i]
+                if alto:
+                    dimension.height = alto
+                else:
+                    dimension.hidden = True
+
+        # Combinar antes de escribir: las celdas cubiertas conservan su estilo (bordes)
+        for f, c, f_fin, c_fin in self.combinadas:
+            ws.merge_cells(start_row=fila0 + f, start_column=col0 + c,
+                           end_row=fila0 + f_fin, end_column=col0 + c_fin)
+
+        estilos = [self._estilo_openpyxl(e) for e in self.estilos]
+        for f, c, valor, indice in self.celdas:
+            destino = ws.cell(fila0 + f, col0 + c)
+            if valor is not None:
+                destino.value = valor
+            if indice is not None:
+                destino.font, destino.fill, destino.border, destino.alignment, destino.number_format = \
+                    estilos[indice]
+
+    @staticmethod
+    def _estilo_openpyxl(estilo):
+        nombre, tamano, negrita, cursiva, subrayado, color = estilo['fuente']
+        font = Font(name=nombre, sz=tamano, b=negrita, i=cursiva,
+                    u='single' if subrayado else None, color=color and f"FF{color}")
+        if estilo['relleno']:
+            fill = PatternFill(fill_type='solid', fgColor=f"FF{estilo['relleno']}")
+        else:
+            fill = PatternFill()
+        border = Border(**{lado: Side(style=tipo, color=color and f"FF{color}")
+                           for lado, (tipo, color) in estilo['bordes'].items()})
+        horizontal, vertical, ajustar = estilo['alineacion']
+        alignment = Alignment(horizontal=horizontal, vertical=vertical, wrap_text=ajustar)
+        return font, fill, border, alignment, estilo['formato']
+
+    # Escritura con xlwings (Excel)
+
+    def aplicar_xlwings(self, sheet, celda):
+        """Pega el bloque en una hoja de xlwings: valores en un solo Range y estilos agrupados"""
+        fila0, col0 = coordinate_to_tuple(celda)
+        area = sheet.range((fila0, col0), (fila0 + self.filas - 1, col0 + self.columnas - 1))
+        area.unmerge()
+
+        matriz = [[None] * self.columnas for _ in range(self.filas)]
+        for f, c, valor, _ in self.celdas:
+            matriz[f][c] = valor
+        area.value = matriz
+
+        # En Excel ancho/alto 0 equivale a oculta
+        for i, ancho in enumerate(self.anchos):
+            if ancho is not None:
+                sheet.range((fila0, col0 + i)).column_width = ancho
+        for i, alto in enumerate(self.altos):
+            if alto is not None:
+                sheet.range((fila0 + i, col0)).row_height = alto
+
+        for f, c, f_fin, c_fin in self.combinadas:
+            sheet.range((fila0 + f, col0 + c), (fila0 + f_fin, col0 + c_fin)).merge()
+
+        # Un Range de varias áreas por estilo: pocas llamadas COM aunque haya muchas celdas
+        direcciones = {}
+        for f, c, _, indice in self.celdas:
+            if indice is not None:
+                direcciones.setdefault(indice, []).append(f"{get_column_letter(col0 + c)}{fila0 + f}")
+        for indice, celdas in direcciones.items():
+            for grupo in self._agrupar_direcciones(celdas):
+                self._estilo_xlwings(sheet.range(grupo), self.estilos[indice])
+
+    @staticmethod
+    def _agrupar_direcciones(celdas):
+        grupo = []
+        for direccion in celdas:
+            if grupo and len(','.join(grupo)) + len(direccion) + 1 > MAX_DIRECCION:
+                yield ','.join(grupo)
+                grupo = []
+            grupo.append(direccion)
+        if grupo:
+            yield ','.join(grupo)
+
+    @staticmethod
+    def _estilo_xlwings(rng, estilo):
+        nombre, tamano, negrita, cursiva, subrayado, color = estilo['fuente']
+        api = rng.api
+        if nombre:
+            rng.font.name = nombre
+        if tamano:
+            rng.font.size = tamano
+        rng.font.bold = negrita
+        rng.font.italic = cursiva
+        api.Font.Underline = XL_SUBRAYADO[subrayado]
+        if color:
+            rng.font.color = _rgb(color)
+        if estilo['relleno']:
+            rng.color = _rgb(estilo['relleno'])
+        rng.number_format = estilo['formato']
+
+        horizontal, vertical, ajustar = estilo['alineacion']
+        if horizontal in XL_HORIZONTAL:
+            api.HorizontalAlignment = XL_HORIZONTAL[horizontal]
+        if vertical in XL_VERTICAL:
+            api.VerticalAlignment = XL_VERTICAL[vertical]
+        api.WrapText = ajustar
+
+        for lado, (tipo, color) in estilo['bordes'].items():
+            borde = api.Borders(XL_BORDES[lado])
+            borde.LineStyle, borde.Weight = XL_LINEAS.get(tipo, XL_LINEAS['thin'])
+            if color:
+                r, g, b = _rgb(color)
+                borde.Color = r + g * 256 + b * 65536
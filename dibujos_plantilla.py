@@ -0,0 +1,309 @@
+import os
+import posixpath
+import re
+import struct
+import sys
+import xml.etree.ElementTree as ET
+import zipfile
+from xml.sax.saxutils import quoteattr
+
+from lector_xlsx import NS_A, NS_PKG_REL, NS_REL, NS_XDR, TIPO_REL_DIBUJO, resolver_hojas, ruta_rels
+from plantilla_maestra import abrir_plantilla
+
+NS_CT = 'http://schemas.openxmlformats.org/package/2006/content-types'
+TIPO_CONTENIDO_DIBUJO = 'application/vnd.openxmlformats-officedocument.drawing+xml'
+# Prefijo de las partes copiadas de la plantilla, para no chocar con las que escribe openpyxl
+PREFIJO_PLANTILLA = 'plantilla_'
+
+# Elementos de <worksheet> que van después de <drawing> (orden del esquema)
+_DESPUES_DE_DIBUJO = re.compile(
+    r'<(?:\w+:)?(?:legacyDrawing|legacyDrawingHF|drawingHF|picture|oleObjects|controls|'
+    r'webPublishItems|tableParts|extLst)\b')
+_CIERRE_HOJA = re.compile(r'</(?:\w+:)?worksheet>\s*$')
+_CIERRE_DIBUJO = re.compile(rb'</(?:\w+:)?wsDr>\s*$')
+_CIERRE_TIPOS = re.compile(r'</(?:\w+:)?Types>\s*$')
+
+# Versiones de CPython (mín., máx.) en las que se comprobó la copia cruda, que usa internos
+# de zipfile; fuera de ellas se recomprime con la API pública
+VERSIONES_COPIA_CRUDA = ((3, 8), (3, 13))
+COPIA_CRUDA = VERSIONES_COPIA_CRUDA[0] <= sys.version_info[:2] <= VERSIONES_COPIA_CRUDA[1]
+
+for _prefijo, _ns in (('xdr', NS_XDR), ('a', NS_A), ('r', NS_REL)):
+    ET.register_namespace(_prefijo, _ns)
+
+
+def _q(ns, tag):
+    return f'{{{ns}}}{tag}'
+
+
+def leer_rels_crudas(zf, parte):
+    """[(Id, Type, Target, TargetMode)] tal como están en el .rels (incluidas las externas)"""
+    try:
+        raiz = ET.fromstring(zf.read(ruta_rels(parte)))
+    except KeyError:
+        return []
+    return [(r.get('Id'), r.get('Type'), r.get('Target'), r.get('TargetMode'))
+            for r in raiz.iter(_q(NS_PKG_REL, 'Relationship'))]
+
+
+def xml_rels(relaciones):
+    filas = []
+    for id_rel, tipo, destino, modo in relaciones:
+        modo = f' TargetMode="{modo}"' if modo else ''
+        filas.append(f'<Relationship Id={quoteattr(id_rel)} Type={quoteattr(tipo)} '
+                     f'Target={quoteattr(destino)}{modo}/>')
+    return (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            f'<Relationships xmlns="{NS_PKG_REL}">{"".join(filas)}</Relationships>').encode('utf-8')
+
+
+def relativa(desde_parte, hacia_parte):
+    return posixpath.relpath(hacia_parte, posixpath.dirname(desde_parte))
+
+
+def absoluta(parte, destino):
+    if destino.startswith('/'):
+        return destino.lstrip('/')
+    return posixpath.normpath(posixpath.join(posixpath.dirname(parte), destino))
+
+
+def dibujo_de_hoja(zf, hoja):
+    """Parte del dibujo de la hoja o None"""
+    for id_rel, tipo, destino, modo in leer_rels_crudas(zf, hoja):
+        if tipo == TIPO_REL_DIBUJO and modo != 'External':
+            return absoluta(hoja, destino)
+    return None
+
+
+def agregar_anclajes(xml_dibujo, anclajes):
+    """Añade anclajes (bytes, con sus propios xmlns) al final de un <xdr:wsDr>"""
+    return _CIERRE_DIBUJO.sub(lambda m: b''.join(anclajes) + m.group(0), xml_dibujo, count=1)
+
+
+def insertar_elemento_dibujo(xml_hoja, id_rel):
+    """Añade <drawing r:id> a una hoja sin dibujo, en la posición que exige el esquema"""
+    elemento = f'<drawing xmlns:r="{NS_REL}" r:id="{id_rel}"/>'
+    siguiente = _DESPUES_DE_DIBUJO.search(xml_hoja)
+    if siguiente:
+        return xml_hoja[:siguiente.start()] + elemento + xml_hoja[siguiente.start():]
+    return _CIERRE_HOJA.sub(lambda m: elemento + m.group(0), xml_hoja, count=1)
+
+
+def agregar_tipos(xml, existentes, extensiones, partes):
+    """
+    [Content_Types].xml con los Default/Override nuevos que falten.
+
+    :param existentes: TiposContenido del paquete actual
+    :param extensiones: {extensión: tipo}
+    :param partes: {parte: tipo}
+    """
+    entradas = []
+    for extension, tipo in extensiones.items():
+        if extension not in existentes.por_extension:
+            entradas.append(f'<Default Extension="{extension}" ContentType="{tipo}"/>')
+    for parte, tipo in partes.items():
+        if parte not in existentes.por_parte:
+            entradas.append(f'<Override PartName="/{parte}" ContentType="{tipo}"/>')
+    return _CIERRE_TIPOS.sub(lambda m: ''.join(entradas) + m.group(0), xml, count=1).encode('utf-8')
+
+
+def copiar_entrada_cruda(zin, zout, info):
+    """
+    Copia una entrada de un zip a otro con sus bytes comprimidos tal cual,
+    sin descomprimir ni recomprimir (zipfile no lo ofrece de forma pública).
+    Fuera de VERSIONES_COPIA_CRUDA, o si la entrada está cifrada, se recomprime
+    con writestr.
+    """
+    if not COPIA_CRUDA or info.flag_bits & 0x01:
+        copia = zipfile.ZipInfo(info.filename, info.date_time)
+        copia.compress_type = info.compress_type
+        copia.external_attr = info.external_attr
+        copia.create_system = info.create_system
+        # Copia del ZipInfo: writestr lo modifica y el de zin puede ser de la plantilla maestra
+        zout.writestr(copia, zin.read(info))
+        return
+
+    zin.fp.seek(info.header_offset)
+    cabecera = zin.fp.read(30)
+    largo_nombre, largo_extra = struct.unpack('<HH', cabecera[26:30])
+    zin.fp.seek(info.header_offset + 30 + largo_nombre + largo_extra)
+    datos = zin.fp.read(info.compress_size)
+
+    copia = zipfile.ZipInfo(info.filename, info.date_time)
+    copia.compress_type = info.compress_type
+    copia.CRC = info.CRC
+    copia.compress_size = info.compress_size
+    copia.file_size = info.file_size
+    copia.external_attr = info.external_attr
+    copia.create_system = info.create_system
+    copia.flag_bits = info.flag_bits & ~0x08  # Tamaños en la cabecera, sin descriptor de datos
+    copia.header_offset = zout.fp.tell()
+    zout.fp.write(copia.FileHeader())
+    zout.fp.write(datos)
+    zout.filelist.append(copia)
+    zout.NameToInfo[copia.filename] = copia
+    zout.start_dir = zout.fp.tell()
+    zout._didModify = True
+
+
+class TiposContenido:
+    """[Content_Types].xml de un paquete: Default por extensión y Override por parte"""
+
+    def __init__(self, datos):
+        raiz = ET.fromstring(datos)
+        self.por_extension = {d.get('Extension').lower(): d.get('ContentType')
+                              for d in raiz.iter(_q(NS_CT, 'Default'))}
+        self.por_parte = {o.get('PartName').lstrip('/'): o.get('ContentType')
+                          for o in raiz.iter(_q(NS_CT, 'Override'))}
+
+    def tipo(self, parte):
+        extension = posixpath.splitext(parte)[1].lstrip('.').lower()
+        return self.por_parte.get(parte) or self.por_extension.get(extension)
+
+
+class RestauradorDibujos:
+    """
+    Devuelve a un xlsx guardado por openpyxl los dibujos de la plantilla.
+
+    openpyxl solo conserva imágenes y gráficos al cargar un libro: formas,
+    grupos y cuadros de texto se pierden al guardar. Aquí se toma el XML de
+    dibujo de cada hoja de la plantilla tal cual, se le añaden los anclajes que
+    escribió openpyxl (las imágenes nuevas) y se copian las partes a las que
+    apunta (medios, gráficos...), reescribiendo el zip de salida una sola vez.
+    """
+
+    def __init__(self, plantilla, transformaciones=None):
+        """
+        :param plantilla: ruta de la plantilla o su PlantillaMaestra (partes ya leídas en el lote)
+        :param transformaciones: {índice de hoja: función(xml bytes) -> xml bytes} que se
+            aplica al dibujo de la plantilla antes de añadirle las imágenes (ej. textos de antenas)
+        """
+        self.plantilla = plantilla
+        self.transformaciones = transformaciones or {}
+
+    def restaurar(self, salida_path):
+        """Reescribe salida_path con los dibujos de la plantilla. Devuelve cuántas hojas se restauraron"""
+        with abrir_plantilla(self.plantilla) as plantilla, zipfile.ZipFile(salida_path) as salida:
+            hojas_plantilla = resolver_hojas(plantilla)
+            hojas_salida = resolver_hojas(salida)
+            self._tipos_plantilla = TiposContenido(plantilla.read('[Content_Types].xml'))
+            tipos_salida = TiposContenido(salida.read('[Content_Types].xml'))
+            self._plantilla = plantilla
+            self._nombres = set(salida.namelist())
+            self._nuevas = {}  # parte -> bytes (nuevas o reemplazadas)
+            self._tipos_nuevos = {}  # parte -> tipo de contenido (Override)
+            self._extensiones_nuevas = {}
+            self._copiadas = {}  # parte de la plantilla -> parte en la salida
+
+            restauradas = 0
+            for sheet_index, hoja_plantilla in enumerate(hojas_plantilla):
+                dibujo_plantilla = dibujo_de_hoja(plantilla, hoja_plantilla)
+                if dibujo_plantilla is None or sheet_index >= len(hojas_salida):
+                    continue
+                self._restaurar_hoja(salida, hojas_salida[sheet_index], dibujo_plantilla,
+                                     self.transformaciones.get(sheet_index))
+                restauradas += 1
+
+            if restauradas:
+                self._nuevas['[Content_Types].xml'] = agregar_tipos(
+                    salida.read('[Content_Types].xml').decode('utf-8'), tipos_salida,
+                    self._extensiones_nuevas, self._tipos_nuevos)
+                temporal = f"{salida_path}.tmp"
+                with zipfile.ZipFile(temporal, 'w', zipfile.ZIP_DEFLATED) as destino:
+                    for info in salida.infolist():
+                        if info.filename in self._nuevas:
+                            destino.writestr(info.filename, self._nuevas.pop(info.filename))
+                        else:
+                            copiar_entrada_cruda(salida, destino, info)
+                    for parte, datos in self._nuevas.items():
+                        destino.writestr(parte, datos)
+
+        if restauradas:
+            os.replace(temporal, salida_path)
+        return restauradas
+
+    def _restaurar_hoja(self, salida, hoja_salida, dibujo_plantilla, transformar=None):
+        dibujo_salida = dibujo_de_hoja(salida, hoja_salida)
+        xml = self._plantilla.read(dibujo_plantilla)
+        if transformar is not None:
+            xml = transformar(xml)
+
+        if dibujo_salida is None:
+            # openpyxl no escribió imágenes en esta hoja: se añade el dibujo de la plantilla
+            dibujo_salida = self._nombre_libre(
+                posixpath.join('xl/drawings', PREFIJO_PLANTILLA + posixpath.basename(dibujo_plantilla)))
+            rels_dibujo = []
+            self._enlazar_dibujo(salida, hoja_salida, dibujo_salida)
+            self._tipos_nuevos[dibujo_salida] = TIPO_CONTENIDO_DIBUJO
+        else:
+            # Anclajes de openpyxl con ids de relación renombrados para no chocar con la plantilla
+            rels_dibujo = []
+            renombrados = {}
+            for id_rel, tipo, destino, modo in leer_rels_crudas(salida, dibujo_salida):
+                renombrados[id_rel] = f"rIdSid{len(renombrados) + 1}"
+                rels_dibujo.append((renombrados[id_rel], tipo, destino, modo))
+            anclajes = []
+            for anclaje in ET.fromstring(salida.read(dibujo_salida)):
+                for elemento in anclaje.iter():
+                    for atributo, valor in elemento.attrib.items():
+                        if atributo.startswith(f'{{{NS_REL}}}') and valor in renombrados:
+                            elemento.set(atributo, renombrados[valor])
+                anclajes.append(ET.tostring(anclaje, encoding='utf-8'))
+            xml = agregar_anclajes(xml, anclajes)
+
+        # Relaciones de la plantilla: sus destinos se copian a la salida con nombre propio
+        for id_rel, tipo, destino, modo in leer_rels_crudas(self._plantilla, dibujo_plantilla):
+            if modo != 'External':
+                copia = self._copiar_parte(absoluta(dibujo_plantilla, destino))
+                destino = relativa(dibujo_salida, copia)
+            rels_dibujo.append((id_rel, tipo, destino, modo))
+
+        self._nuevas[dibujo_salida] = xml
+        self._nuevas[ruta_rels(dibujo_salida)] = xml_rels(rels_dibujo)
+
+    def _enlazar_dibujo(self, salida, hoja, dibujo):
+        """Añade la relación y el elemento <drawing> a una hoja que no tenía dibujo"""
+        relaciones = leer_rels_crudas(salida, hoja)
+        id_rel = f"rIdPlantilla{len(relaciones) + 1}"
+        relaciones.append((id_rel, TIPO_REL_DIBUJO, relativa(hoja, dibujo), None))
+        self._nuevas[ruta_rels(hoja)] = xml_rels(relaciones)
+
+        self._nuevas[hoja] = insertar_elemento_dibujo(salida.read(hoja).decode('utf-8'), id_rel).encode('utf-8')
+
+    def _nombre_libre(self, parte):
+        carpeta, archivo = posixpath.split(parte)
+        base, extension = posixpath.splitext(archivo)
+        candidato, n = parte, 1
+        while candidato in self._nombres or candidato in self._nuevas:
+            n += 1
+            candidato = posixpath.join(carpeta, f"{base}_{n}{extension}")
+        self._nombres.add(candidato)
+        return candidato
+
+    def _copiar_parte(self, parte):
+        """Copia una parte de la plantilla (y lo que referencia) a la salida; devuelve su nueva ruta"""
+        if parte in self._copiadas:
+            return self._copiadas[parte]
+        carpeta, archivo = posixpath.split(parte)
+        nueva = self._nombre_libre(posixpath.join(carpeta, PREFIJO_PLANTILLA + archivo))
+        self._copiadas[parte] = nueva
+        self._nuevas[nueva] = self._plantilla.read(parte)
+
+        tipo = self._tipos_plantilla.tipo(parte)
+        if tipo:
+            if parte in self._tipos_plantilla.por_parte:
+                self._tipos_nuevos[nueva] = tipo
+            else:
+                self._extensiones_nuevas[posixpath.splitext(parte)[1].lstrip('.').lower()] = tipo
+
+        relaciones = []
+        for id_rel, tipo_rel, destino, modo in leer_rels_crudas(self._plantilla, parte):
+            if modo != 'External':
+                destino = relativa(nueva, self._copiar_parte(absoluta(parte, destino)))
+            relaciones.append((id_rel, tipo_rel, destino, modo))
+        if relaciones:
+            self._nuevas[ruta_rels(nueva)] = xml_rels(relaciones)
+        return nueva
+
+
+def restaurar_dibujos(plantilla, salida_path, transformaciones=None):
+    return RestauradorDibujos(plantilla, transformaciones).restaurar(salida_path)
@@ -0,0 +1,230 @@
+import os
+
+from openpyxl.drawing.image import Image as ImagenOpenpyxl
+from openpyxl.drawing.spreadsheet_drawing import AnchorMarker, OneCellAnchor
+from openpyxl.drawing.xdr import XDRPositiveSize2D
+from openpyxl.utils import get_column_letter
+from openpyxl.utils.cell import coordinate_to_tuple
+
+from dibujos_plantilla import restaurar_dibujos
+from geometria_hoja import PUNTOS_POR_PIXEL, GeometriasPlantilla
+from plantilla_maestra import maestra_de
+from textos_antenas import SustitucionTextosAntenas
+
+BACKENDS_ESCRITURA = ('excel', 'openpyxl', 'ooxml')
+OPCIONES_ESCRITURA = {'backend': 'excel'}
+
+# 1 cm = 28.35 puntos; 1 punto = 12700 EMU
+PUNTOS_POR_CM = 28.35
+EMU_POR_PUNTO = 12700
+# Desplazamiento de las imágenes respecto a la celda destino (igual que en el escritor de Excel)
+MARGEN_IZQUIERDO_PT = 5
+MARGEN_SUPERIOR_PT = 70
+
+# Celdas de las fotos por antena (sectores en orden) en la hoja de antenas de la plantilla
+POSICIONES_ANTENAS_BASE = {
+    1: ("B20", "G20", "L20"),
+    2: ("C74", "H74", "M74"),
+    3: ("C124", "H124", "M124"),
+    4: ("C174", "H174", "M174")
+}
+PASO_FILAS_ANTENA = 50
+# Tamaño de cada foto de antena en el SID (ancho, alto en cm)
+TAMANO_FOTO_ANTENA_CM = (9, 14)
+PASO_COLUMNAS_SECTOR = 5
+
+
+def tabla_posiciones_antenas(antenas, sectores):
+    """
+    {antena: {sector: celda}} para las antenas y sectores encontrados en el TSS.
+    Usa las posiciones de la plantilla y, fuera de ellas (más antenas o sectores),
+    sigue el mismo paso de filas por antena y de columnas por sector.
+    """
+    ultima = max(POSICIONES_ANTENAS_BASE)
+    fila_ultima, col_ultima = coordinate_to_tuple(POSICIONES_ANTENAS_BASE[ultima][0])
+    tabla = {}
+    for antena in antenas:
+        base = POSICIONES_ANTENAS_BASE.get(antena, ())
+        if base:
+            fila, col = coordinate_to_tuple(base[0])
+        else:
+            fila, col = fila_ultima + (antena - ultima) * PASO_FILAS_ANTENA, col_ultima
+        tabla[antena] = {
+            sector: base[i] if i < len(base) else f"{get_column_letter(col + i * PASO_COLUMNAS_SECTOR)}{fila}"
+            for i, sector in enumerate(sectores)
+        }
+    return tabla
+
+
+def tamano_destino_pt(ancho_cm, alto_cm, metadatos):
+    """
+    (ancho, alto) en puntos con las reglas del escritor de Excel: si solo se da
+    una dimensión la otra sigue la relación de aspecto; sin ninguna, el tamaño
+    natural de la imagen a 96 ppp.
+    """
+    ancho = ancho_cm * PUNTOS_POR_CM if ancho_cm is not None else None
+    alto = alto_cm * PUNTOS_POR_CM if alto_cm is not None else None
+    if ancho is not None and alto is None:
+        alto = ancho * metadatos.alto / metadatos.ancho
+    elif alto is not None and ancho is None:
+        ancho = alto * metadatos.ancho / metadatos.alto
+    elif ancho is None and alto is None:
+        ancho, alto = metadatos.ancho * PUNTOS_POR_PIXEL, metadatos.alto * PUNTOS_POR_PIXEL
+    return ancho, alto
+
+
+def rectangulos_imagen(geometria, destino, metadatos):
+    """
+    (celda, izquierda, arriba, ancho, alto) en puntos por cada celda destino de
+    una imagen, con el desplazamiento y centrado del escritor de Excel.
+    """
+    ancho_cm, alto_cm = destino.get('ancho'), destino.get('alto')
+    ancho, alto = tamano_destino_pt(ancho_cm, alto_cm, metadatos)
+    for celda in destino['celdas']:
+        x, y, ancho_celda, alto_celda = geometria.rectangulo(celda)
+        izquierda = x + MARGEN_IZQUIERDO_PT
+        arriba = y + MARGEN_SUPERIOR_PT
+        # Con una sola dimensión configurada se centra en la otra, como en Excel
+        if ancho_cm is not None and alto_cm is None:
+            arriba = y + (alto_celda - alto) / 2
+        elif alto_cm is not None and ancho_cm is None:
+            izquierda = x + (ancho_celda - ancho) / 2
+        yield celda, izquierda, arriba, ancho, alto
+
+
+def rectangulo_centrado(geometria, celda, ancho, alto):
+    """(izquierda, arriba) en puntos de un rectángulo centrado en la celda (fotos de antenas)"""
+    izquierda, arriba, ancho_celda, alto_celda = geometria.rectangulo(celda)
+    return izquierda + (ancho_celda - ancho) / 2, arriba + (alto_celda - alto) / 2
+
+
+def geometrias_de(geometrias, plantilla):
+    """Reutiliza las geometrías de la plantilla (ruta o PlantillaMaestra) entre SIDs del lote mientras sea la misma"""
+    if geometrias is None or geometrias.plantilla != plantilla:
+        geometrias = GeometriasPlantilla(plantilla)
+    return geometrias
+
+
+def anclaje_imagen(geometria, izquierda, arriba, ancho, alto):
+    """oneCellAnchor (se mueve con las celdas) para un rectángulo en puntos"""
+    col, dx, fila, dy = geometria.celda_en(max(izquierda, 0), max(arriba, 0))
+    return OneCellAnchor(
+        _from=AnchorMarker(col=col, colOff=round(dx * EMU_POR_PUNTO), row=fila, rowOff=round(dy * EMU_POR_PUNTO)),
+        ext=XDRPositiveSize2D(cx=round(ancho * EMU_POR_PUNTO), cy=round(alto * EMU_POR_PUNTO)))
+
+
+class EscritorSIDOpenpyxl:
+    """
+    Genera el SID con openpyxl, sin Excel: textos, rangos como celdas, imágenes
+    y fotos de antenas sobre la plantilla, con las mismas posiciones y tamaños
+    que el escritor de Excel. Los dibujos de la plantilla (formas, grupos,
+    cuadros de texto) se restauran tras guardar (ver dibujos_plantilla), con
+    los títulos y sectores de antenas ya sustituidos (ver textos_antenas).
+    """
+
+    def __init__(self, plan, mapa_plantilla=None):
+        """:param mapa_plantilla: MapaPlantilla de la hoja de antenas (evita analizar su dibujo en cada SID)"""
+        self.plan = plan
+        self.mapa_plantilla = mapa_plantilla
+        self.geometrias = None
+        self.plantilla = None  # PlantillaMaestra del lote
+
+    def escribir(self, tss_instance, plantilla_path, output_path):
+        """Genera el SID. Devuelve False si alguna imagen o foto de antena no se pudo insertar"""
+        print("\n=== GENERANDO SID (openpyxl) ===")
+        cronometro = tss_instance.sesion.cronometro
+        with cronometro.etapa('carga_plantilla'):
+            # La plantilla se analiza con el primer SID; los siguientes reciben una copia del modelo.
+            # Sus imágenes y gráficos vuelven intactos con su dibujo original
+            self.plantilla = maestra_de(self.plantilla, plantilla_path)
+            wb = self.plantilla.workbook()
+        self.geometrias = geometrias_de(self.geometrias, self.plantilla)
+
+        completo = True
+        geometrias_sid = {}  # índice de hoja -> geometría tras pegar los rangos como celdas
+        for sheet_index, elementos_hoja in self.plan.por_hoja_destino.items():
+            ws = wb.worksheets[sheet_index]
+
+            # 1. Celdas: textos y rangos copiados (pueden cambiar anchos y altos)
+            geometria = self.geometrias.hoja(sheet_index)
+            for elemento in elementos_hoja:
+                nombre = elemento['nombre']
+                if elemento['tipo'] == 'texto' and nombre in tss_instance.data['textos']:
+                    for celda in elemento['destino']['celdas']:
+                        ws[celda].value = tss_instance.data['textos'][nombre]
+                        print(f"Texto '{nombre}' insertado en {celda}")
+                elif elemento['tipo'] == 'rango' and nombre in tss_instance.data['celdas']:
+                    for celda in elemento['destino']['celdas']:
+                        bloque = tss_instance.data['celdas'][nombre]
+                        bloque.aplicar_openpyxl(ws, celda)
+                        geometria = geometria.con_bloque(celda, bloque)
+                        print(f"Rango '{nombre}' pegado como celdas en {celda}")
+
+            # 2. Imágenes, ancladas con la geometría ya definitiva de la hoja
+            for elemento in elementos_hoja:
+                if elemento['tipo'] in ('imagen', 'rango') and elemento['nombre'] in tss_instance.data['imagenes']:
+                    completo = self._insertar_imagen(ws, geometria, tss_instance, elemento) and completo
+            geometrias_sid[sheet_index] = geometria
+
+        completo = self._insertar_fotos_antenas(
+            wb, tss_instance, geometrias_sid.get(self.plan.indices_sid['antenas'])) and completo
+
+        wb.save(output_path)
+        # Títulos y sectores de antenas: en el dibujo de la plantilla, antes de restaurarlo
+        sustitucion = SustitucionTextosAntenas(tss_instance.id, tss_instance.tecnologias)
+        grupos = self.mapa_plantilla.grupos if self.mapa_plantilla else None
+
+        def _textos_antenas(xml):
+            with cronometro.etapa('textos_antenas'):
+                return sustitucion.aplicar(xml, grupos)
+
+        restauradas = restaurar_dibujos(self.plantilla, output_path,
+                                        {self.plan.indices_sid['antenas']: _textos_antenas})
+        print(f"\n✅ SID generado correctamente en: {os.path.abspath(output_path)} "
+              f"({restauradas} hojas con dibujos de la plantilla)")
+        return completo
+
+    def _insertar_imagen(self, ws, geometria, tss_instance, elemento):
+        nombre = elemento['nombre']
+        img_path = os.path.abspath(tss_instance.data['imagenes'][nombre])
+        metadatos = tss_instance.metadatos_imagen(img_path)
+        if metadatos is None:
+            print(f"❌ Imagen no encontrada para '{nombre}': {img_path}")
+            return False
+
+        for celda, izquierda, arriba, ancho, alto in rectangulos_imagen(geometria, elemento['destino'], metadatos):
+            imagen = ImagenOpenpyxl(img_path)
+            imagen.anchor = anclaje_imagen(geometria, izquierda, arriba, ancho, alto)
+            ws.add_image(imagen)
+            print(f"✅ Imagen '{nombre}' anclada en {celda} - Tamaño: {ancho:.0f}x{alto:.0f} pt")
+        return True
+
+    def _insertar_fotos_antenas(self, wb, tss_instance, geometria=None):
+        manifiesto = tss_instance.tecnologias
+        if not manifiesto.numeros_antenas():
+            print("ℹ️ El TSS no tiene fotos de antenas")
+            return True
+
+        completo = True
+        ws = wb.worksheets[self.plan.indices_sid['antenas']]
+        geometria = geometria or self.geometrias.hoja(self.plan.indices_sid['antenas'])
+        ancho = TAMANO_FOTO_ANTENA_CM[0] * PUNTOS_POR_CM
+        alto = TAMANO_FOTO_ANTENA_CM[1] * PUNTOS_POR_CM
+        posiciones = tabla_posiciones_antenas(manifiesto.numeros_antenas(), manifiesto.todos_los_sectores())
+
+        for antena, posiciones_sector in posiciones.items():
+            for sector, celda in posiciones_sector.items():
+                entrada = manifiesto.sector(antena, sector)
+                if not entrada:
+                    continue
+                img_path = os.path.abspath(entrada['imagen'])
+                if not tss_instance.metadatos_imagen(img_path):
+                    print(f"❌ Foto no encontrada para antena {antena} sector {sector}: {img_path}")
+                    completo = False
+                    continue
+                izquierda, arriba = rectangulo_centrado(geometria, celda, ancho, alto)
+                imagen = ImagenOpenpyxl(img_path)
+                imagen.anchor = anclaje_imagen(geometria, izquierda, arriba, ancho, alto)
+                ws.add_image(imagen)
+                print(f"✅ Insertada {os.path.basename(img_path)} en {celda}")
+        return completo
@@ -0,0 +1,167 @@
+import re
+from bisect import bisect_right
+
+from openpyxl.utils import column_index_from_string
+from openpyxl.utils.cell import coordinate_to_tuple
+
+from lector_xlsx import resolver_hojas
+from plantilla_maestra import abrir_plantilla
+from render_rangos import ALTO_FILA_DEFECTO, ANCHO_COLUMNA_DEFECTO, MARGEN_COLUMNA, PIXELES_POR_CARACTER
+
+PUNTOS_POR_PIXEL = 0.75
+# Límites de una hoja de Excel
+MAX_COLUMNAS = 16384
+MAX_FILAS = 1048576
+
+# Etiquetas de apertura de la hoja que definen su geometría (con o sin prefijo de espacio de nombres)
+_SHEET_FORMAT = re.compile(r'<(?:\w+:)?sheetFormatPr\b[^>]*>')
+_COL = re.compile(r'<(?:\w+:)?col\b[^>]*>')
+_ROW = re.compile(r'<(?:\w+:)?row\b[^>]*>')
+_ATRIBUTO = re.compile(r'([\w:]+)="([^"]*)"')
+
+
+def _atributos(etiqueta):
+    """Atributos sin prefijo de una etiqueta XML de apertura"""
+    return {nombre.split(':')[-1]: valor for nombre, valor in _ATRIBUTO.findall(etiqueta)}
+
+
+class GeometriaHoja:
+    """
+    Posición y tamaño de filas y columnas de una hoja en puntos, sin consultar a Excel.
+
+    Los bordes se guardan como sumas acumuladas que se amplían bajo demanda:
+    el rectángulo de una celda es O(1) y la celda bajo un punto, O(log n).
+    """
+
+    def __init__(self, anchos, altos, ancho_defecto=None, alto_defecto=None):
+        """
+        :param anchos: {columna base 1: ancho en caracteres, 0 si está oculta}
+        :param altos: {fila base 1: alto en puntos, 0 si está oculta}
+        """
+        self._anchos = anchos
+        self._altos = altos
+        self._ancho_defecto = ancho_defecto or ANCHO_COLUMNA_DEFECTO
+        self._alto_defecto = alto_defecto or ALTO_FILA_DEFECTO
+        # _bordes_x[i] = borde izquierdo de la columna i + 1 (ídem filas)
+        self._bordes_x = [0.0]
+        self._bordes_y = [0.0]
+
+    @classmethod
+    def desde_hoja(cls, ws):
+        """Geometría de una hoja de openpyxl"""
+        ancho_defecto = ws.sheet_format.defaultColWidth or ANCHO_COLUMNA_DEFECTO
+        # Una dimensión de columna puede cubrir varias columnas (min..max)
+        anchos = {}
+        for dimension in ws.column_dimensions.values():
+            desde = dimension.min or column_index_from_string(dimension.index)
+            ancho = 0 if dimension.hidden else (dimension.width or ancho_defecto)
+            for col in range(desde, (dimension.max or desde) + 1):
+                anchos[col] = ancho
+        altos = {}
+        for fila, dimension in ws.row_dimensions.items():
+            if dimension.hidden:
+                altos[fila] = 0
+            elif dimension.height:
+                altos[fila] = dimension.height
+        return cls(anchos, altos, ancho_defecto, ws.sheet_format.defaultRowHeight)
+
+    @classmethod
+    def desde_xml(cls, xml):
+        """Geometría leída del XML de una hoja (sheetFormatPr, cols y atributos de row)"""
+        formato = _SHEET_FORMAT.search(xml)
+        formato = _atributos(formato.group(0)) if formato else {}
+        ancho_defecto = float(formato.get('defaultColWidth', 0)) or None
+        anchos = {}
+        for elemento in _COL.finditer(xml):
+            atributos = _atributos(elemento.group(0))
+            if atributos.get('hidden') in ('1', 'true'):
+                ancho = 0
+            else:
+                ancho = float(atributos.get('width', 0)) or ancho_defecto or ANCHO_COLUMNA_DEFECTO
+            desde = int(atributos['min'])
+            for col in range(desde, int(atributos.get('max', desde)) + 1):
+                anchos[col] = ancho
+        altos = {}
+        for elemento in _ROW.finditer(xml):
+            atributos = _atributos(elemento.group(0))
+            if 'r' not in atributos:
+                continue
+            if atributos.get('hidden') in ('1', 'true'):
+                altos[int(atributos['r'])] = 0
+            elif atributos.get('ht'):
+                altos[int(atributos['r'])] = float(atributos['ht'])
+        return cls(anchos, altos, ancho_defecto, float(formato.get('defaultRowHeight', 0)) or None)
+
+    def con_bloque(self, celda, bloque):
+        """
+        Copia con los anchos y altos de un BloqueCeldas pegado en celda (ver
+        copia_celdas), para colocar imágenes tras el pegado sin releer la hoja.
+        """
+        fila0, col0 = coordinate_to_tuple(celda)
+        anchos = dict(self._anchos)
+        altos = dict(self._altos)
+        for i, ancho in enumerate(bloque.anchos):
+            if ancho is not None:
+                anchos[col0 + i] = ancho
+        for i, alto in enumerate(bloque.altos):
+            if alto is not None:
+                altos[fila0 + i] = alto
+        return GeometriaHoja(anchos, altos, self._ancho_defecto, self._alto_defecto)
+
+    def ancho_columna(self, col):
+        ancho = self._anchos.get(col, self._ancho_defecto)
+        return (ancho * PIXELES_POR_CARACTER + MARGEN_COLUMNA) * PUNTOS_POR_PIXEL if ancho else 0
+
+    def alto_fila(self, fila):
+        return self._altos.get(fila, self._alto_defecto)
+
+    @staticmethod
+    def _extender(bordes, hasta, medida):
+        """Amplía las sumas acumuladas hasta el índice indicado"""
+        while len(bordes) <= hasta:
+            bordes.append(bordes[-1] + medida(len(bordes)))
+
+    def x(self, col):
+        """Borde izquierdo de la columna (base 1)"""
+        self._extender(self._bordes_x, col - 1, self.ancho_columna)
+        return self._bordes_x[col - 1]
+
+    def y(self, fila):
+        """Borde superior de la fila (base 1)"""
+        self._extender(self._bordes_y, fila - 1, self.alto_fila)
+        return self._bordes_y[fila - 1]
+
+    def rectangulo(self, celda):
+        """(izquierda, arriba, ancho, alto) de la celda en puntos, como Range.Left/Top/Width/Height"""
+        fila, col = coordinate_to_tuple(celda)
+        return self.x(col), self.y(fila), self.ancho_columna(col), self.alto_fila(fila)
+
+    @classmethod
+    def _indice_en(cls, bordes, posicion, medida, maximo):
+        """(índice base 0, desplazamiento) del tramo que contiene la posición"""
+        while bordes[-1] <= posicion and len(bordes) <= maximo:
+            cls._extender(bordes, len(bordes), medida)
+        indice = min(bisect_right(bordes, posicion), maximo) - 1
+        return indice, posicion - bordes[indice]
+
+    def celda_en(self, x, y):
+        """(col, desplazamiento, fila, desplazamiento) base 0 del punto, desplazamientos en puntos"""
+        col, dx = self._indice_en(self._bordes_x, x, self.ancho_columna, MAX_COLUMNAS)
+        fila, dy = self._indice_en(self._bordes_y, y, self.alto_fila, MAX_FILAS)
+        return col, dx, fila, dy
+
+
+class GeometriasPlantilla:
+    """Geometría de cada hoja de la plantilla, leída de su XML una sola vez por lote"""
+
+    def __init__(self, plantilla):
+        """:param plantilla: ruta de la plantilla o su PlantillaMaestra"""
+        self.plantilla = plantilla
+        self._hojas = {}
+
+    def hoja(self, sheet_index):
+        if sheet_index not in self._hojas:
+            with abrir_plantilla(self.plantilla) as zf:
+                xml = zf.read(resolver_hojas(zf)[sheet_index]).decode('utf-8')
+            self._hojas[sheet_index] = GeometriaHoja.desde_xml(xml)
+        return self._hojas[sheet_index]
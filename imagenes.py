@@ -0,0 +1,287 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+MODOS_IMAGEN = ('original', 'png')
+OPCIONES_IMAGEN = {
+    'modo': 'original',  # 'original': bytes sin recodificar; 'png': recodifica todo como antes
+    'medir_ahorro': False,  # Recodifica en memoria solo para informar los bytes ahorrados
+    'dpi': 150,  # Resolución en el SID para reducir imágenes al tamaño destino; 0 desactiva
+    'calidad': 85,  # Calidad JPEG de las imágenes reducidas
+    'hilos': 4,  # Hilos para escribir/reducir/verificar imágenes (Pillow libera el GIL)
+    'max_mb_en_vuelo': 256,  # Bytes de imágenes pendientes en el pool antes de esperar
+}
+# Opciones que cambian los archivos generados (las demás solo afectan al rendimiento)
+OPCIONES_SALIDA = ('modo', 'dpi', 'calidad')
+
+# Formatos que Excel inserta directamente: se escriben tal cual con su extensión
+FORMATOS_DIRECTOS = ('.jpg', '.png', '.gif', '.bmp', '.tif', '.emf', '.wmf')
+# Formatos raster que se pueden reducir (GIF por animaciones y EMF/WMF vectoriales quedan fuera)
+FORMATOS_REDUCIBLES = ('.jpg', '.png', '.bmp', '.tif', '.webp')
+# Modos de Pillow que reduce() y resize(LANCZOS) procesan sin convertir
+MODOS_REDUCIBLES = ('RGB', 'RGBA', 'L', 'CMYK')
+CM_POR_PULGADA = 2.54
+# Prefijo del almacén por contenido de las imágenes de cada lote; las carpetas de cada sitio enlazan a él
+ALMACEN_IMAGENES = "almacen_imagenes"
+
+# Datos de cada imagen generada, para insertarla sin volver a abrir el archivo
+MetadatosImagen = namedtuple('MetadatosImagen', ['ancho', 'alto', 'formato', 'bytes'])
+
+
+def detectar_formato(datos):
+    """Extensión según los bytes mágicos del archivo, o None si no se reconoce"""
+    if datos.startswith(b'\xff\xd8\xff'):
+        return '.jpg'
+    if datos.startswith(b'\x89PNG\r\n\x1a\n'):
+        return '.png'
+    if datos[:6] in (b'GIF87a', b'GIF89a'):
+        return '.gif'
+    if datos.startswith(b'BM'):
+        return '.bmp'
+    if datos[:4] in (b'II*\x00', b'MM\x00*'):
+        return '.tif'
+    if datos[:4] == b'RIFF' and datos[8:12] == b'WEBP':
+        return '.webp'
+    if datos[:4] == b'\x01\x00\x00\x00' and datos[40:44] == b' EMF':
+        return '.emf'
+    if datos.startswith(b'\xd7\xcd\xc6\x9a'):
+        return '.wmf'
+    return None
+
+
+def metadatos_de_bytes(datos):
+    """Ancho, alto y formato leyendo solo la cabecera de la imagen en memoria"""
+    with Image.open(io.BytesIO(datos)) as imagen:
+        return MetadatosImagen(imagen.width, imagen.height, imagen.format, len(datos))
+
+
+def metadatos_de_archivo(path):
+    """Igual que metadatos_de_bytes para una imagen ya en disco (abre el archivo una vez)"""
+    with Image.open(path) as imagen:
+        return MetadatosImagen(imagen.width, imagen.height, imagen.format, os.path.getsize(path))
+
+
+def pixeles_destino(ancho_cm, alto_cm, dpi):
+    """Píxeles necesarios para el tamaño destino en cm a la resolución dada (None si no se indica)"""
+    def _px(cm):
+        return max(1, round(cm / CM_POR_PULGADA * dpi)) if cm else None
+    return _px(ancho_cm), _px(alto_cm)
+
+
+def _reducir(datos, objetivo, opciones):
+    """
+    Reduce la imagen para que cubra el tamaño objetivo (ancho, alto en px).
+    Devuelve (bytes, extensión) o None si ya es igual o más pequeña.
+    """
+    ancho_obj, alto_obj = objetivo
+    with Image.open(io.BytesIO(datos)) as original:
+        # Orientaciones EXIF 5-8 giran 90°: el tamaño visible tiene los ejes intercambiados
+        girada = original.getexif().get(0x0112, 1) in (5, 6, 7, 8)
+        ancho, alto = original.size[::-1] if girada else original.size
+
+        # Escala que cubre ambas dimensiones pedidas (el SID puede estirar la imagen)
+        escala = max(ancho_obj / ancho if ancho_obj else 0, alto_obj / alto if alto_obj else 0)
+        if not 0 < escala < 1:
+            return None
+        nuevo = (max(1, round(ancho * escala)), max(1, round(alto * escala)))
+
+        es_jpeg = original.format == 'JPEG'
+        if es_jpeg:
+            # Decodifica directamente a 1/2, 1/4 u 1/8 del tamaño, sin bajar de lo pedido
+            original.draft(original.mode, nuevo[::-1] if girada else nuevo)
+        imagen = ImageOps.exif_transpose(original)
+        # reduce() y LANCZOS no admiten paleta ni gris con alfa (típico en capturas de mapas)
+        if imagen.mode not in MODOS_REDUCIBLES:
+            transparente = 'A' in imagen.mode or 'transparency' in imagen.info
+            imagen = imagen.convert('RGBA' if transparente else 'RGB')
+
+        factor = min(imagen.width // nuevo[0], imagen.height // nuevo[1])
+        if factor >= 2:
+            imagen = imagen.reduce(factor)
+        imagen = imagen.resize(nuevo, Image.LANCZOS)
+
+        salida = io.BytesIO()
+        if es_jpeg and opciones['modo'] == 'original':
+            imagen.save(salida, format='JPEG', quality=opciones['calidad'], optimize=True)
+            return salida.getvalue(), '.jpg'
+        imagen.save(salida, format='PNG')
+        return salida.getvalue(), '.png'
+
+
+def _a_png(datos):
+    with Image.open(io.BytesIO(datos)) as imagen:
+        salida = io.BytesIO()
+        imagen.save(salida, format='PNG')
+        return salida.getvalue()
+
+
+def guardar_imagen(datos, ruta_base, cronometro, opciones=OPCIONES_IMAGEN, destino_cm=None):
+    """
+    Escribe la imagen en ruta_base + extensión y devuelve (ruta final, MetadatosImagen).
+
+    Si se conoce el tamaño destino (ancho, alto en cm) y la imagen tiene más
+    píxeles de los que necesita a opciones['dpi'], se reduce antes de guardar.
+    Si no, en modo 'original' los bytes se copian sin decodificar cuando Excel
+    admite el formato; solo se recodifica a PNG lo que no admite (ej. WebP).
+    Registra en el cronómetro el tiempo de CPU, los bytes leídos y escritos y,
+    si se pide, los bytes ahorrados frente a recodificar a PNG.
+    """
+    inicio_cpu = time.thread_time()
+    formato = detectar_formato(datos)
+
+    reducida = None
+    if destino_cm and opciones['dpi'] and formato in FORMATOS_REDUCIBLES:
+        try:
+            reducida = _reducir(datos, pixeles_destino(*destino_cm, opciones['dpi']), opciones)
+        except Exception as e:
+            print(f"⚠️ No se pudo reducir la imagen, se guarda sin cambios: {str(e)}")
+
+    if reducida:
+        salida, extension = reducida
+        cronometro.contar('imagenes_reducidas')
+    elif opciones['modo'] == 'original' and formato in FORMATOS_DIRECTOS:
+        salida, extension = datos, formato
+        cronometro.contar('imagenes_sin_recodificar')
+    else:
+        salida, extension = _a_png(datos), '.png'
+        cronometro.contar('imagenes_recodificadas')
+
+    ruta = ruta_base + extension
+    os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+    with open(ruta, 'wb') as f:
+        f.write(salida)
+
+    cronometro.contar('cpu_imagenes_us', round((time.thread_time() - inicio_cpu) * 1e6))
+    cronometro.contar('bytes_imagenes_originales', len(datos))
+    cronometro.contar('bytes_imagenes_escritos', len(salida))
+    if opciones['medir_ahorro'] and salida is datos:
+        cronometro.contar('bytes_ahorrados_vs_png', len(_a_png(datos)) - len(datos))
+
+    try:
+        metadatos = metadatos_de_bytes(salida)
+    except Exception:
+        metadatos = None  # Formatos que Pillow no identifica (ej. EMF fuera de Windows)
+    return ruta, metadatos
+
+
+def enlazar_archivo(origen, destino):
+    """Enlace duro de origen en destino; copia si el sistema de archivos no lo permite. True si enlazó"""
+    os.makedirs(os.path.dirname(destino) or '.', exist_ok=True)
+    if os.path.exists(destino):
+        os.remove(destino)
+    try:
+        os.link(origen, destino)
+        return True
+    except OSError:
+        shutil.copyfile(origen, destino)
+        return False
+
+
+class ProcesadorImagenes:
+    """
+    Pool de hilos acotado para escribir, reducir y verificar imágenes.
+
+    Recibe trabajos (bytes, ruta, tamaño destino) de las imágenes y fotos de
+    antenas de cada TSS y devuelve futuros. Si los bytes pendientes superan
+    max_mb_en_vuelo, `enviar` espera a que terminen trabajos anteriores, así la
+    memoria no crece con el número de fotos. Se crea una vez por lote.
+
+    Cada imagen se procesa una sola vez por lote: el resultado se guarda en el
+    almacén con el hash de su contenido y tamaño destino como nombre, y la
+    carpeta del sitio recibe un enlace duro (o una copia). Las repetidas (mismas fotos en
+    varios TSS o revisiones del mismo sitio) solo se enlazan.
+    """
+
+    def __init__(self, opciones=OPCIONES_IMAGEN, carpeta_almacen=None):
+        self.opciones = opciones
+        self.max_bytes = int(opciones['max_mb_en_vuelo'] * 1024 * 1024)
+        self._pool = ThreadPoolExecutor(max_workers=max(1, opciones['hilos']), thread_name_prefix='imagenes')
+        self._condicion = threading.Condition()
+        self._en_vuelo = 0
+        self.pico_en_vuelo = 0
+
+        # El almacén es propio de este procesador (otro lote usa el suyo) y se borra al cerrar; los
+        # enlaces de los sitios siguen siendo válidos. Por defecto va al temporal del sistema para no
+        # dejar restos en la carpeta del proyecto; si está en otro sistema de archivos se copia
+        self.almacen = tempfile.mkdtemp(prefix=f"{ALMACEN_IMAGENES}_", dir=carpeta_almacen)
+        self._por_clave = {}
+        self.duplicadas = 0
+        self.bytes_evitados = 0
+
+    @staticmethod
+    def _clave(datos, destino_cm):
+        tamano = 'x'.join(str(cm) for cm in destino_cm) if destino_cm else 'original'
+        return f"{hashlib.sha256(datos).hexdigest()[:40]}_{tamano}"
+
+    def enviar(self, datos, ruta_base, cronometro, destino_cm=None, verificar=False):
+        """Encola el trabajo y devuelve un Future con (ruta final, MetadatosImagen) (ver guardar_imagen)"""
+        clave = self._clave(datos, destino_cm)
+        original = self._por_clave.get(clave)
+        if original is not None:
+            # Ya procesada en este lote: solo hay que enlazar, sin retener los bytes
+            return self._pool.submit(self._enlazar_duplicada, original, clave, ruta_base, cronometro, verificar)
+
+        tamano = len(datos)
+        with self._condicion:
+            if self._excede(tamano):
+                cronometro.contar('esperas_memoria_imagenes')
+            while self._excede(tamano):
+                self._condicion.wait()
+            self._en_vuelo += tamano
+            self.pico_en_vuelo = max(self.pico_en_vuelo, self._en_vuelo)
+
+        futuro = self._pool.submit(self._trabajo, datos, clave, ruta_base, cronometro, destino_cm, verificar)
+        futuro.add_done_callback(lambda _: self._liberar(tamano))
+        self._por_clave[clave] = futuro
+        return futuro
+
+    def _excede(self, tamano):
+        # Siempre se admite al menos un trabajo, aunque por sí solo supere el límite
+        return self._en_vuelo > 0 and self._en_vuelo + tamano > self.max_bytes
+
+    def _liberar(self, tamano):
+        with self._condicion:
+            self._en_vuelo -= tamano
+            self._condicion.notify_all()
+
+    def _trabajo(self, datos, clave, ruta_base, cronometro, destino_cm, verificar):
+        ruta_almacen, metadatos = guardar_imagen(datos, os.path.join(self.almacen, clave), cronometro,
+                                                 self.opciones, destino_cm)
+        if verificar:
+            with Image.open(ruta_almacen) as imagen:
+                imagen.verify()
+        ruta = ruta_base + os.path.splitext(ruta_almacen)[1]
+        enlazar_archivo(ruta_almacen, ruta)
+        return ruta, metadatos
+
+    def _enlazar_duplicada(self, original, clave, ruta_base, cronometro, verificar):
+        # El trabajo original se encoló antes, así que nunca queda detrás de este en el pool
+        ruta_original, metadatos = original.result()
+        extension = os.path.splitext(ruta_original)[1]
+        ruta_almacen = os.path.join(self.almacen, clave + extension)
+        if verificar:
+            # El original pudo encolarse sin verificar
+            with Image.open(ruta_almacen) as imagen:
+                imagen.verify()
+        ruta = ruta_base + extension
+        enlazar_archivo(ruta_almacen, ruta)
+
+        evitados = os.path.getsize(ruta_almacen)
+        cronometro.contar('imagenes_duplicadas')
+        cronometro.contar('bytes_duplicados_evitados', evitados)
+        with self._condicion:
+            self.duplicadas += 1
+            self.bytes_evitados += evitados
+        return ruta, metadatos
+
+    def cerrar(self):
+        self._pool.shutdown(wait=True)
+        shutil.rmtree(self.almacen, ignore_errors=True)
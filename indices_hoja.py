@@ -0,0 +1,169 @@
+import re
+import unicodedata
+from collections import defaultdict, namedtuple
+
+# Celda con texto: posición base 1, valor original y texto normalizado
+CeldaTexto = namedtuple('CeldaTexto', ['fila', 'col', 'valor', 'texto'])
+# Etiqueta "foto general de la antena N sector X" encontrada en la hoja de torres
+EtiquetaAntena = namedtuple('EtiquetaAntena', ['antena', 'sector', 'celda'])
+
+_ESPACIOS = re.compile(r'\s+')
+_PALABRAS = re.compile(r'\w+')
+# Una sola regex para todas las combinaciones antena/sector (sobre texto normalizado)
+PATRON_ETIQUETA_ANTENA = re.compile(r'foto general de la antena\s*(\d+)\W*sector\s*([a-z]|\d+)\b')
+
+
+def normalizar_texto(texto):
+    """Minúsculas, sin tildes y con los espacios colapsados"""
+    descompuesto = unicodedata.normalize('NFKD', str(texto))
+    sin_tildes = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return _ESPACIOS.sub(' ', sin_tildes.lower()).strip()
+
+
+class IndiceTexto:
+    """
+    Índice invertido del texto de una hoja, construido en una sola pasada.
+
+    Cada texto normalizado apunta a sus celdas y cada palabra a los textos que
+    la contienen; una búsqueda por frase intersecta las palabras y solo compara
+    la frase completa contra esos candidatos, sin volver a recorrer la hoja.
+    """
+
+    def __init__(self, celdas):
+        """:param celdas: iterable de (fila, col, valor) con valores no vacíos"""
+        self.por_texto = defaultdict(list)
+        self._por_palabra = defaultdict(set)
+        self.total_celdas = 0
+        self.comparaciones = 0
+
+        for fila, col, valor in celdas:
+            if valor is None or isinstance(valor, bool):
+                continue
+            texto = normalizar_texto(valor)
+            if not texto:
+                continue
+            self.total_celdas += 1
+            self.por_texto[texto].append(CeldaTexto(fila, col, str(valor), texto))
+            for palabra in _PALABRAS.findall(texto):
+                self._por_palabra[palabra].add(texto)
+
+    def buscar(self, frase):
+        """Celdas cuyo texto contiene la frase, en orden de filas (como iter_rows)"""
+        frase = normalizar_texto(frase)
+        palabras = sorted(set(_PALABRAS.findall(frase)), key=lambda p: len(self._por_palabra.get(p, ())))
+        if not palabras:
+            return []
+
+        candidatos = set(self._por_palabra.get(palabras[0], ()))
+        for palabra in palabras[1:]:
+            if not candidatos:
+                break
+            candidatos &= self._por_palabra.get(palabra, set())
+
+        encontradas = []
+        for texto in candidatos:
+            self.comparaciones += 1
+            if frase in texto:
+                encontradas.extend(self.por_texto[texto])
+        return sorted(encontradas, key=lambda c: (c.fila, c.col))
+
+    def buscar_primera(self, frase):
+        encontradas = self.buscar(frase)
+        return encontradas[0] if encontradas else None
+
+    def buscar_patron(self, patron):
+        """Una pasada por los textos distintos con una regex compilada: [(match, celda)] en orden de filas"""
+        encontradas = []
+        for texto, celdas in self.por_texto.items():
+            self.comparaciones += 1
+            coincidencia = patron.search(texto)
+            if coincidencia:
+                encontradas.extend((coincidencia, celda) for celda in celdas)
+        return sorted(encontradas, key=lambda x: (x[1].fila, x[1].col))
+
+
+def etiquetas_antenas(indice, patron=PATRON_ETIQUETA_ANTENA):
+    """
+    Todas las etiquetas antena/sector de la hoja, sin listas fijas de antenas ni sectores.
+
+    Devuelve [EtiquetaAntena] ordenadas por antena y sector; si una combinación
+    aparece varias veces se toma la primera en orden de filas.
+    """
+    etiquetas = {}
+    for coincidencia, celda in indice.buscar_patron(patron):
+        clave = (int(coincidencia.group(1)), coincidencia.group(2))
+        etiquetas.setdefault(clave, EtiquetaAntena(clave[0], clave[1], celda))
+    return [etiquetas[clave] for clave in sorted(etiquetas, key=orden_antena_sector)]
+
+
+def orden_sector(sector):
+    """Clave de orden de sectores: numéricos por valor ("2" antes que "10"), los de letra alfabéticamente"""
+    sector = str(sector)
+    return (0, int(sector), '') if sector.isdigit() else (1, 0, sector)
+
+
+def orden_antena_sector(clave):
+    """Clave de orden de (antena, sector), ver orden_sector"""
+    antena, sector = clave
+    return (int(antena), orden_sector(sector))
+
+
+# Rectángulo indexado (base 1, inclusivo) con su valor y orden de inserción
+ElementoEspacial = namedtuple('ElementoEspacial', ['min_row', 'min_col', 'max_row', 'max_col', 'valor', 'orden'])
+
+
+class IndiceEspacial:
+    """
+    Índice espacial por cubetas de filas para anclas de imágenes y rangos combinados.
+
+    Cada rectángulo se registra en todas las cubetas de filas que cubre, así
+    que una consulta solo revisa los elementos de las cubetas que toca, sin
+    recorrer la lista completa. Se conservan todos los elementos aunque
+    compartan celda de anclaje.
+    """
+
+    def __init__(self, elementos, alto_cubeta=32):
+        """:param elementos: iterable de (min_row, min_col, max_row, max_col, valor)"""
+        self.alto_cubeta = alto_cubeta
+        self.elementos = []
+        self._cubetas = defaultdict(list)
+        for orden, (min_row, min_col, max_row, max_col, valor) in enumerate(elementos):
+            elemento = ElementoEspacial(min(min_row, max_row), min(min_col, max_col),
+                                        max(min_row, max_row), max(min_col, max_col), valor, orden)
+            self.elementos.append(elemento)
+            for cubeta in range(elemento.min_row // alto_cubeta, elemento.max_row // alto_cubeta + 1):
+                self._cubetas[cubeta].append(elemento)
+
+    def __len__(self):
+        return len(self.elementos)
+
+    def superpuestos(self, min_row, min_col, max_row, max_col):
+        """Elementos que se solapan con el rectángulo, en orden de inserción"""
+        encontrados = {}
+        for cubeta in range(min_row // self.alto_cubeta, max_row // self.alto_cubeta + 1):
+            for e in self._cubetas.get(cubeta, ()):
+                if (e.orden not in encontrados and e.min_row <= max_row and e.max_row >= min_row
+                        and e.min_col <= max_col and e.max_col >= min_col):
+                    encontrados[e.orden] = e
+        return [encontrados[orden] for orden in sorted(encontrados)]
+
+    def contenedor(self, fila, col):
+        """Primer elemento que contiene la celda (ej. el rango combinado de una celda) o None"""
+        for e in self._cubetas.get(fila // self.alto_cubeta, ()):
+            if e.min_row <= fila <= e.max_row and e.min_col <= col <= e.max_col:
+                return e
+        return None
+
+    def cercanos(self, min_row, min_col, max_row, max_col, fila_ref, col_ref):
+        """
+        Elementos que se solapan con el rectángulo, ordenados por cercanía.
+
+        Primero los anclados (esquina superior izquierda) dentro del rectángulo,
+        luego por distancia de esa esquina a la celda de referencia.
+        """
+        def _clave(e):
+            anclado_dentro = min_row <= e.min_row <= max_row and min_col <= e.min_col <= max_col
+            distancia = abs(e.min_row - fila_ref) + abs(e.min_col - col_ref)
+            return (not anclado_dentro, distancia, e.orden)
+
+        return sorted(self.superpuestos(min_row, min_col, max_row, max_col), key=_clave)
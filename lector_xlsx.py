@@ -0,0 +1,347 @@
+import posixpath
+import xml.etree.ElementTree as ET
+import zipfile
+from collections import namedtuple
+
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+from openpyxl.utils.cell import coordinate_to_tuple
+from openpyxl.utils.datetime import from_excel
+from openpyxl.worksheet.cell_range import CellRange
+
+from indices_hoja import IndiceEspacial
+
+# Espacios de nombres de SpreadsheetML / DrawingML usados en las partes del xlsx
+NS_MAIN = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+NS_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+NS_PKG_REL = 'http://schemas.openxmlformats.org/package/2006/relationships'
+NS_XDR = 'http://schemas.openxmlformats.org/drawingml/2006/spreadsheetDrawing'
+NS_A = 'http://schemas.openxmlformats.org/drawingml/2006/main'
+
+TIPO_REL_HOJA = NS_REL + '/worksheet'
+TIPO_REL_DIBUJO = NS_REL + '/drawing'
+TIPO_REL_CADENAS = NS_REL + '/sharedStrings'
+TIPO_REL_ESTILOS = NS_REL + '/styles'
+
+# Posición (base 1, como Excel) de una imagen anclada y la ruta de su media dentro del zip.
+# emu: (dx, dy, dx_fin, dy_fin, ancho, alto) en EMU; desplazamientos dentro de las celdas
+# from/to y, en oneCellAnchor, el tamaño (ancho/alto None en twoCellAnchor)
+AnclaImagen = namedtuple('AnclaImagen', ['fila', 'col', 'fila_fin', 'col_fin', 'media', 'emu'],
+                         defaults=(None,))
+EMU_POR_PIXEL = 9525
+
+
+def _q(ns, tag):
+    return f'{{{ns}}}{tag}'
+
+
+def ruta_rels(parte):
+    """xl/worksheets/sheet1.xml -> xl/worksheets/_rels/sheet1.xml.rels"""
+    carpeta, archivo = posixpath.split(parte)
+    return posixpath.join(carpeta, '_rels', archivo + '.rels')
+
+
+def _resolver_destino(parte, destino):
+    """Resuelve el Target de una relación respecto a la parte que la declara"""
+    if destino.startswith('/'):
+        return destino.lstrip('/')
+    return posixpath.normpath(posixpath.join(posixpath.dirname(parte), destino))
+
+
+def leer_relaciones(zf, parte):
+    """Devuelve {rId: (tipo, ruta_destino)} de la parte indicada (vacío si no tiene rels)"""
+    try:
+        raiz = ET.fromstring(zf.read(ruta_rels(parte)))
+    except KeyError:
+        return {}
+    relaciones = {}
+    for rel in raiz.iter(_q(NS_PKG_REL, 'Relationship')):
+        if rel.get('TargetMode') == 'External':
+            continue
+        relaciones[rel.get('Id')] = (rel.get('Type'), _resolver_destino(parte, rel.get('Target')))
+    return relaciones
+
+
+def resolver_hojas(zf):
+    """
+    Lista las rutas de las hojas de cálculo en el orden del libro.
+
+    El índice de la lista coincide con el de wb.worksheets en openpyxl (las
+    hojas de gráfico se omiten), que es el que usa config['hojas'].
+    """
+    raiz = ET.fromstring(zf.read('xl/workbook.xml'))
+    relaciones = leer_relaciones(zf, 'xl/workbook.xml')
+    hojas = []
+    for hoja in raiz.iter(_q(NS_MAIN, 'sheet')):
+        tipo, ruta = relaciones.get(hoja.get(_q(NS_REL, 'id')), (None, None))
+        if tipo == TIPO_REL_HOJA:
+            hojas.append(ruta)
+    return hojas
+
+
+def parte_libro(zf, tipo_rel):
+    """Ruta de una parte del libro (sharedStrings, styles...) o None si no existe"""
+    for tipo, ruta in leer_relaciones(zf, 'xl/workbook.xml').values():
+        if tipo == tipo_rel:
+            return ruta
+    return None
+
+
+def _celda_ancla(elemento):
+    """Convierte un <xdr:from>/<xdr:to> (base 0) en (fila, col) base 1"""
+    fila = int(elemento.find(_q(NS_XDR, 'row')).text) + 1
+    col = int(elemento.find(_q(NS_XDR, 'col')).text) + 1
+    return fila, col
+
+
+def _desplazamiento_ancla(elemento):
+    """(colOff, rowOff) en EMU de un <xdr:from>/<xdr:to>"""
+    def _valor(tag):
+        nodo = elemento.find(_q(NS_XDR, tag))
+        return int(nodo.text) if nodo is not None and nodo.text else 0
+    return _valor('colOff'), _valor('rowOff')
+
+
+class ExtractorMedios:
+    """
+    Lee anclas de imágenes y sus bytes directamente del zip del xlsx.
+
+    Solo se parsean workbook.xml, los rels y los drawingN.xml; los bytes de
+    xl/media/* se leen bajo demanda, nunca todas las fotos a la vez.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.zip = zipfile.ZipFile(file_path)
+        self.hojas = resolver_hojas(self.zip)
+        self._anclas = {}
+        self._combinados = {}
+        self._indices = {}
+
+    def anclas(self, sheet_index):
+        """Tabla de anclas (AnclaImagen) de todas las imágenes de la hoja"""
+        if sheet_index not in self._anclas:
+            self._anclas[sheet_index] = self._leer_anclas(self.hojas[sheet_index])
+        return self._anclas[sheet_index]
+
+    def _leer_anclas(self, parte_hoja):
+        anclas = []
+        for tipo, ruta_dibujo in leer_relaciones(self.zip, parte_hoja).values():
+            if tipo != TIPO_REL_DIBUJO:
+                continue
+            medios = leer_relaciones(self.zip, ruta_dibujo)
+            raiz = ET.fromstring(self.zip.read(ruta_dibujo))
+            for nombre in ('twoCellAnchor', 'oneCellAnchor'):
+                for ancla in raiz.iter(_q(NS_XDR, nombre)):
+                    desde = ancla.find(_q(NS_XDR, 'from'))
+                    blip = ancla.find(f"{_q(NS_XDR, 'pic')}/{_q(NS_XDR, 'blipFill')}/{_q(NS_A, 'blip')}")
+                    if desde is None or blip is None:
+                        continue
+                    rel = medios.get(blip.get(_q(NS_REL, 'embed')))
+                    if rel is None:
+                        continue
+                    fila, col = _celda_ancla(desde)
+                    dx, dy = _desplazamiento_ancla(desde)
+                    hasta = ancla.find(_q(NS_XDR, 'to'))
+                    if hasta is not None:
+                        fila_fin, col_fin = _celda_ancla(hasta)
+                        emu = (dx, dy) + _desplazamiento_ancla(hasta) + (None, None)
+                    else:
+                        fila_fin, col_fin = fila, col
+                        ext = ancla.find(_q(NS_XDR, 'ext'))
+                        ancho = int(ext.get('cx', 0)) if ext is not None else 0
+                        alto = int(ext.get('cy', 0)) if ext is not None else 0
+                        emu = (dx, dy, 0, 0, ancho, alto)
+                    anclas.append(AnclaImagen(fila, col, fila_fin, col_fin, rel[1], emu))
+        return anclas
+
+    def indice_imagenes(self, sheet_index):
+        """Índice espacial de las imágenes de la hoja sobre su extensión completa (from/to)"""
+        clave = ('imagenes', sheet_index)
+        if clave not in self._indices:
+            self._indices[clave] = IndiceEspacial(
+                (a.fila, a.col, a.fila_fin, a.col_fin, a) for a in self.anclas(sheet_index))
+        return self._indices[clave]
+
+    def indice_combinados(self, sheet_index):
+        """Índice espacial de los rangos combinados de la hoja (valor: CellRange)"""
+        clave = ('combinados', sheet_index)
+        if clave not in self._indices:
+            self._indices[clave] = IndiceEspacial(
+                (r.min_row, r.min_col, r.max_row, r.max_col, r) for r in self.rangos_combinados(sheet_index))
+        return self._indices[clave]
+
+    def rangos_combinados(self, sheet_index):
+        """Rangos combinados de la hoja como CellRange, leyendo el xml en streaming"""
+        if sheet_index not in self._combinados:
+            rangos = []
+            with self.zip.open(self.hojas[sheet_index]) as f:
+                for _, elem in ET.iterparse(f):
+                    if elem.tag == _q(NS_MAIN, 'mergeCell'):
+                        rangos.append(CellRange(elem.get('ref')))
+                    elif elem.tag == _q(NS_MAIN, 'row'):
+                        elem.clear()
+            self._combinados[sheet_index] = rangos
+        return self._combinados[sheet_index]
+
+    def firma_medio(self, ancla):
+        """CRC y tamaño de la media según el zip, para identificar su contenido sin leerla"""
+        info = self.zip.getinfo(ancla.media)
+        return f"{info.CRC:08x}:{info.file_size}"
+
+    def leer_bytes(self, ancla):
+        """Bytes originales de la imagen (solo se descomprime la media pedida)"""
+        return self.zip.read(ancla.media)
+
+    def cerrar(self):
+        self.zip.close()
+
+
+class LectorCeldas:
+    """
+    Lee celdas puntuales sin cargar el workbook completo.
+
+    Solo se recorren en streaming los sheetN.xml pedidos (cortando en cuanto se
+    pasa la última fila buscada) y, si hace falta, sharedStrings.xml. Los
+    valores son los cacheados por Excel, igual que openpyxl con data_only=True.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.zip = zipfile.ZipFile(file_path)
+        self.hojas = resolver_hojas(self.zip)
+        self._formatos_fecha = None
+        self._cadenas_completas = None
+
+    def leer(self, pedidos):
+        """
+        Lee varias celdas de varias hojas en una sola pasada por hoja.
+
+        :param pedidos: {indice_hoja: iterable de coordenadas ('H7', ...)}
+        :return: {(indice_hoja, coordenada): valor}; las celdas vacías no aparecen
+        """
+        crudos = {}
+        for sheet_index, celdas in pedidos.items():
+            buscadas = {c.replace('$', '').upper() for c in celdas}
+            if not buscadas:
+                continue
+            parte = self.hojas[sheet_index]
+            for coord, crudo in self._leer_hoja(parte, buscadas).items():
+                crudos[(sheet_index, coord)] = crudo
+
+        indices = {int(valor) for tipo, valor, _ in crudos.values() if tipo == 's' and valor is not None}
+        compartidas = self._leer_cadenas(indices) if indices else {}
+
+        return {clave: self._convertir(tipo, valor, estilo, compartidas)
+                for clave, (tipo, valor, estilo) in crudos.items()}
+
+    def _leer_hoja(self, parte, buscadas):
+        ultima_fila = max(coordinate_to_tuple(c)[0] for c in buscadas)
+        encontrados = {}
+        with self.zip.open(parte) as f:
+            for evento, elem in ET.iterparse(f, events=('start', 'end')):
+                if evento == 'start':
+                    # Las filas vienen ordenadas: al pasar la última buscada se corta
+                    if elem.tag == _q(NS_MAIN, 'row') and int(elem.get('r', 0)) > ultima_fila:
+                        break
+                    continue
+                if elem.tag == _q(NS_MAIN, 'c'):
+                    ref = elem.get('r')
+                    if ref in buscadas:
+                        tipo = elem.get('t', 'n')
+                        if tipo == 'inlineStr':
+                            valor = ''.join(t.text or '' for t in elem.iter(_q(NS_MAIN, 't')))
+                        else:
+                            valor = elem.findtext(_q(NS_MAIN, 'v'))
+                        encontrados[ref] = (tipo, valor, elem.get('s'))
+                        if len(encontrados) == len(buscadas):
+                            break
+                elif elem.tag == _q(NS_MAIN, 'row'):
+                    elem.clear()
+        return encontrados
+
+    def iterar_celdas(self, sheet_index):
+        """
+        Recorre en streaming todas las celdas con valor de una hoja.
+
+        Genera (fila, col, valor) en orden de filas; se usa para indexar hojas
+        enteras (ej. torres) sin construir el modelo de openpyxl.
+        """
+        with self.zip.open(self.hojas[sheet_index]) as f:
+            for _, elem in ET.iterparse(f):
+                if elem.tag == _q(NS_MAIN, 'c'):
+                    tipo = elem.get('t', 'n')
+                    if tipo == 'inlineStr':
+                        valor = ''.join(t.text or '' for t in elem.iter(_q(NS_MAIN, 't')))
+                    else:
+                        valor = elem.findtext(_q(NS_MAIN, 'v'))
+                    if valor is None or elem.get('r') is None:
+                        continue
+                    if tipo == 's' and self._cadenas_completas is None:
+                        self._cadenas_completas = self._leer_cadenas(None)
+                    fila, col = coordinate_to_tuple(elem.get('r'))
+                    yield fila, col, self._convertir(tipo, valor, elem.get('s'), self._cadenas_completas)
+                elif elem.tag == _q(NS_MAIN, 'row'):
+                    elem.clear()
+
+    def _leer_cadenas(self, indices):
+        """Lee de sharedStrings.xml las cadenas con los índices pedidos (None = todas)"""
+        ruta = parte_libro(self.zip, TIPO_REL_CADENAS)
+        if ruta is None:
+            return {}
+        ultimo = max(indices) if indices is not None else None
+        cadenas = {}
+        actual = 0
+        with self.zip.open(ruta) as f:
+            for _, elem in ET.iterparse(f):
+                if elem.tag != _q(NS_MAIN, 'si'):
+                    continue
+                if indices is None or actual in indices:
+                    cadenas[actual] = texto_cadena(elem)
+                elem.clear()
+                if ultimo is not None and actual >= ultimo:
+                    break
+                actual += 1
+        return cadenas
+
+    def _convertir(self, tipo, valor, estilo, compartidas):
+        if valor is None:
+            return None
+        if tipo == 's':
+            return compartidas.get(int(valor))
+        if tipo in ('str', 'inlineStr', 'e', 'd'):
+            return valor
+        if tipo == 'b':
+            return valor == '1'
+        numero = float(valor) if any(c in valor for c in '.eE') else int(valor)
+        if estilo is not None and int(estilo) in self._obtener_formatos_fecha():
+            return from_excel(numero)
+        return numero
+
+    def _obtener_formatos_fecha(self):
+        """Índices de cellXfs cuyo formato numérico es de fecha (se lee styles.xml una vez)"""
+        if self._formatos_fecha is None:
+            self._formatos_fecha = set()
+            ruta = parte_libro(self.zip, TIPO_REL_ESTILOS)
+            if ruta is not None:
+                raiz = ET.fromstring(self.zip.read(ruta))
+                formatos = dict(BUILTIN_FORMATS)
+                for fmt in raiz.iter(_q(NS_MAIN, 'numFmt')):
+                    formatos[int(fmt.get('numFmtId'))] = fmt.get('formatCode')
+                cell_xfs = raiz.find(_q(NS_MAIN, 'cellXfs'))
+                if cell_xfs is not None:
+                    for i, xf in enumerate(cell_xfs.findall(_q(NS_MAIN, 'xf'))):
+                        codigo = formatos.get(int(xf.get('numFmtId', 0)))
+                        if codigo and is_date_format(codigo):
+                            self._formatos_fecha.add(i)
+        return self._formatos_fecha
+
+    def cerrar(self):
+        self.zip.close()
+
+
+def texto_cadena(si):
+    """Texto de un <si>/<is>: texto plano o concatenación de runs (sin fonética)"""
+    t = si.find(_q(NS_MAIN, 't'))
+    if t is not None:
+        return t.text or ''
+    return ''.join(r.findtext(_q(NS_MAIN, 't')) or '' for r in si.findall(_q(NS_MAIN, 'r')))
@@ -0,0 +1,78 @@
+import hashlib
+import json
+import os
+import time
+
+from cache_extraccion import hash_archivo
+
+MANIFIESTO_PATH = "manifiesto_sids.json"
+
+
+def hash_config(config, opciones=None):
+    """
+    Hash de la configuración completa (cualquier cambio puede alterar el SID) y
+    de las opciones de la CLI que la sobrescriben (backend de captura, escritor).
+    """
+    texto = json.dumps({'config': config, 'opciones': opciones or {}}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+
+class ManifiestoLote:
+    """
+    Registro de la última ejecución por TSS: hash de entrada, de config y de
+    plantilla, y el SID generado. Permite el modo incremental, que solo procesa
+    los TSS nuevos o cambiados, o aquellos cuyo SID ya no existe.
+    """
+
+    def __init__(self, config, plantilla_path, path=MANIFIESTO_PATH, opciones=None):
+        """:param opciones: valores resueltos que no están en config (ej. {'captura': ..., 'escritor': ...})"""
+        self.path = path
+        self.hash_config = hash_config(config, opciones)
+        self.hash_plantilla = hash_archivo(plantilla_path)
+        self.entradas = self._cargar()
+
+    def _cargar(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f).get('archivos', {})
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Manifiesto ilegible ({self.path}), se reconstruye: {str(e)}")
+            return {}
+
+    @staticmethod
+    def _clave(tss_path):
+        return os.path.normpath(tss_path)
+
+    def vigente(self, tss_path, hash_tss):
+        """True si el SID de este TSS está al día y puede saltarse"""
+        entrada = self.entradas.get(self._clave(tss_path))
+        return bool(
+            entrada
+            and entrada['hash_tss'] == hash_tss
+            and entrada['hash_config'] == self.hash_config
+            and entrada['hash_plantilla'] == self.hash_plantilla
+            and os.path.exists(entrada['salida'])
+        )
+
+    def registrar(self, tss_path, hash_tss, salida):
+        self.entradas[self._clave(tss_path)] = {
+            'hash_tss': hash_tss,
+            'hash_config': self.hash_config,
+            'hash_plantilla': self.hash_plantilla,
+            'salida': salida,
+            'fecha': time.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        self.guardar()
+
+    def olvidar(self, tss_path):
+        """Quita la entrada del TSS (su SID se regeneró con errores y ya no está al día)"""
+        if self.entradas.pop(self._clave(tss_path), None) is not None:
+            self.guardar()
+
+    def guardar(self):
+        temporal = f"{self.path}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump({'archivos': self.entradas}, f, ensure_ascii=False, indent=2)
+        os.replace(temporal, self.path)
@@ -0,0 +1,83 @@
+import json
+import os
+import re
+
+from indices_hoja import orden_sector
+
+MANIFIESTO_TECNOLOGIAS = "tecnologias_antenas.json"
+
+# Separadores usados en las etiquetas del TSS: "LTE/UMTS", "LTE-UMTS", "LTE + 5G", "LTE, GSM"
+_SEPARADORES = re.compile(r'[,/\\+\-]|\s+y\s+', re.IGNORECASE)
+
+
+def normalizar_tecnologias(descripcion):
+    """Conjunto de tecnologías (mayúsculas, sin espacios sobrantes) a partir de la descripción"""
+    if not descripcion:
+        return set()
+    return {t.strip().upper() for t in _SEPARADORES.split(descripcion) if t.strip()}
+
+
+class ManifiestoTecnologias:
+    """
+    Antena -> sector -> {imagen, descripcion, tecnologias} de un TSS.
+
+    Se construye una vez a partir de las fotos encontradas y es la única fuente
+    de tecnologías para las etapas del SID, sin volver a leer nombres de archivo.
+    """
+
+    def __init__(self, antenas=None):
+        self.antenas = antenas or {}
+
+    @classmethod
+    def desde_fotos(cls, fotos):
+        """:param fotos: lista de {antena, sector, descripcion, archivo} (ver buscar_antenas_por_sectores)"""
+        manifiesto = cls()
+        for foto in fotos:
+            manifiesto.registrar(foto['antena'], foto['sector'], foto['archivo'], foto.get('descripcion'))
+        return manifiesto
+
+    def registrar(self, antena, sector, imagen, descripcion):
+        self.antenas.setdefault(int(antena), {})[str(sector)] = {
+            'imagen': imagen,
+            'descripcion': descripcion,
+            'tecnologias': sorted(normalizar_tecnologias(descripcion)),
+        }
+
+    def numeros_antenas(self):
+        return sorted(self.antenas)
+
+    def sectores(self, antena):
+        """Sectores de la antena en orden (numéricos por valor, letras alfabéticamente)"""
+        return sorted(self.antenas.get(antena, {}), key=orden_sector)
+
+    def todos_los_sectores(self):
+        return sorted({s for sectores in self.antenas.values() for s in sectores}, key=orden_sector)
+
+    def sector(self, antena, sector):
+        return self.antenas.get(antena, {}).get(sector)
+
+    def tecnologias_sector(self, antena, sector):
+        entrada = self.sector(antena, sector)
+        return list(entrada['tecnologias']) if entrada else []
+
+    def tecnologias_antena(self, antena):
+        """Unión ordenada de las tecnologías de todos los sectores de la antena"""
+        return sorted({t for entrada in self.antenas.get(antena, {}).values() for t in entrada['tecnologias']})
+
+    def sectores_diferentes(self, antena):
+        """True si algún sector de la antena tiene tecnologías distintas a las del primero"""
+        conjuntos = [tuple(self.tecnologias_sector(antena, s)) for s in self.sectores(antena)]
+        return len(set(conjuntos)) > 1
+
+    def guardar(self, path):
+        datos = {str(antena): sectores for antena, sectores in sorted(self.antenas.items())}
+        temporal = f"{path}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump({'antenas': datos}, f, ensure_ascii=False, indent=2)
+        os.replace(temporal, path)
+
+    @classmethod
+    def cargar(cls, path):
+        with open(path, encoding='utf-8') as f:
+            datos = json.load(f)
+        return cls({int(antena): sectores for antena, sectores in datos.get('antenas', {}).items()})
@@ -0,0 +1,113 @@
+"""
+Mapa de formas de la hoja de antenas de la plantilla SID.
+
+La plantilla no cambia entre sitios: sus grupos de antenas, el número de
+antena de cada grupo y los cuadros de texto a sustituir (XXX, TECH{n},
+SECTOR) se analizan una sola vez y se guardan en JSON, con la huella del
+archivo de plantilla como clave. Al generar cada SID se va directo a esas
+formas sin recorrer el dibujo.
+
+Uso: python mapa_plantilla.py --config config.json
+"""
+import argparse
+import json
+import os
+import zipfile
+
+from cache_extraccion import hash_archivo
+from dibujos_plantilla import dibujo_de_hoja
+from lector_xlsx import resolver_hojas
+from plan_extraccion import cargar_plan
+from textos_antenas import analizar_grupos
+
+MAPA_PLANTILLA_FOLDER = "mapa_plantilla"
+# Subir al cambiar el análisis de grupos o el formato del JSON
+VERSION_MAPA = 1
+
+
+class MapaPlantilla:
+    """
+    Grupos de antenas del dibujo de una hoja de la plantilla.
+
+    grupos: [{'nombre', 'antena', 'formas': [{'id', 'nombre', 'inicio', 'fin', 'roles'}]}]
+    con inicio/fin como posiciones de cada forma en el XML del dibujo (ver
+    textos_antenas.analizar_grupos); solo valen para ese XML tal cual está en la plantilla.
+    """
+
+    def __init__(self, hash_plantilla, hoja, dibujo, grupos):
+        self.hash_plantilla = hash_plantilla
+        self.hoja = hoja
+        self.dibujo = dibujo
+        self.grupos = grupos
+
+    @classmethod
+    def analizar(cls, plantilla_path, sheet_index, hash_plantilla=None):
+        """Analiza el dibujo de la hoja (índice base 0) de la plantilla"""
+        with zipfile.ZipFile(plantilla_path) as zf:
+            dibujo = dibujo_de_hoja(zf, resolver_hojas(zf)[sheet_index])
+            grupos = analizar_grupos(zf.read(dibujo).decode('utf-8')) if dibujo else []
+        return cls(hash_plantilla or hash_archivo(plantilla_path), sheet_index, dibujo, grupos)
+
+    def a_dict(self):
+        return {
+            'version': VERSION_MAPA,
+            'hash_plantilla': self.hash_plantilla,
+            'hoja': self.hoja,
+            'dibujo': self.dibujo,
+            'grupos': self.grupos,
+        }
+
+    @classmethod
+    def desde_dict(cls, datos):
+        return cls(datos['hash_plantilla'], datos['hoja'], datos['dibujo'], datos['grupos'])
+
+    def imprimir(self):
+        print(f"\nHoja {self.hoja} - dibujo: {self.dibujo or '[sin dibujo]'}")
+        for grupo in self.grupos:
+            print(f"\nGrupo: {grupo['nombre']} → antena {grupo['antena'] if grupo['antena'] else '?'}")
+            for forma in grupo['formas']:
+                print(f"  ├ {forma['nombre']} (id {forma['id']}): {', '.join(forma['roles'])}")
+
+
+def cargar_mapa_plantilla(plantilla_path, sheet_index, folder=MAPA_PLANTILLA_FOLDER):
+    """
+    Mapa de la hoja desde el JSON de la versión actual de la plantilla, o
+    analizándola y guardándolo si no existe (o es de otra versión del mapa).
+    """
+    hash_plantilla = hash_archivo(plantilla_path)
+    ruta = os.path.join(folder, f"{hash_plantilla}_{sheet_index}.json")
+    try:
+        with open(ruta, encoding='utf-8') as f:
+            datos = json.load(f)
+        if datos.get('version') == VERSION_MAPA:
+            print(f"🗺️ Mapa de la plantilla cargado: {ruta}")
+            return MapaPlantilla.desde_dict(datos)
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, KeyError) as e:
+        print(f"⚠️ Mapa de la plantilla ilegible, se vuelve a analizar: {str(e)}")
+
+    mapa = MapaPlantilla.analizar(plantilla_path, sheet_index, hash_plantilla)
+    os.makedirs(folder, exist_ok=True)
+    temporal = f"{ruta}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(mapa.a_dict(), f, ensure_ascii=False, indent=2)
+    os.replace(temporal, ruta)
+    print(f"🗺️ Plantilla analizada: {len(mapa.grupos)} grupos de antenas, mapa en {ruta}")
+    return mapa
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analiza la hoja de antenas de la plantilla SID y guarda su mapa")
+    parser.add_argument("--config", default="config.json", help="Archivo de configuración JSON")
+    parser.add_argument("--folder", default=MAPA_PLANTILLA_FOLDER, help="Carpeta de los mapas")
+    args = parser.parse_args()
+
+    plan = cargar_plan(args.config)
+    plan.validar_plantilla()
+    mapa = cargar_mapa_plantilla(plan.config['nombre_sid']['plantilla'], plan.indices_sid['antenas'], args.folder)
+    mapa.imprimir()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+import os
+import posixpath
+import re
+import time
+import zipfile
+from xml.sax.saxutils import escape
+
+from openpyxl.utils.cell import coordinate_to_tuple, get_column_letter
+
+from dibujos_plantilla import (TIPO_CONTENIDO_DIBUJO, TiposContenido, agregar_anclajes, agregar_tipos,
+                               copiar_entrada_cruda, dibujo_de_hoja, insertar_elemento_dibujo, leer_rels_crudas,
+                               relativa, xml_rels)
+from escritor_sid import (EMU_POR_PUNTO, PUNTOS_POR_CM, TAMANO_FOTO_ANTENA_CM, geometrias_de, rectangulo_centrado,
+                          rectangulos_imagen, tabla_posiciones_antenas)
+from plantilla_maestra import abrir_plantilla, maestra_de
+from textos_antenas import SustitucionTextosAntenas
+from lector_xlsx import NS_A, NS_REL, NS_XDR, TIPO_REL_DIBUJO, resolver_hojas, ruta_rels
+
+TIPO_REL_IMAGEN = NS_REL + '/image'
+# Tipo de contenido por extensión de las imágenes que se añaden a xl/media
+TIPOS_IMAGEN = {
+    'png': 'image/png', 'jpg': 'image/jpeg', 'jpeg': 'image/jpeg', 'gif': 'image/gif',
+    'bmp': 'image/bmp', 'tif': 'image/tiff', 'tiff': 'image/tiff', 'emf': 'image/x-emf', 'wmf': 'image/x-wmf',
+}
+PREFIJO_SID = 'sid_'
+
+_ATRIBUTO_R = re.compile(r'\sr="([A-Z]*)(\d+)"')
+_ATRIBUTO_S = re.compile(r'\ss="(\d+)"')
+_ATRIBUTO_SPANS = re.compile(r'\sspans="[^"]*"')
+_ID_FORMA = re.compile(rb'<(?:\w+:)?cNvPr\b[^>]*?\sid="(\d+)"')
+
+
+def _xml_celda(prefijo, coordenada, valor, estilo):
+    """<c> con el valor como número, booleano o cadena en línea (sin tocar sharedStrings)"""
+    estilo = f' s="{estilo}"' if estilo else ''
+    if valor is None or valor == '':
+        return f'<{prefijo}c r="{coordenada}"{estilo}/>'
+    if isinstance(valor, bool):
+        return f'<{prefijo}c r="{coordenada}"{estilo} t="b"><{prefijo}v>{int(valor)}</{prefijo}v></{prefijo}c>'
+    if isinstance(valor, (int, float)):
+        return f'<{prefijo}c r="{coordenada}"{estilo}><{prefijo}v>{valor!r}</{prefijo}v></{prefijo}c>'
+    return (f'<{prefijo}c r="{coordenada}"{estilo} t="inlineStr"><{prefijo}is>'
+            f'<{prefijo}t xml:space="preserve">{escape(str(valor))}</{prefijo}t></{prefijo}is></{prefijo}c>')
+
+
+def _parchear_fila(fila_xml, celdas, prefijo):
+    """
+    Reescribe las celdas pedidas de un <row> ({columna: (coordenada, valor)}),
+    conservando su estilo y el orden por columna del resto.
+    """
+    apertura_fin = fila_xml.index('>') + 1
+    if fila_xml[apertura_fin - 2] == '/':
+        apertura, interior = fila_xml[:apertura_fin - 2] + '>', ''
+    else:
+        apertura, interior = fila_xml[:apertura_fin], fila_xml[apertura_fin:fila_xml.rindex('<')]
+    # spans es solo una pista de optimización y puede quedar desfasado
+    apertura = _ATRIBUTO_SPANS.sub('', apertura)
+
+    piezas = []
+    pendientes = dict(celdas)
+    col_implicita = 0
+    for celda in re.finditer(rf'<{prefijo}c\b[^>]*?(?:/>|>.*?</{prefijo}c>)', interior, re.S):
+        etiqueta = celda.group(0)[:celda.group(0).index('>')]
+        referencia = _ATRIBUTO_R.search(etiqueta)
+        col = coordinate_to_tuple(f"{referencia.group(1)}1")[1] if referencia else col_implicita + 1
+        col_implicita = col
+        for pendiente in sorted(c for c in pendientes if c < col):
+            piezas.append(_xml_celda(prefijo, *pendientes.pop(pendiente), None))
+        if col in pendientes:
+            estilo = _ATRIBUTO_S.search(etiqueta)
+            piezas.append(_xml_celda(prefijo, *pendientes.pop(col), estilo.group(1) if estilo else None))
+        else:
+            piezas.append(celda.group(0))
+    for pendiente in sorted(pendientes):
+        piezas.append(_xml_celda(prefijo, *pendientes[pendiente], None))
+    return f"{apertura}{''.join(piezas)}</{prefijo}row>"
+
+
+def escribir_celdas(xml, valores):
+    """
+    Escribe {coordenada: valor} en el <sheetData> de una hoja sin cargarla entera:
+    solo se reescriben las filas afectadas y las que falten se insertan en orden.
+    """
+    por_fila = {}
+    for coordenada, valor in valores.items():
+        fila, col = coordinate_to_tuple(coordenada)
+        por_fila.setdefault(fila, {})[col] = (f"{get_column_letter(col)}{fila}", valor)
+
+    datos = re.search(r'<((?:\w+:)?)sheetData\b[^>]*?(/?)>', xml)
+    prefijo = datos.group(1)
+    if datos.group(2):
+        xml = f"{xml[:datos.start()]}<{prefijo}sheetData></{prefijo}sheetData>{xml[datos.end():]}"
+        inicio = fin = datos.start() + len(f"<{prefijo}sheetData>")
+    else:
+        inicio = datos.end()
+        fin = xml.index(f"</{prefijo}sheetData>", inicio)
+    contenido = xml[inicio:fin]
+
+    piezas = []
+    posicion = 0
+    fila_implicita = 0
+    for fila in re.finditer(rf'<{prefijo}row\b[^>]*?(?:/>|>.*?</{prefijo}row>)', contenido, re.S):
+        referencia = _ATRIBUTO_R.search(fila.group(0)[:fila.group(0).index('>')])
+        numero = int(referencia.group(2)) if referencia else fila_implicita + 1
+        fila_implicita = numero
+        piezas.append(contenido[posicion:fila.start()])
+        posicion = fila.end()
+        for pendiente in sorted(f for f in por_fila if f < numero):
+            piezas.append(_parchear_fila(f'<{prefijo}row r="{pendiente}"/>', por_fila.pop(pendiente), prefijo))
+        if numero in por_fila:
+            piezas.append(_parchear_fila(fila.group(0), por_fila.pop(numero), prefijo))
+        else:
+            piezas.append(fila.group(0))
+    piezas.append(contenido[posicion:])
+    for pendiente in sorted(por_fila):
+        piezas.append(_parchear_fila(f'<{prefijo}row r="{pendiente}"/>', por_fila[pendiente], prefijo))
+    return xml[:inicio] + ''.join(piezas) + xml[fin:]
+
+
+def xml_anclaje_imagen(geometria, izquierda, arriba, ancho, alto, id_forma, id_rel, nombre):
+    """oneCellAnchor con una imagen (se mueve con las celdas), con sus propios xmlns"""
+    col, dx, fila, dy = geometria.celda_en(max(izquierda, 0), max(arriba, 0))
+    cx, cy = round(ancho * EMU_POR_PUNTO), round(alto * EMU_POR_PUNTO)
+    return (
+        f'<xdr:oneCellAnchor xmlns:xdr="{NS_XDR}" xmlns:a="{NS_A}" xmlns:r="{NS_REL}">'
+        f'<xdr:from><xdr:col>{col}</xdr:col><xdr:colOff>{round(dx * EMU_POR_PUNTO)}</xdr:colOff>'
+        f'<xdr:row>{fila}</xdr:row><xdr:rowOff>{round(dy * EMU_POR_PUNTO)}</xdr:rowOff></xdr:from>'
+        f'<xdr:ext cx="{cx}" cy="{cy}"/>'
+        f'<xdr:pic><xdr:nvPicPr><xdr:cNvPr id="{id_forma}" name="{escape(nombre)}"/>'
+        f'<xdr:cNvPicPr><a:picLocks noChangeAspect="1"/></xdr:cNvPicPr></xdr:nvPicPr>'
+        f'<xdr:blipFill><a:blip r:embed="{id_rel}"/><a:stretch><a:fillRect/></a:stretch></xdr:blipFill>'
+        f'<xdr:spPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="{cx}" cy="{cy}"/></a:xfrm>'
+        f'<a:prstGeom prst="rect"><a:avLst/></a:prstGeom></xdr:spPr></xdr:pic>'
+        f'<xdr:clientData/></xdr:oneCellAnchor>'
+    ).encode('utf-8')
+
+
+class EscritorSIDOoxml:
+    """
+    Genera el SID parcheando el paquete OOXML de la plantilla, sin Excel ni openpyxl.
+
+    La plantilla se recorre entrada a entrada: las partes que no cambian se
+    copian con sus bytes comprimidos tal cual y solo se reescriben las hojas
+    con textos o imágenes, sus dibujos y .rels, [Content_Types].xml y las
+    imágenes nuevas de xl/media. Los dibujos de la plantilla se conservan (las
+    imágenes se añaden al final de cada dibujo) y en el de antenas se sustituyen
+    los títulos y sectores (ver textos_antenas).
+    """
+
+    def __init__(self, plan, mapa_plantilla=None):
+        """:param mapa_plantilla: MapaPlantilla de la hoja de antenas (evita analizar su dibujo en cada SID)"""
+        if plan.rangos_por_modo['celdas']:
+            nombres = ', '.join(e['nombre'] for e in plan.rangos_por_modo['celdas'])
+            raise ValueError(f"El escritor 'ooxml' no pega rangos como celdas ({nombres}); "
+                             f"usa destino.modo 'imagen' o el escritor 'openpyxl'")
+        self.plan = plan
+        self.mapa_plantilla = mapa_plantilla
+        self.geometrias = None
+        self.plantilla = None  # PlantillaMaestra del lote
+
+    def escribir(self, tss_instance, plantilla_path, output_path):
+        """Genera el SID. Devuelve False si alguna imagen o foto de antena no se pudo insertar"""
+        print("\n=== GENERANDO SID (ooxml) ===")
+        inicio = time.monotonic()
+        with tss_instance.sesion.cronometro.etapa('carga_plantilla'):
+            # Bytes y partes de la plantilla leídos una vez por lote
+            self.plantilla = maestra_de(self.plantilla, plantilla_path)
+        self.geometrias = geometrias_de(self.geometrias, self.plantilla)
+        with abrir_plantilla(self.plantilla) as plantilla:
+            self._plantilla = plantilla
+            self._nombres = set(plantilla.namelist())
+            self._nuevas = {}  # parte -> bytes (nuevas o reemplazadas)
+            self._tipos_nuevos = {}  # parte -> tipo de contenido (Override)
+            self._extensiones_nuevas = {}
+            self._medios = {}  # (st_dev, st_ino) de la imagen -> parte en xl/media
+            self._omitidas = 0  # Imágenes y fotos de antenas que no se pudieron insertar
+            hojas = resolver_hojas(plantilla)
+
+            for sheet_index in sorted(set(self.plan.por_hoja_destino) | {self.plan.indices_sid['antenas']}):
+                self._parchear_hoja(tss_instance, sheet_index, hojas[sheet_index])
+
+            if self._tipos_nuevos or self._extensiones_nuevas:
+                self._nuevas['[Content_Types].xml'] = agregar_tipos(
+                    plantilla.read('[Content_Types].xml').decode('utf-8'),
+                    TiposContenido(plantilla.read('[Content_Types].xml')),
+                    self._extensiones_nuevas, self._tipos_nuevos)
+
+            with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as salida:
+                for info in plantilla.infolist():
+                    if info.filename in self._nuevas:
+                        salida.writestr(info.filename, self._nuevas.pop(info.filename))
+                    else:
+                        copiar_entrada_cruda(plantilla, salida, info)
+                for parte, datos in self._nuevas.items():
+                    # Las imágenes ya van comprimidas: se guardan sin deflate
+                    tipo = zipfile.ZIP_STORED if parte.startswith('xl/media/') else zipfile.ZIP_DEFLATED
+                    salida.writestr(parte, datos, compress_type=tipo)
+
+        print(f"\n✅ SID generado correctamente en: {os.path.abspath(output_path)} "
+              f"({time.monotonic() - inicio:.2f} s)")
+        return self._omitidas == 0
+
+    def _parchear_hoja(self, tss_instance, sheet_index, hoja):
+        elementos_hoja = self.plan.por_hoja_destino.get(sheet_index, ())
+        xml = self._plantilla.read(hoja).decode('utf-8')
+        xml_original = xml
+
+        valores = {}
+        for elemento in elementos_hoja:
+            nombre = elemento['nombre']
+            if elemento['tipo'] == 'texto' and nombre in tss_instance.data['textos']:
+                for celda in elemento['destino']['celdas']:
+                    valores[celda] = tss_instance.data['textos'][nombre]
+                    print(f"Texto '{nombre}' insertado en {celda}")
+        if valores:
+            xml = escribir_celdas(xml, valores)
+
+        # Escribir textos no cambia anchos ni altos: vale la geometría de la plantilla
+        geometria = self.geometrias.hoja(sheet_index)
+        imagenes = []  # (ruta, izquierda, arriba, ancho, alto) en puntos
+        for elemento in elementos_hoja:
+            nombre = elemento['nombre']
+            if elemento['tipo'] not in ('imagen', 'rango') or nombre not in tss_instance.data['imagenes']:
+                continue
+            img_path = os.path.abspath(tss_instance.data['imagenes'][nombre])
+            metadatos = tss_instance.metadatos_imagen(img_path)
+            if metadatos is None:
+                print(f"❌ Imagen no encontrada para '{nombre}': {img_path}")
+                self._omitidas += 1
+                continue
+            for celda, izquierda, arriba, ancho, alto in rectangulos_imagen(geometria, elemento['destino'], metadatos):
+                imagenes.append((img_path, izquierda, arriba, ancho, alto))
+                print(f"✅ Imagen '{nombre}' anclada en {celda} - Tamaño: {ancho:.0f}x{alto:.0f} pt")
+        if sheet_index == self.plan.indices_sid['antenas']:
+            imagenes.extend(self._fotos_antenas(tss_instance, geometria))
+            self._textos_antenas(tss_instance, hoja)
+
+        if imagenes:
+            xml = self._agregar_imagenes(hoja, xml, geometria, imagenes)
+        if xml != xml_original:
+            self._nuevas[hoja] = xml.encode('utf-8')
+
+    def _textos_antenas(self, tss_instance, hoja):
+        """Títulos y sectores de los grupos de antenas en el dibujo de la plantilla"""
+        mapa = self.mapa_plantilla
+        dibujo = mapa.dibujo if mapa else dibujo_de_hoja(self._plantilla, hoja)
+        if dibujo is None:
+            print("ℹ️ La hoja de antenas de la plantilla no tiene dibujo")
+            return
+        with tss_instance.sesion.cronometro.etapa('textos_antenas'):
+            sustitucion = SustitucionTextosAntenas(tss_instance.id, tss_instance.tecnologias)
+            self._nuevas[dibujo] = sustitucion.aplicar(self._plantilla.read(dibujo), mapa.grupos if mapa else None)
+
+    def _fotos_antenas(self, tss_instance, geometria):
+        manifiesto = tss_instance.tecnologias
+        if not manifiesto.numeros_antenas():
+            print("ℹ️ El TSS no tiene fotos de antenas")
+            return []
+
+        ancho = TAMANO_FOTO_ANTENA_CM[0] * PUNTOS_POR_CM
+        alto = TAMANO_FOTO_ANTENA_CM[1] * PUNTOS_POR_CM
+        posiciones = tabla_posiciones_antenas(manifiesto.numeros_antenas(), manifiesto.todos_los_sectores())
+        fotos = []
+        for antena, posiciones_sector in posiciones.items():
+            for sector, celda in posiciones_sector.items():
+                entrada = manifiesto.sector(antena, sector)
+                if not entrada:
+                    continue
+                img_path = os.path.abspath(entrada['imagen'])
+                if not tss_instance.metadatos_imagen(img_path):
+                    print(f"❌ Foto no encontrada para antena {antena} sector {sector}: {img_path}")
+                    self._omitidas += 1
+                    continue
+                izquierda, arriba = rectangulo_centrado(geometria, celda, ancho, alto)
+                fotos.append((img_path, izquierda, arriba, ancho, alto))
+                print(f"✅ Insertada {os.path.basename(img_path)} en {celda}")
+        return fotos
+
+    def _agregar_imagenes(self, hoja, xml, geometria, imagenes):
+        """Añade las imágenes al dibujo de la hoja (creándolo si no tiene); devuelve el XML de la hoja"""
+        dibujo = dibujo_de_hoja(self._plantilla, hoja)
+        if dibujo is None:
+            dibujo = self._nombre_libre(f"xl/drawings/{PREFIJO_SID}drawing{len(self._tipos_nuevos) + 1}.xml")
+            self._tipos_nuevos[dibujo] = TIPO_CONTENIDO_DIBUJO
+            xml_dibujo = (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                          f'<xdr:wsDr xmlns:xdr="{NS_XDR}" xmlns:a="{NS_A}"></xdr:wsDr>').encode('utf-8')
+            relaciones_hoja = leer_rels_crudas(self._plantilla, hoja)
+            id_rel = self._id_libre(relaciones_hoja, 'rIdSidDibujo')
+            relaciones_hoja.append((id_rel, TIPO_REL_DIBUJO, relativa(hoja, dibujo), None))
+            self._nuevas[ruta_rels(hoja)] = xml_rels(relaciones_hoja)
+            xml = insertar_elemento_dibujo(xml, id_rel)
+        else:
+            xml_dibujo = self._nuevas.get(dibujo) or self._plantilla.read(dibujo)
+
+        relaciones = leer_rels_crudas(self._plantilla, dibujo)
+        id_forma = max((int(i) for i in _ID_FORMA.findall(xml_dibujo)), default=1)
+        anclajes = []
+        for img_path, izquierda, arriba, ancho, alto in imagenes:
+            id_forma += 1
+            id_rel = self._id_libre(relaciones, 'rIdSid')
+            relaciones.append((id_rel, TIPO_REL_IMAGEN, relativa(dibujo, self._medio(img_path)), None))
+            anclajes.append(xml_anclaje_imagen(geometria, izquierda, arriba, ancho, alto, id_forma, id_rel,
+                                               f"Imagen {id_forma}"))
+
+        self._nuevas[dibujo] = agregar_anclajes(xml_dibujo, anclajes)
+        self._nuevas[ruta_rels(dibujo)] = xml_rels(relaciones)
+        return xml
+
+    def _medio(self, img_path):
+        """Parte de xl/media con la imagen; la misma imagen (mismo archivo) se añade una sola vez"""
+        estado = os.stat(img_path)
+        clave = (estado.st_dev, estado.st_ino)
+        if clave not in self._medios:
+            extension = os.path.splitext(img_path)[1].lstrip('.').lower()
+            parte = self._nombre_libre(f"xl/media/{PREFIJO_SID}image{len(self._medios) + 1}.{extension}")
+            with open(img_path, 'rb') as f:
+                self._nuevas[parte] = f.read()
+            if extension in TIPOS_IMAGEN:
+                self._extensiones_nuevas[extension] = TIPOS_IMAGEN[extension]
+            self._medios[clave] = parte
+        return self._medios[clave]
+
+    def _nombre_libre(self, parte):
+        carpeta, archivo = posixpath.split(parte)
+        base, extension = posixpath.splitext(archivo)
+        candidato, n = parte, 1
+        while candidato in self._nombres or candidato in self._nuevas:
+            n += 1
+            candidato = posixpath.join(carpeta, f"{base}_{n}{extension}")
+        self._nombres.add(candidato)
+        return candidato
+
+    @staticmethod
+    def _id_libre(relaciones, base):
+        usados = {id_rel for id_rel, _, _, _ in relaciones}
+        n = 1
+        while f"{base}{n}" in usados:
+            n += 1
+        return f"{base}{n}"
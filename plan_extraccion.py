@@ -0,0 +1,211 @@
+import json
+import os
+import zipfile
+from collections import defaultdict
+from types import MappingProxyType
+
+from openpyxl.utils.cell import coordinate_to_tuple, range_boundaries
+
+from capturas_rangos import BACKENDS_CAPTURA, OPCIONES_CAPTURA
+from escritor_sid import BACKENDS_ESCRITURA, OPCIONES_ESCRITURA
+from imagenes import MODOS_IMAGEN, OPCIONES_IMAGEN
+from lector_xlsx import resolver_hojas
+
+TIPOS_ELEMENTO = ('texto', 'imagen', 'rango')
+# Cómo llega un 'rango' al SID: como imagen o copiando sus celdas (destino.modo)
+MODOS_DESTINO_RANGO = ('imagen', 'celdas')
+
+
+def cargar_configuracion(config_path):
+    with open(config_path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _congelar(agrupado):
+    return MappingProxyType({clave: tuple(valores) for clave, valores in agrupado.items()})
+
+
+class PlanExtraccion:
+    """
+    Configuración validada y compilada una sola vez por lote.
+
+    Agrupa los elementos por tipo, por hoja de origen (índice TSS) y por hoja
+    destino (índice SID), con los índices de hoja ya resueltos, para que cada
+    hoja se recorra una sola vez por archivo. Las agrupaciones son de solo lectura.
+    """
+
+    def __init__(self, config):
+        errores = validar_configuracion(config)
+        if errores:
+            raise ValueError("Configuración inválida:\n" + "\n".join(f"- {e}" for e in errores))
+
+        self.config = config
+        self.indices_tss = MappingProxyType(dict(config['hojas']['tss']))
+        self.indices_sid = MappingProxyType(dict(config['hojas']['sid']))
+        self.elementos = tuple(config['elementos'])
+        self.opciones_imagenes = MappingProxyType({**OPCIONES_IMAGEN, **config.get('imagenes', {})})
+        self.opciones_captura = MappingProxyType({**OPCIONES_CAPTURA, **config.get('captura_rangos', {})})
+        self.opciones_escritura = MappingProxyType({**OPCIONES_ESCRITURA, **config.get('escritura_sid', {})})
+
+        por_tipo = {tipo: [] for tipo in TIPOS_ELEMENTO}
+        rangos_por_modo = {modo: [] for modo in MODOS_DESTINO_RANGO}
+        por_hoja_origen = defaultdict(list)
+        por_hoja_destino = defaultdict(list)
+        for elemento in self.elementos:
+            por_tipo[elemento['tipo']].append(elemento)
+            if elemento['tipo'] == 'rango':
+                rangos_por_modo[self.modo_destino(elemento)].append(elemento)
+            por_hoja_origen[self.indices_tss[elemento['origen']['hoja']]].append(elemento)
+            por_hoja_destino[self.indices_sid[elemento['destino']['hoja']]].append(elemento)
+
+        self.por_tipo = _congelar(por_tipo)
+        self.rangos_por_modo = _congelar(rangos_por_modo)
+        self.por_hoja_origen = _congelar(por_hoja_origen)
+        self.por_hoja_destino = _congelar(por_hoja_destino)
+
+        # Celdas sueltas del TSS (nombre/id y elementos texto) para leerlas en una pasada
+        campos = config['nombre_sid']['campos']
+        self.celdas_campos = MappingProxyType({
+            campo: (self.indices_tss[c['hoja']], c['celda']) for campo, c in campos.items()
+        })
+        pedidos = defaultdict(set)
+        for sheet_index, celda in self.celdas_campos.values():
+            pedidos[sheet_index].add(celda)
+        for elemento in self.por_tipo['texto']:
+            pedidos[self.indices_tss[elemento['origen']['hoja']]].add(elemento['origen']['celda'])
+        self.pedidos_celdas = MappingProxyType({i: frozenset(c) for i, c in pedidos.items()})
+
+    def indice_origen(self, elemento):
+        return self.indices_tss[elemento['origen']['hoja']]
+
+    def indice_destino(self, elemento):
+        return self.indices_sid[elemento['destino']['hoja']]
+
+    @staticmethod
+    def modo_destino(elemento):
+        return elemento['destino'].get('modo', MODOS_DESTINO_RANGO[0])
+
+    def validar_plantilla(self):
+        """Comprueba que los índices 'sid' existen en la plantilla antes de abrir Excel"""
+        plantilla = self.config['nombre_sid']['plantilla']
+        if not os.path.exists(plantilla):
+            raise ValueError(f"No se encontró la plantilla SID: {plantilla}")
+        with zipfile.ZipFile(plantilla) as zf:
+            total_hojas = len(resolver_hojas(zf))
+        fuera = [f"'{nombre}' (índice {indice})" for nombre, indice in self.indices_sid.items()
+                 if indice >= total_hojas]
+        if fuera:
+            raise ValueError(f"La plantilla {plantilla} solo tiene {total_hojas} hojas; "
+                             f"no existen: {', '.join(fuera)}")
+
+
+def _validar_celda(celda, contexto, errores):
+    try:
+        coordinate_to_tuple(celda)
+    except (ValueError, TypeError, AttributeError):
+        errores.append(f"{contexto}: celda inválida {celda!r}")
+
+
+def validar_configuracion(config):
+    """Devuelve la lista de errores de la configuración (vacía si es válida)"""
+    errores = []
+    hojas = config.get('hojas', {})
+    hojas_tss = hojas.get('tss', {})
+    hojas_sid = hojas.get('sid', {})
+    if not hojas_tss or not hojas_sid:
+        errores.append("Faltan 'hojas.tss' o 'hojas.sid'")
+
+    nombres = set()
+    for i, elemento in enumerate(config.get('elementos', [])):
+        nombre = elemento.get('nombre', f"#{i}")
+        contexto = f"Elemento '{nombre}'"
+        if nombre in nombres:
+            errores.append(f"{contexto}: nombre duplicado")
+        nombres.add(nombre)
+
+        tipo = elemento.get('tipo')
+        if tipo not in TIPOS_ELEMENTO:
+            errores.append(f"{contexto}: tipo desconocido {tipo!r}")
+            continue
+
+        origen = elemento.get('origen', {})
+        destino = elemento.get('destino', {})
+        if origen.get('hoja') not in hojas_tss:
+            errores.append(f"{contexto}: hoja origen {origen.get('hoja')!r} no está en hojas.tss")
+        if destino.get('hoja') not in hojas_sid:
+            errores.append(f"{contexto}: hoja destino {destino.get('hoja')!r} no está en hojas.sid")
+
+        if tipo == 'rango':
+            try:
+                limites = range_boundaries(origen.get('rango', ''))
+            except (ValueError, TypeError):
+                limites = (None,)
+            if None in limites:
+                errores.append(f"{contexto}: rango inválido {origen.get('rango')!r}")
+            if destino.get('modo', MODOS_DESTINO_RANGO[0]) not in MODOS_DESTINO_RANGO:
+                errores.append(f"{contexto}: destino.modo debe ser uno de {MODOS_DESTINO_RANGO}, "
+                               f"no {destino.get('modo')!r}")
+        else:
+            _validar_celda(origen.get('celda'), contexto, errores)
+            if 'modo' in destino:
+                errores.append(f"{contexto}: destino.modo solo aplica a elementos 'rango'")
+
+        if not destino.get('celdas'):
+            errores.append(f"{contexto}: sin celdas destino")
+        for celda in destino.get('celdas', []):
+            _validar_celda(celda, contexto, errores)
+
+    imagenes = config.get('imagenes', {})
+    desconocidas = set(imagenes) - set(OPCIONES_IMAGEN)
+    if desconocidas:
+        errores.append(f"Opciones de 'imagenes' desconocidas: {', '.join(sorted(desconocidas))}")
+    if imagenes.get('modo', OPCIONES_IMAGEN['modo']) not in MODOS_IMAGEN:
+        errores.append(f"'imagenes.modo' debe ser uno de {MODOS_IMAGEN}, no {imagenes.get('modo')!r}")
+    dpi = imagenes.get('dpi', OPCIONES_IMAGEN['dpi'])
+    if not isinstance(dpi, (int, float)) or dpi < 0:
+        errores.append(f"'imagenes.dpi' debe ser un número >= 0 (0 desactiva la reducción), no {dpi!r}")
+    for clave in ('hilos', 'max_mb_en_vuelo'):
+        valor = imagenes.get(clave, OPCIONES_IMAGEN[clave])
+        if not isinstance(valor, (int, float)) or valor < 1:
+            errores.append(f"'imagenes.{clave}' debe ser un número >= 1, no {valor!r}")
+    calidad = imagenes.get('calidad', OPCIONES_IMAGEN['calidad'])
+    if not isinstance(calidad, int) or not 1 <= calidad <= 95:
+        errores.append(f"'imagenes.calidad' debe ser un entero entre 1 y 95, no {calidad!r}")
+
+    captura = config.get('captura_rangos', {})
+    desconocidas = set(captura) - set(OPCIONES_CAPTURA)
+    if desconocidas:
+        errores.append(f"Opciones de 'captura_rangos' desconocidas: {', '.join(sorted(desconocidas))}")
+    if captura.get('backend', OPCIONES_CAPTURA['backend']) not in BACKENDS_CAPTURA:
+        errores.append(f"'captura_rangos.backend' debe ser uno de {BACKENDS_CAPTURA}, "
+                       f"no {captura.get('backend')!r}")
+    if not isinstance(captura.get('grabar', False), bool):
+        errores.append(f"'captura_rangos.grabar' debe ser true o false, no {captura.get('grabar')!r}")
+
+    escritura = config.get('escritura_sid', {})
+    desconocidas = set(escritura) - set(OPCIONES_ESCRITURA)
+    if desconocidas:
+        errores.append(f"Opciones de 'escritura_sid' desconocidas: {', '.join(sorted(desconocidas))}")
+    if escritura.get('backend', OPCIONES_ESCRITURA['backend']) not in BACKENDS_ESCRITURA:
+        errores.append(f"'escritura_sid.backend' debe ser uno de {BACKENDS_ESCRITURA}, "
+                       f"no {escritura.get('backend')!r}")
+
+    nombre_sid = config.get('nombre_sid', {})
+    for clave in ('plantilla', 'formato'):
+        if clave not in nombre_sid:
+            errores.append(f"Falta 'nombre_sid.{clave}'")
+    campos = nombre_sid.get('campos', {})
+    for campo in ('name', 'id'):
+        if campo not in campos:
+            errores.append(f"Falta 'nombre_sid.campos.{campo}'")
+            continue
+        if campos[campo].get('hoja') not in hojas_tss:
+            errores.append(f"Campo '{campo}': hoja {campos[campo].get('hoja')!r} no está en hojas.tss")
+        _validar_celda(campos[campo].get('celda'), f"Campo '{campo}'", errores)
+
+    return errores
+
+
+def cargar_plan(config_path):
+    """Carga, valida y compila la configuración (una vez por lote)"""
+    return PlanExtraccion(cargar_configuracion(config_path))
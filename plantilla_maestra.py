@@ -0,0 +1,75 @@
+"""
+Plantilla SID cargada una sola vez por lote.
+
+Todos los SID del lote salen de la misma plantilla, así que se lee del disco
+una vez y cada SID trabaja sobre una copia barata:
+
+- Nivel de bytes: el xlsx completo queda en memoria con su zip abierto y las
+  partes ya descomprimidas se guardan; el escritor ooxml, la restauración de
+  dibujos y la geometría de las hojas reutilizan esas partes.
+- Nivel de modelo: el workbook de openpyxl se analiza una sola vez y se guarda
+  serializado; cada SID recibe una copia independiente (pickle.loads), mucho
+  más barata que volver a analizar el XML de la plantilla.
+"""
+import io
+import pickle
+import zipfile
+from contextlib import contextmanager
+
+import openpyxl
+
+
+class ZipMaestro(zipfile.ZipFile):
+    """Zip de la plantilla en memoria que guarda las partes ya descomprimidas"""
+
+    def __init__(self, datos):
+        super().__init__(io.BytesIO(datos))
+        self._partes = {}
+
+    def read(self, name, pwd=None):
+        parte = name.filename if isinstance(name, zipfile.ZipInfo) else name
+        if parte not in self._partes:
+            self._partes[parte] = super().read(name, pwd)
+        return self._partes[parte]
+
+
+class PlantillaMaestra:
+    """Bytes, zip y modelo de openpyxl de la plantilla, compartidos por los SID del lote"""
+
+    def __init__(self, plantilla_path):
+        self.plantilla_path = plantilla_path
+        with open(plantilla_path, 'rb') as f:
+            self.datos = f.read()
+        self.zip = ZipMaestro(self.datos)
+        self._modelo = None  # workbook de openpyxl serializado
+
+    def workbook(self):
+        """
+        Copia independiente del workbook de openpyxl de la plantilla, sin
+        imágenes ni gráficos (vuelven con sus dibujos, ver dibujos_plantilla).
+        Solo la primera llamada analiza el XML.
+        """
+        if self._modelo is None:
+            wb = openpyxl.load_workbook(io.BytesIO(self.datos))
+            for ws in wb.worksheets:
+                ws._images = []
+                ws._charts = []
+            self._modelo = pickle.dumps(wb, pickle.HIGHEST_PROTOCOL)
+        return pickle.loads(self._modelo)
+
+
+def maestra_de(maestra, plantilla_path):
+    """Reutiliza la plantilla maestra entre SIDs del lote mientras la plantilla sea la misma"""
+    if maestra is None or maestra.plantilla_path != plantilla_path:
+        maestra = PlantillaMaestra(plantilla_path)
+    return maestra
+
+
+@contextmanager
+def abrir_plantilla(plantilla):
+    """Zip de la plantilla: el de la maestra (queda abierto para el lote) o uno abierto desde la ruta"""
+    if isinstance(plantilla, PlantillaMaestra):
+        yield plantilla.zip
+    else:
+        with zipfile.ZipFile(plantilla) as zf:
+            yield zf
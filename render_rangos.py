@@ -0,0 +1,498 @@
+import colorsys
+import datetime
+import hashlib
+import io
+import os
+import re
+import xml.etree.ElementTree as ET
+
+from PIL import Image, ImageDraw, ImageFont
+from openpyxl.styles.colors import COLOR_INDEX
+from openpyxl.styles.numbers import is_date_format
+from openpyxl.utils.cell import range_boundaries
+
+from lector_xlsx import EMU_POR_PIXEL, NS_A
+
+# Medidas de Excel a 96 ppp: ancho de columna en caracteres y alto de fila en puntos
+PIXELES_POR_CARACTER = 7
+MARGEN_COLUMNA = 5
+PIXELES_POR_PUNTO = 96 / 72
+ANCHO_COLUMNA_DEFECTO = 8.43
+ALTO_FILA_DEFECTO = 15
+RELLENO_TEXTO = 2
+# Subir si cambia el dibujo para invalidar las imágenes cacheadas (ver huella)
+VERSION_RENDER = 1
+
+# Colores del tema Office por defecto, en el orden de índice de Excel (lt1, dk1, lt2, dk2, accent1-6, ...)
+TEMA_DEFECTO = ['FFFFFF', '000000', 'E7E6E6', '44546A', '4472C4', 'ED7D31',
+                'A5A5A5', 'FFC000', '5B9BD5', '70AD47', '0563C1', '954F72']
+GROSOR_BORDE = {'hair': 1, 'thin': 1, 'dotted': 1, 'dashed': 1, 'dashDot': 1, 'dashDotDot': 1,
+                'medium': 2, 'mediumDashed': 2, 'mediumDashDot': 2, 'mediumDashDotDot': 2,
+                'slantDashDot': 2, 'thick': 3, 'double': 3}
+
+# Fuentes a probar cuando la del libro no está instalada (ej. Calibri en Linux)
+CARPETAS_FUENTES = [os.path.join(os.environ.get('WINDIR', 'C:\\Windows'), 'Fonts'),
+                    '/usr/share/fonts/truetype/dejavu', '/usr/share/fonts/dejavu',
+                    '/usr/share/fonts/TTF', '/Library/Fonts']
+ARCHIVOS_FUENTE = {
+    'calibri': ('calibri.ttf', 'calibrib.ttf', 'calibrii.ttf', 'calibriz.ttf'),
+    'arial': ('arial.ttf', 'arialbd.ttf', 'ariali.ttf', 'arialbi.ttf'),
+    'dejavu': ('DejaVuSans.ttf', 'DejaVuSans-Bold.ttf', 'DejaVuSans-Oblique.ttf', 'DejaVuSans-BoldOblique.ttf'),
+}
+
+_TOKENS_FECHA = re.compile(r'yyyy|yy|mmmm|mmm|mm|m|dddd|ddd|dd|d|hh|h|ss|s|am/pm|"[^"]*"|\\.|.', re.IGNORECASE)
+_PARTE_NUMERICA = re.compile(r'[#0?,.]+')
+_MESES = ['enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio', 'julio', 'agosto',
+          'septiembre', 'octubre', 'noviembre', 'diciembre']
+_DIAS = ['lunes', 'martes', 'miércoles', 'jueves', 'viernes', 'sábado', 'domingo']
+
+
+def _formatear_fecha(valor, formato):
+    if isinstance(valor, datetime.time):
+        valor = datetime.datetime.combine(datetime.date(1900, 1, 1), valor)
+    elif not isinstance(valor, datetime.datetime):
+        valor = datetime.datetime.combine(valor, datetime.time())
+
+    tokens = _TOKENS_FECHA.findall(formato.split(';')[0])
+    partes = []
+    for i, token in enumerate(tokens):
+        t = token.lower()
+        # 'm'/'mm' son minutos si van tras horas o antes de segundos
+        vecinos = [x.lower() for x in tokens[max(0, i - 2):i] + tokens[i + 1:i + 3]]
+        es_minuto = t in ('m', 'mm') and any(v.startswith(('h', 's')) for v in vecinos)
+        if t == 'yyyy':
+            partes.append(f"{valor.year:04d}")
+        elif t == 'yy':
+            partes.append(f"{valor.year % 100:02d}")
+        elif t == 'mmmm':
+            partes.append(_MESES[valor.month - 1])
+        elif t == 'mmm':
+            partes.append(_MESES[valor.month - 1][:3])
+        elif t in ('mm', 'm'):
+            numero = valor.minute if es_minuto else valor.month
+            partes.append(f"{numero:02d}" if t == 'mm' else str(numero))
+        elif t == 'dddd':
+            partes.append(_DIAS[valor.weekday()])
+        elif t == 'ddd':
+            partes.append(_DIAS[valor.weekday()][:3])
+        elif t in ('dd', 'd'):
+            partes.append(f"{valor.day:02d}" if t == 'dd' else str(valor.day))
+        elif t in ('hh', 'h'):
+            partes.append(f"{valor.hour:02d}" if t == 'hh' else str(valor.hour))
+        elif t in ('ss', 's'):
+            partes.append(f"{valor.second:02d}" if t == 'ss' else str(valor.second))
+        elif t == 'am/pm':
+            partes.append('AM' if valor.hour < 12 else 'PM')
+        elif token.startswith('"'):
+            partes.append(token[1:-1])
+        elif token.startswith('\\'):
+            partes.append(token[1:])
+        elif token not in '[]':
+            partes.append(token)
+    return ''.join(partes)
+
+
+def _formatear_numero(valor, formato):
+    secciones = formato.split(';')
+    seccion = secciones[0]
+    if valor < 0 and len(secciones) > 1 and secciones[1]:
+        seccion, valor = secciones[1], -valor
+    elif valor == 0 and len(secciones) > 2 and secciones[2]:
+        seccion = secciones[2]
+
+    seccion = re.sub(r'\[[^\]]*\]|_.|\*.', '', seccion)  # Colores, condiciones y rellenos
+    coincidencia = _PARTE_NUMERICA.search(seccion)
+    if not coincidencia:
+        return seccion.replace('"', '')
+
+    patron = coincidencia.group()
+    entero, _, decimales = patron.partition('.')
+    cantidad_decimales = sum(1 for c in decimales if c in '0#?')
+    if '%' in seccion:
+        valor *= 100
+    miles = ',' in entero
+    texto = f"{valor:{',' if miles else ''}.{cantidad_decimales}f}"
+    if decimales and set(decimales) <= set('#') and '.' in texto:
+        texto = texto.rstrip('0').rstrip('.')
+
+    prefijo = seccion[:coincidencia.start()].replace('"', '').replace('\\', '')
+    sufijo = seccion[coincidencia.end():].replace('"', '').replace('\\', '')
+    return f"{prefijo}{texto}{sufijo}"
+
+
+def formatear_valor(valor, formato='General'):
+    """Texto que Excel mostraría para el valor con el formato numérico de la celda"""
+    if valor is None:
+        return ''
+    if isinstance(valor, bool):
+        return 'VERDADERO' if valor else 'FALSO'
+    if isinstance(valor, (datetime.datetime, datetime.date, datetime.time)):
+        if formato and formato != 'General' and is_date_format(formato):
+            return _formatear_fecha(valor, formato)
+        return valor.strftime('%d/%m/%Y') if isinstance(valor, datetime.date) else str(valor)
+    if isinstance(valor, (int, float)):
+        if not formato or formato in ('General', '@'):
+            return str(int(valor)) if float(valor).is_integer() else f"{valor:.10g}"
+        return _formatear_numero(valor, formato)
+    return str(valor)
+
+
+def colores_tema(workbook):
+    """Colores del tema del libro en orden de índice de Excel (el tema por defecto si no se puede leer)"""
+    tema = getattr(workbook, 'loaded_theme', None)
+    if not tema:
+        return TEMA_DEFECTO
+    try:
+        esquema = ET.fromstring(tema).find(f'.//{{{NS_A}}}clrScheme')
+        colores = []
+        for hijo in esquema:
+            color = hijo[0]
+            colores.append(color.get('lastClr') or color.get('val'))
+        # En el xml el orden es dk1, lt1, dk2, lt2; Excel indexa lt1, dk1, lt2, dk2
+        colores[0], colores[1], colores[2], colores[3] = colores[1], colores[0], colores[3], colores[2]
+        return colores
+    except Exception:
+        return TEMA_DEFECTO
+
+
+def _aplicar_tinte(rgb, tinte):
+    r, g, b = (int(rgb[i:i + 2], 16) / 255 for i in (0, 2, 4))
+    h, l, s = colorsys.rgb_to_hls(r, g, b)
+    l = l * (1 + tinte) if tinte < 0 else l * (1 - tinte) + tinte
+    return tuple(round(c * 255) for c in colorsys.hls_to_rgb(h, l, s))
+
+
+def color_rgb(color, tema, defecto=None):
+    """RGB de un color de openpyxl (rgb, indexado o de tema con tinte) según los colores del tema"""
+    if color is None:
+        return defecto
+    try:
+        if color.type == 'rgb' and isinstance(color.rgb, str):
+            rgb = color.rgb[-6:]
+        elif color.type == 'indexed' and color.indexed is not None and color.indexed < len(COLOR_INDEX):
+            if color.indexed in (64, 65):  # Colores de sistema: primer plano / fondo
+                return defecto
+            rgb = COLOR_INDEX[color.indexed][-6:]
+        elif color.type == 'theme' and color.theme is not None and color.theme < len(tema):
+            rgb = tema[color.theme]
+        else:
+            return defecto
+        if color.tint:
+            return _aplicar_tinte(rgb, color.tint)
+        return tuple(int(rgb[i:i + 2], 16) for i in (0, 2, 4))
+    except (TypeError, ValueError):
+        return defecto
+
+
+class RenderizadorRangos:
+    """
+    Dibuja un rango de celdas de openpyxl como imagen con Pillow, sin Excel.
+
+    Respeta anchos de columna, altos de fila (incluidas las ocultas), celdas
+    combinadas, rellenos sólidos, bordes, fuentes, alineación, ajuste de texto
+    y formatos numéricos, y pega encima las imágenes ancladas en el rango.
+    """
+
+    def __init__(self, workbook, escala=1.0):
+        self.escala = escala
+        self._tema = colores_tema(workbook)
+        self._fuentes = {}
+        self._huellas_estilo = {}
+
+    def huella(self, ws, rango, imagenes=()):
+        """
+        Digest de todo lo que cambia la imagen del rango: valores, estilos, combinadas,
+        medidas, imágenes, tema, escala y versión del dibujo. Independiente del libro,
+        así que rangos iguales de sitios distintos comparten huella.
+
+        :param imagenes: iterable de (AnclaImagen, identificador del contenido, ej. CRC del zip)
+        """
+        min_col, min_row, max_col, max_row = range_boundaries(rango)
+        h = hashlib.sha256()
+        h.update(repr((VERSION_RENDER, self.escala, self._tema, max_col - min_col, max_row - min_row,
+                       self._anchos_columnas(ws, min_col, max_col),
+                       self._altos_filas(ws, min_row, max_row))).encode('utf-8'))
+        for combinado in sorted(ws.merged_cells.ranges, key=lambda c: c.bounds):
+            if not (combinado.max_row < min_row or combinado.min_row > max_row
+                    or combinado.max_col < min_col or combinado.min_col > max_col):
+                h.update(repr((combinado.min_row - min_row, combinado.min_col - min_col,
+                               combinado.max_row - min_row, combinado.max_col - min_col)).encode('utf-8'))
+        for fila_celdas in ws.iter_rows(min_row=min_row, max_row=max_row, min_col=min_col, max_col=max_col):
+            for celda in fila_celdas:
+                if celda.value is None and not celda.has_style:
+                    continue
+                h.update(repr((celda.row - min_row, celda.column - min_col, type(celda.value).__name__,
+                               celda.value, self._huella_estilo(celda))).encode('utf-8'))
+        for ancla, identificador in imagenes:
+            h.update(repr((ancla.fila - min_row, ancla.col - min_col, ancla.fila_fin - min_row,
+                           ancla.col_fin - min_col, ancla.emu, identificador)).encode('utf-8'))
+        return h.hexdigest()
+
+    def _huella_estilo(self, celda):
+        # El repr de los estilos es caro: se calcula una vez por combinación de estilos del libro
+        clave = tuple(celda._style)
+        if clave not in self._huellas_estilo:
+            self._huellas_estilo[clave] = hashlib.sha256(repr((
+                celda.font, celda.fill, celda.border, celda.alignment, celda.number_format
+            )).encode('utf-8')).hexdigest()
+        return self._huellas_estilo[clave]
+
+    # Medidas
+
+    def _anchos_columnas(self, ws, min_col, max_col):
+        defecto = ws.sheet_format.defaultColWidth or ANCHO_COLUMNA_DEFECTO
+        anchos = {}
+        for dimension in ws.column_dimensions.values():
+            if dimension.min is None:
+                continue
+            ancho = 0 if dimension.hidden else (dimension.width or defecto)
+            for col in range(dimension.min, dimension.max + 1):
+                anchos[col] = ancho
+        return [self._px_columna(anchos.get(col, defecto)) for col in range(min_col, max_col + 1)]
+
+    def _px_columna(self, ancho):
+        return 0 if not ancho else round((ancho * PIXELES_POR_CARACTER + MARGEN_COLUMNA) * self.escala)
+
+    def _altos_filas(self, ws, min_row, max_row):
+        defecto = ws.sheet_format.defaultRowHeight or ALTO_FILA_DEFECTO
+        altos = []
+        for fila in range(min_row, max_row + 1):
+            dimension = ws.row_dimensions.get(fila)  # get: no crea filas vacías en la hoja
+            if dimension is not None and dimension.hidden:
+                altos.append(0)
+            else:
+                alto = dimension.height if dimension is not None and dimension.height else defecto
+                altos.append(round(alto * PIXELES_POR_PUNTO * self.escala))
+        return altos
+
+    # Estilos
+
+    def _color(self, color, defecto=None):
+        return color_rgb(color, self._tema, defecto)
+
+    def _fuente(self, font):
+        nombre = (font.name or 'Calibri').lower()
+        tamano = max(1, round((font.sz or 11) * PIXELES_POR_PUNTO * self.escala))
+        estilo = (1 if font.b else 0) + (2 if font.i else 0)
+        clave = (nombre, tamano, estilo)
+        if clave not in self._fuentes:
+            self._fuentes[clave] = self._cargar_fuente(nombre, tamano, estilo)
+        return self._fuentes[clave]
+
+    def _cargar_fuente(self, nombre, tamano, estilo):
+        candidatos = []
+        for familia in (nombre.split()[0], 'calibri', 'arial', 'dejavu'):
+            archivos = ARCHIVOS_FUENTE.get(familia)
+            if archivos:
+                candidatos.append(archivos[estilo])
+        for archivo in candidatos:
+            for carpeta in CARPETAS_FUENTES:
+                ruta = os.path.join(carpeta, archivo)
+                if os.path.exists(ruta):
+                    return ImageFont.truetype(ruta, tamano)
+        try:
+            return ImageFont.truetype(candidatos[-1], tamano)
+        except OSError:
+            return ImageFont.load_default(tamano)
+
+    # Dibujo
+
+    def renderizar(self, ws, rango, imagenes=()):
+        """
+        Devuelve la imagen (PIL) del rango, ej. 'A84:AM98'.
+
+        :param imagenes: iterable de (AnclaImagen, bytes) a pegar encima
+            (ver ExtractorMedios.indice_imagenes)
+        """
+        min_col, min_row, max_col, max_row = range_boundaries(rango)
+        anchos = self._anchos_columnas(ws, min_col, max_col)
+        altos = self._altos_filas(ws, min_row, max_row)
+        xs = [0]
+        for ancho in anchos:
+            xs.append(xs[-1] + ancho)
+        ys = [0]
+        for alto in altos:
+            ys.append(ys[-1] + alto)
+
+        lienzo = Image.new('RGB', (max(1, xs[-1]), max(1, ys[-1])), 'white')
+        dibujo = ImageDraw.Draw(lienzo)
+
+        # Celdas combinadas: la superior izquierda dibuja todo el bloque, el resto se omite
+        bloques = {}
+        cubiertas = set()
+        for combinado in ws.merged_cells.ranges:
+            if (combinado.max_row < min_row or combinado.min_row > max_row
+                    or combinado.max_col < min_col or combinado.min_col > max_col):
+                continue
+            inicio = (max(combinado.min_row, min_row), max(combinado.min_col, min_col))
+            fin = (min(combinado.max_row, max_row), min(combinado.max_col, max_col))
+            bloques[inicio] = fin
+            for fila in range(inicio[0], fin[0] + 1):
+                for col in range(inicio[1], fin[1] + 1):
+                    if (fila, col) != inicio:
+                        cubiertas.add((fila, col))
+
+        def _caja(fila, col, fin):
+            return (xs[col - min_col], ys[fila - min_row], xs[fin[1] - min_col + 1], ys[fin[0] - min_row + 1])
+
+        celdas = []
+        for fila_celdas in ws.iter_rows(min_row=min_row, max_row=max_row, min_col=min_col, max_col=max_col):
+            for celda in fila_celdas:
+                posicion = (celda.row, celda.column)
+                if posicion in cubiertas:
+                    continue
+                caja = _caja(celda.row, celda.column, bloques.get(posicion, posicion))
+                if caja[2] <= caja[0] or caja[3] <= caja[1]:
+                    continue  # Fila o columna oculta
+                celdas.append((celda, caja))
+
+        # Tres pasadas, como Excel: rellenos, textos y bordes encima
+        for celda, caja in celdas:
+            fill = celda.fill
+            if fill is not None and fill.fill_type == 'solid':
+                color = self._color(fill.fgColor)
+                if color:
+                    dibujo.rectangle((caja[0], caja[1], caja[2] - 1, caja[3] - 1), fill=color)
+
+        ocupadas = {(c.row, c.column) for c, _ in celdas if c.value not in (None, '')}
+        for celda, caja in celdas:
+            if celda.value in (None, ''):
+                continue
+            caja_texto = caja
+            alineacion = celda.alignment
+            # El texto sin ajuste alineado a la izquierda se desborda sobre las celdas vacías de la derecha
+            if (not alineacion.wrap_text and (alineacion.horizontal in (None, 'general', 'left'))
+                    and isinstance(celda.value, str) and (celda.row, celda.column) not in bloques):
+                col = celda.column + 1
+                while col <= max_col and (celda.row, col) not in ocupadas and (celda.row, col) not in cubiertas:
+                    col += 1
+                caja_texto = (caja[0], caja[1], xs[col - min_col], caja[3])
+            self._dibujar_texto(lienzo, celda, caja_texto)
+
+        for celda, caja in celdas:
+            self._dibujar_bordes(dibujo, celda, caja)
+
+        for ancla, datos in imagenes:
+            self._pegar_imagen(lienzo, ancla, datos, xs, ys, min_row, min_col)
+
+        return lienzo
+
+    def _dibujar_texto(self, lienzo, celda, caja):
+        fuente = self._fuente(celda.font)
+        color = self._color(celda.font.color, (0, 0, 0))
+        texto = formatear_valor(celda.value, celda.number_format)
+        alineacion = celda.alignment
+        ancho_caja = caja[2] - caja[0] - 2 * RELLENO_TEXTO
+
+        # Como Excel: números y fechas que no caben se muestran con '#'
+        es_numero = isinstance(celda.value, (int, float, datetime.date, datetime.time)) and not isinstance(
+            celda.value, bool)
+        if es_numero and fuente.getlength(texto) > ancho_caja:
+            texto = '#' * max(1, int(ancho_caja // max(1, fuente.getlength('#'))))
+
+        lineas = []
+        for parrafo in texto.split('\n'):
+            if alineacion.wrap_text:
+                lineas.extend(self._ajustar(parrafo, fuente, ancho_caja))
+            else:
+                lineas.append(parrafo)
+
+        ascenso, descenso = fuente.getmetrics()
+        alto_linea = ascenso + descenso
+        alto_texto = alto_linea * len(lineas)
+        vertical = alineacion.vertical or 'bottom'
+        if vertical == 'top':
+            y = caja[1] + RELLENO_TEXTO
+        elif vertical in ('center', 'justify', 'distributed'):
+            y = caja[1] + (caja[3] - caja[1] - alto_texto) / 2
+        else:
+            y = caja[3] - alto_texto - RELLENO_TEXTO
+
+        horizontal = alineacion.horizontal or 'general'
+        if horizontal == 'general':
+            horizontal = 'right' if isinstance(celda.value, (int, float)) and not isinstance(celda.value, bool) else 'left'
+
+        # El texto se recorta a su caja dibujándolo en una capa del tamaño de la caja
+        capa = Image.new('RGBA', (max(1, caja[2] - caja[0]), max(1, caja[3] - caja[1])), (0, 0, 0, 0))
+        dibujo = ImageDraw.Draw(capa)
+        for linea in lineas:
+            ancho_linea = fuente.getlength(linea)
+            if horizontal in ('center', 'centerContinuous', 'distributed', 'justify'):
+                x = (capa.width - ancho_linea) / 2
+            elif horizontal == 'right':
+                x = capa.width - ancho_linea - RELLENO_TEXTO
+            else:
+                x = RELLENO_TEXTO + (alineacion.indent or 0) * 3 * PIXELES_POR_CARACTER * self.escala
+            dibujo.text((x, y - caja[1]), linea, font=fuente, fill=color)
+            if celda.font.u:
+                base = y - caja[1] + ascenso + 1
+                dibujo.line((x, base, x + ancho_linea, base), fill=color)
+            y += alto_linea
+        lienzo.paste(capa, (caja[0], caja[1]), capa)
+
+    @staticmethod
+    def _ajustar(texto, fuente, ancho):
+        """Parte el texto en líneas que caben en el ancho (por palabras)"""
+        lineas = []
+        actual = ''
+        for palabra in texto.split(' '):
+            prueba = f"{actual} {palabra}" if actual else palabra
+            if actual and fuente.getlength(prueba) > ancho:
+                lineas.append(actual)
+                actual = palabra
+            else:
+                actual = prueba
+        lineas.append(actual)
+        return lineas
+
+    def _dibujar_bordes(self, dibujo, celda, caja):
+        borde = celda.border
+        if borde is None:
+            return
+        x0, y0, x1, y1 = caja[0], caja[1], caja[2] - 1, caja[3] - 1
+        lados = (
+            (borde.top, (x0, y0, x1, y0)),
+            (borde.bottom, (x0, y1, x1, y1)),
+            (borde.left, (x0, y0, x0, y1)),
+            (borde.right, (x1, y0, x1, y1)),
+        )
+        for lado, linea in lados:
+            if lado is None or not lado.style:
+                continue
+            grosor = max(1, round(GROSOR_BORDE.get(lado.style, 1) * self.escala))
+            dibujo.line(linea, fill=self._color(lado.color, (0, 0, 0)), width=grosor)
+
+    def _pegar_imagen(self, lienzo, ancla, datos, xs, ys, min_row, min_col):
+        """Pega la imagen en la posición y tamaño de su ancla (Pillow recorta lo que sale del rango)"""
+        def _x(col):
+            # Columnas fuera del rango: se extrapola con el ancho por defecto
+            indice = col - min_col
+            if 0 <= indice < len(xs):
+                return xs[indice]
+            paso = self._px_columna(ANCHO_COLUMNA_DEFECTO)
+            return xs[0] + indice * paso if indice < 0 else xs[-1] + (indice - len(xs) + 1) * paso
+
+        def _y(fila):
+            indice = fila - min_row
+            if 0 <= indice < len(ys):
+                return ys[indice]
+            paso = round(ALTO_FILA_DEFECTO * PIXELES_POR_PUNTO * self.escala)
+            return ys[0] + indice * paso if indice < 0 else ys[-1] + (indice - len(ys) + 1) * paso
+
+        def _px(emu):
+            return round(emu / EMU_POR_PIXEL * self.escala)
+
+        dx, dy, dx_fin, dy_fin, ancho, alto = ancla.emu or (0, 0, 0, 0, None, None)
+        x0, y0 = _x(ancla.col) + _px(dx), _y(ancla.fila) + _px(dy)
+        if ancho is None:
+            x1, y1 = _x(ancla.col_fin) + _px(dx_fin), _y(ancla.fila_fin) + _px(dy_fin)
+        else:
+            x1, y1 = x0 + _px(ancho), y0 + _px(alto)
+        if x1 <= x0 or y1 <= y0:
+            return
+        try:
+            with Image.open(io.BytesIO(datos)) as imagen:
+                imagen = imagen.convert('RGBA').resize((x1 - x0, y1 - y0), Image.LANCZOS)
+                lienzo.paste(imagen, (x0, y0), imagen)
+        except Exception as e:
+            print(f"⚠️ No se pudo dibujar una imagen del rango: {str(e)}")
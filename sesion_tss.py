@@ -0,0 +1,124 @@
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
+
+import openpyxl
+
+from indices_hoja import IndiceTexto
+from lector_xlsx import ExtractorMedios, LectorCeldas
+
+
+class CronometroEtapas:
+    """Acumula tiempos y contadores por etapa del procesamiento (contar admite varios hilos)"""
+
+    def __init__(self):
+        self.tiempos = defaultdict(float)
+        self.contadores = defaultdict(int)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def etapa(self, nombre):
+        """Mide el tiempo de un bloque y lo suma a la etapa indicada"""
+        inicio = time.monotonic()
+        try:
+            yield
+        finally:
+            self.tiempos[nombre] += time.monotonic() - inicio
+
+    def contar(self, evento, cantidad=1):
+        with self._lock:
+            self.contadores[evento] += cantidad
+
+    def fusionar(self, otro):
+        """Suma los tiempos y contadores de otro cronómetro (ej. el de un archivo al del lote)"""
+        for nombre, segundos in otro.tiempos.items():
+            self.tiempos[nombre] += segundos
+        for evento, cantidad in otro.contadores.items():
+            self.contadores[evento] += cantidad
+
+    def imprimir_resumen(self, titulo="TIEMPOS POR ETAPA"):
+        print(f"\n--- {titulo} ---")
+        for nombre, segundos in sorted(self.tiempos.items(), key=lambda x: -x[1]):
+            print(f"⏱️ {nombre}: {timedelta(seconds=segundos)}")
+        for evento, cantidad in sorted(self.contadores.items()):
+            print(f"🔢 {evento}: {cantidad}")
+
+
+class SesionTSS:
+    """
+    Mantiene abierto un único workbook del TSS para todas las etapas de extracción.
+
+    El libro se carga con openpyxl la primera vez que se pide y se reutiliza en
+    metadatos, textos, imágenes y antenas; se cierra una sola vez al final.
+    Las imágenes se leen por `medios`, directamente del zip, sin que openpyxl
+    tenga que materializar todas las fotos, y las celdas sueltas de la
+    configuración por `leer_celdas`, parseando solo las hojas pedidas.
+    """
+
+    def __init__(self, file_path, cronometro=None):
+        self.file_path = file_path
+        self.cronometro = cronometro or CronometroEtapas()
+        self._wb = None
+        self._medios = None
+        self._celdas = None
+        self._indices_texto = {}
+
+    @property
+    def workbook(self):
+        if self._wb is None:
+            with self.cronometro.etapa('carga_workbook'):
+                self._wb = openpyxl.load_workbook(self.file_path, data_only=True)
+            self.cronometro.contar('cargas_workbook')
+            print(f"📖 Workbook cargado: {os.path.basename(self.file_path)}")
+        return self._wb
+
+    @property
+    def medios(self):
+        if self._medios is None:
+            with self.cronometro.etapa('lectura_dibujos'):
+                self._medios = ExtractorMedios(self.file_path)
+        return self._medios
+
+    def _lector_celdas(self):
+        if self._celdas is None:
+            self._celdas = LectorCeldas(self.file_path)
+        return self._celdas
+
+    def leer_celdas(self, pedidos):
+        """Lee celdas puntuales en streaming: {indice_hoja: [coords]} -> {(indice, coord): valor}"""
+        with self.cronometro.etapa('lectura_celdas'):
+            return self._lector_celdas().leer(pedidos)
+
+    def indice_texto(self, sheet_index):
+        """Índice de texto normalizado de la hoja, construido en una sola pasada y reutilizado"""
+        if sheet_index not in self._indices_texto:
+            with self.cronometro.etapa('indice_texto'):
+                indice = IndiceTexto(self._lector_celdas().iterar_celdas(sheet_index))
+            self.cronometro.contar('celdas_indexadas', indice.total_celdas)
+            self._indices_texto[sheet_index] = indice
+        return self._indices_texto[sheet_index]
+
+    def hoja(self, sheet_index):
+        """Devuelve la hoja por índice (base 0) del workbook compartido"""
+        return self.workbook.worksheets[sheet_index]
+
+    def cerrar(self):
+        if self._wb is not None:
+            self._wb.close()
+            self._wb = None
+        if self._medios is not None:
+            self._medios.cerrar()
+            self._medios = None
+        if self._celdas is not None:
+            self._celdas.cerrar()
+            self._celdas = None
+        self._indices_texto = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.cerrar()
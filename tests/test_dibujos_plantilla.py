@@ -0,0 +1,41 @@
+import zipfile
+
+import pytest
+
+import dibujos_plantilla
+from dibujos_plantilla import copiar_entrada_cruda
+
+ENTRADAS = {
+    '[Content_Types].xml': (b'<Types/>' * 200, zipfile.ZIP_DEFLATED),
+    'xl/worksheets/sheet1.xml': (b'<worksheet><sheetData/></worksheet>' * 500, zipfile.ZIP_DEFLATED),
+    'xl/media/image1.png': (bytes(range(256)) * 40, zipfile.ZIP_STORED),
+}
+
+
+@pytest.fixture
+def origen(tmp_path):
+    ruta = tmp_path / 'origen.xlsx'
+    with zipfile.ZipFile(ruta, 'w') as zf:
+        for nombre, (datos, compresion) in ENTRADAS.items():
+            zf.writestr(nombre, datos, compress_type=compresion)
+    return ruta
+
+
+@pytest.mark.parametrize('cruda', [True, False])
+def test_copia_ida_y_vuelta(origen, tmp_path, monkeypatch, cruda):
+    monkeypatch.setattr(dibujos_plantilla, 'COPIA_CRUDA', cruda)
+    destino = tmp_path / 'destino.xlsx'
+    with zipfile.ZipFile(origen) as zin, zipfile.ZipFile(destino, 'w', zipfile.ZIP_DEFLATED) as zout:
+        offsets = [info.header_offset for info in zin.infolist()]
+        for info in zin.infolist():
+            copiar_entrada_cruda(zin, zout, info)
+        zout.writestr('xl/nueva.xml', b'<nueva/>')
+        # El ZipInfo de origen no se modifica (puede ser el de la plantilla maestra)
+        assert [info.header_offset for info in zin.infolist()] == offsets
+
+    with zipfile.ZipFile(destino) as zf:
+        assert zf.testzip() is None
+        for nombre, (datos, compresion) in ENTRADAS.items():
+            assert zf.read(nombre) == datos
+            assert zf.getinfo(nombre).compress_type == compresion
+        assert zf.read('xl/nueva.xml') == b'<nueva/>'
@@ -0,0 +1,66 @@
+import openpyxl
+import pytest
+
+from copia_celdas import BloqueCeldas
+from geometria_hoja import GeometriaHoja
+
+# Anchos en caracteres: A=10, B oculta, C:D=20, resto 8 (por defecto). Altos: 1=30, 2 oculta, resto 20
+XML_HOJA = ('<worksheet><sheetFormatPr defaultColWidth="8" defaultRowHeight="20"/>'
+            '<cols><col min="1" max="1" width="10"/><col min="2" max="2" width="10" hidden="1"/>'
+            '<col min="3" max="4" width="20"/></cols>'
+            '<sheetData><row r="1" ht="30"/><row r="2" hidden="1"/></sheetData></worksheet>')
+
+# (ancho * 7 px + 5 px) * 0.75 pt/px
+ANCHO_8 = 45.75
+ANCHO_10 = 56.25
+ANCHO_20 = 108.75
+
+
+def test_bordes_acumulados():
+    geometria = GeometriaHoja.desde_xml(XML_HOJA)
+
+    assert [geometria.x(col) for col in range(1, 7)] == pytest.approx(
+        [0, ANCHO_10, ANCHO_10, ANCHO_10 + ANCHO_20, ANCHO_10 + 2 * ANCHO_20, ANCHO_10 + 2 * ANCHO_20 + ANCHO_8])
+    assert [geometria.y(fila) for fila in range(1, 6)] == pytest.approx([0, 30, 30, 50, 70])
+    assert geometria.rectangulo('C3') == pytest.approx((ANCHO_10, 30, ANCHO_20, 20))
+    assert geometria.rectangulo('B2') == pytest.approx((ANCHO_10, 30, 0, 0))
+
+
+def test_celda_en_salta_ocultas():
+    geometria = GeometriaHoja.desde_xml(XML_HOJA)
+
+    # Justo en el borde de C3 cae en C3 (B y la fila 2 están ocultas), no en la oculta
+    assert geometria.celda_en(ANCHO_10, 30) == pytest.approx((2, 0, 2, 0))
+    assert geometria.celda_en(ANCHO_10 + 3.75, 35) == pytest.approx((2, 3.75, 2, 5))
+    # Lejos de las celdas ya calculadas: amplía las sumas bajo demanda
+    assert geometria.celda_en(ANCHO_10 + 2 * ANCHO_20 + 10 * ANCHO_8 + 1, 50 + 100 * 20 + 2) == \
+        pytest.approx((14, 1, 103, 2))
+
+
+def test_destino_combinado_con_bloque():
+    # Rango pegado en C3 con C3:D4 combinadas: la geometría derivada con con_bloque
+    # coincide con la de la hoja ya pegada y una imagen dentro de D4 se ancla en D4
+    bloque = BloqueCeldas(2, 2, [12, None], [40, None], [(0, 0, 1, 1)], [(0, 0, 'x', None)], [])
+    geometria = GeometriaHoja.desde_xml(XML_HOJA).con_bloque('C3', bloque)
+
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.sheet_format.defaultColWidth = 8
+    ws.sheet_format.defaultRowHeight = 20
+    ws.column_dimensions['A'].width = 10
+    ws.column_dimensions['B'].width = 10
+    ws.column_dimensions['B'].hidden = True
+    ws.column_dimensions['D'].width = 20
+    ws.row_dimensions[1].height = 30
+    ws.row_dimensions[2].hidden = True
+    bloque.aplicar_openpyxl(ws, 'C3')
+    desde_hoja = GeometriaHoja.desde_hoja(ws)
+
+    assert 'C3:D4' in {str(rango) for rango in ws.merged_cells.ranges}
+    for celda in ('C3', 'D3', 'C4', 'D4', 'E5'):
+        assert geometria.rectangulo(celda) == pytest.approx(desde_hoja.rectangulo(celda))
+
+    ancho_12 = (12 * 7 + 5) * 0.75
+    # El rectángulo del destino es el de su celda superior izquierda, como Range.Left/Width
+    assert geometria.rectangulo('C3') == pytest.approx((ANCHO_10, 30, ancho_12, 40))
+    assert geometria.celda_en(ANCHO_10 + ancho_12 + 2, 30 + 40 + 1) == pytest.approx((3, 2, 3, 1))
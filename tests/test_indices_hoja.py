@@ -0,0 +1,22 @@
+from indices_hoja import IndiceEspacial
+
+
+def test_cercanos_prioriza_anclados_dentro():
+    # Ventana filas 10..20, columnas 1..5, referencia en su esquina (10, 1)
+    indice = IndiceEspacial([
+        (8, 1, 12, 3, 'solapa_desde_fuera'),  # más cerca de la referencia, pero anclado fuera
+        (15, 4, 16, 5, 'anclado_dentro_lejos'),
+        (30, 1, 31, 2, 'fuera_de_la_ventana'),
+        (11, 1, 11, 1, 'anclado_dentro_cerca'),
+    ], alto_cubeta=4)
+
+    cercanos = indice.cercanos(10, 1, 20, 5, 10, 1)
+
+    assert [e.valor for e in cercanos] == ['anclado_dentro_cerca', 'anclado_dentro_lejos', 'solapa_desde_fuera']
+
+
+def test_cercanos_sin_duplicados_entre_cubetas():
+    # Un elemento que cubre varias cubetas aparece una sola vez; a igual distancia manda el orden de inserción
+    indice = IndiceEspacial([(2, 3, 12, 3, 'largo'), (2, 3, 2, 3, 'corto')], alto_cubeta=4)
+
+    assert [e.valor for e in indice.cercanos(0, 0, 12, 5, 2, 3)] == ['largo', 'corto']
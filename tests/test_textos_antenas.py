@@ -0,0 +1,48 @@
+from manifiesto_tecnologias import ManifiestoTecnologias
+from textos_antenas import SustitucionTextosAntenas, analizar_grupos, texto_forma
+
+NS = ('xmlns:xdr="http://schemas.openxmlformats.org/drawingml/2006/spreadsheetDrawing" '
+      'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main"')
+
+
+def _forma(id_forma, texto):
+    return (f'<xdr:sp><xdr:nvSpPr><xdr:cNvPr id="{id_forma}" name="CuadroTexto {id_forma}"/></xdr:nvSpPr>'
+            f'<xdr:txBody><a:p><a:r><a:rPr lang="es-ES"/><a:t>{texto}</a:t></a:r></a:p></xdr:txBody></xdr:sp>')
+
+
+def _dibujo():
+    formas = [_forma(2, 'ANTENA 1 XXX'), _forma(3, 'TECH1'),
+              _forma(4, 'SECTOR 1'), _forma(5, 'SECTOR 2'), _forma(6, 'SECTOR 3')]
+    return (f'<xdr:wsDr {NS}><xdr:twoCellAnchor><xdr:grpSp><xdr:nvGrpSpPr>'
+            f'<xdr:cNvPr id="1" name="Grupo 1"/></xdr:nvGrpSpPr>{"".join(formas)}'
+            f'</xdr:grpSp></xdr:twoCellAnchor></xdr:wsDr>').encode('utf-8')
+
+
+def _textos_sectores(xml):
+    xml = xml.decode('utf-8')
+    formas = analizar_grupos(xml)[0]['formas']
+    return [texto_forma(xml[f['inicio']:f['fin']]) for f in formas if 'sector' in f['roles']]
+
+
+def test_sector_faltante_no_desplaza_los_demas():
+    # Antena 1 sin sector 1: sus sectores 2 y 3 van en los cuadros SECTOR 2 y SECTOR 3,
+    # en la misma posición que sus fotos; el sector 1 lo aporta otra antena
+    manifiesto = ManifiestoTecnologias()
+    manifiesto.registrar(1, '2', 'a1s2.jpg', 'LTE')
+    manifiesto.registrar(1, '3', 'a1s3.jpg', 'LTE/UMTS')
+    manifiesto.registrar(2, '1', 'a2s1.jpg', 'GSM')
+
+    xml = SustitucionTextosAntenas('abc', manifiesto).aplicar(_dibujo())
+
+    assert _textos_sectores(xml) == ['SECTOR 1', 'SECTOR 2\n(LTE)', 'SECTOR 3\n(LTE + UMTS)']
+
+
+def test_sectores_iguales_no_agregan_lineas():
+    manifiesto = ManifiestoTecnologias()
+    for sector in ('1', '2', '3'):
+        manifiesto.registrar(1, sector, f'a1s{sector}.jpg', 'LTE')
+
+    xml = SustitucionTextosAntenas('abc', manifiesto).aplicar(_dibujo())
+
+    assert _textos_sectores(xml) == ['SECTOR 1', 'SECTOR 2', 'SECTOR 3']
+    assert 'ANTENA 1 ABC' in xml.decode('utf-8')
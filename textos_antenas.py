@@ -0,0 +1,266 @@
+import os
+import re
+import zipfile
+from xml.sax.saxutils import escape, unescape
+
+from dibujos_plantilla import copiar_entrada_cruda, dibujo_de_hoja
+from lector_xlsx import resolver_hojas
+
+# Formato de las tecnologías en los títulos de antena: negrita azul RGB(1, 75, 160)
+COLOR_TECNOLOGIAS = '014BA0'
+CODIGO_SITIO = 'XXX'
+
+# Anclajes del dibujo (no se anidan) y formas con texto dentro de ellos
+_ANCLAJE = re.compile(r'<((?:\w+:)?)(twoCellAnchor|oneCellAnchor|absoluteAnchor)\b.*?</\1\2>', re.S)
+_FORMA = re.compile(r'<((?:\w+:)?)sp\b[^>]*>.*?</\1sp>', re.S)
+_NOMBRE = re.compile(r'<(?:\w+:)?cNvPr\b[^>]*?\sid="(\d+)"[^>]*?\sname="([^"]*)"')
+_PARRAFO = re.compile(r'<((?:\w+:)?)p\b[^>]*?(?:/>|>.*?</\1p>)', re.S)
+_RUN = re.compile(r'<((?:\w+:)?)r>(.*?)</\1r>', re.S)
+_TEXTO = re.compile(r'(<((?:\w+:)?)t(?:\s[^>]*)?(?<!/)>)(.*?)(</\2t>)', re.S)
+_PROPIEDADES_RUN = re.compile(r'<((?:\w+:)?)rPr\b[^>]*?(?:/>|>.*?</\1rPr>)', re.S)
+_PROPIEDADES_PARRAFO = re.compile(r'<((?:\w+:)?)pPr\b[^>]*?(?:/>|>.*?</\1pPr>)', re.S)
+_FIN_PARRAFO = re.compile(r'<((?:\w+:)?)endParaRPr\b([^>]*?)(/>|>(.*?)</\1endParaRPr>)', re.S)
+_RELLENO = re.compile(r'<((?:\w+:)?)(solidFill|gradFill|pattFill|noFill)\b[^>]*?(?:/>|>.*?</\1\2>)', re.S)
+_LINEA = re.compile(r'<((?:\w+:)?)ln\b[^>]*?(?:/>|>.*?</\1ln>)', re.S)
+_TECH = re.compile(r'TECH\s*-?\s*(\d+)', re.I)
+
+
+def texto_forma(forma):
+    """Texto de una forma: párrafos separados por salto de línea"""
+    return '\n'.join(''.join(unescape(t.group(3)) for t in _TEXTO.finditer(p.group(0)))
+                     for p in _PARRAFO.finditer(forma))
+
+
+def _reemplazar_en_parrafo(parrafo, buscado, nuevo):
+    """
+    Reemplaza en los runs del párrafo conservando su formato. Si el texto
+    buscado quedó partido entre runs, el resultado va en el primero.
+    """
+    runs = list(_RUN.finditer(parrafo))
+    textos = []
+    for run in runs:
+        texto = _TEXTO.search(run.group(2))
+        textos.append(unescape(texto.group(3)) if texto else '')
+    if not any(buscado in t for t in textos):
+        if buscado not in ''.join(textos):
+            return parrafo
+        textos = [''.join(textos).replace(buscado, nuevo)] + [''] * (len(runs) - 1)
+    else:
+        textos = [t.replace(buscado, nuevo) for t in textos]
+
+    piezas, posicion = [], 0
+    for run, texto in zip(runs, textos):
+        piezas.append(parrafo[posicion:run.start()])
+        piezas.append(_TEXTO.sub(lambda m: f"{m.group(1)}{escape(texto)}{m.group(4)}", run.group(0), count=1))
+        posicion = run.end()
+    piezas.append(parrafo[posicion:])
+    return ''.join(piezas)
+
+
+def _reemplazar(forma, buscado, nuevo):
+    return _PARRAFO.sub(lambda m: _reemplazar_en_parrafo(m.group(0), buscado, nuevo), forma)
+
+
+def _formato_tecnologias(forma):
+    """Negrita y color de tecnologías en todos los runs de la forma (como TextRange.Font en COM)"""
+    def _run(m):
+        prefijo, interior = m.group(1), m.group(2)
+        relleno = f'<{prefijo}solidFill><{prefijo}srgbClr val="{COLOR_TECNOLOGIAS}"/></{prefijo}solidFill>'
+        propiedades = _PROPIEDADES_RUN.search(interior)
+        if propiedades is None:
+            interior = f'<{prefijo}rPr b="1">{relleno}</{prefijo}rPr>{interior}'
+        else:
+            rpr = propiedades.group(0)
+            apertura_fin = rpr.index('>') + 1
+            autocerrado = rpr[apertura_fin - 2] == '/'
+            apertura = rpr[:apertura_fin - 2] if autocerrado else rpr[:apertura_fin - 1]
+            apertura = re.sub(r'\sb="[^"]*"', '', apertura) + ' b="1">'
+            hijos = '' if autocerrado else rpr[apertura_fin:rpr.rindex('<')]
+            hijos = _RELLENO.sub('', hijos)
+            # El relleno va después de <a:ln> según el esquema de CT_TextCharacterProperties
+            linea = _LINEA.match(hijos)
+            hijos = (hijos[:linea.end()] + relleno + hijos[linea.end():]) if linea else relleno + hijos
+            nuevo = f"{apertura}{hijos}</{propiedades.group(1)}rPr>"
+            interior = interior[:propiedades.start()] + nuevo + interior[propiedades.end():]
+        return f"<{prefijo}r>{interior}</{prefijo}r>"
+    return _RUN.sub(_run, forma)
+
+
+def _agregar_parrafo(forma, texto):
+    """Añade un párrafo al final del cuerpo de texto con el formato del último párrafo"""
+    parrafos = list(_PARRAFO.finditer(forma))
+    if not parrafos:
+        return forma
+    ultimo = parrafos[-1]
+    prefijo = ultimo.group(1)
+    propiedades_parrafo = _PROPIEDADES_PARRAFO.search(ultimo.group(0))
+    run = _RUN.search(ultimo.group(0))
+    propiedades_run = _PROPIEDADES_RUN.search(run.group(2)) if run else None
+    if propiedades_run:
+        rpr = propiedades_run.group(0)
+    else:
+        # Sin runs: el formato del final de párrafo es el del texto que se escriba
+        fin = _FIN_PARRAFO.search(ultimo.group(0))
+        rpr = (f"<{fin.group(1)}rPr{fin.group(2)}{fin.group(3).replace('endParaRPr', 'rPr')}"
+               if fin else '')
+    nuevo = (f"<{prefijo}p>{propiedades_parrafo.group(0) if propiedades_parrafo else ''}"
+             f"<{prefijo}r>{rpr}<{prefijo}t>{escape(texto)}</{prefijo}t></{prefijo}r></{prefijo}p>")
+    return forma[:ultimo.end()] + nuevo + forma[ultimo.end():]
+
+
+def _antena_de_grupo(nombre, textos):
+    """Número de antena: el de TECH{n} en sus cuadros de texto, o el nombre del grupo ("Group 10" -> 1)"""
+    for texto in textos:
+        encontrado = _TECH.search(texto)
+        if encontrado:
+            return int(encontrado.group(1))
+    digitos = re.search(r'\d+', nombre or '')
+    if digitos is None:
+        return None
+    return int(digitos.group()) % 10 or 10
+
+
+def analizar_grupos(xml):
+    """
+    Grupos de antenas del XML de un dibujo:
+    [{'nombre', 'antena', 'formas': [{'id', 'nombre', 'inicio', 'fin', 'roles'}]}]
+
+    inicio/fin son posiciones de cada forma en el XML; los roles son 'codigo'
+    (contiene XXX), 'tecnologias' (TECH{n}) y 'sector' (empieza por SECTOR).
+    """
+    grupos = []
+    for anclaje in _ANCLAJE.finditer(xml):
+        if 'grpSp>' not in anclaje.group(0):
+            continue
+        nombre_grupo = _NOMBRE.search(anclaje.group(0))
+        formas = []
+        textos = []
+        for forma in _FORMA.finditer(anclaje.group(0)):
+            texto = texto_forma(forma.group(0))
+            roles = []
+            if CODIGO_SITIO in texto:
+                roles.append('codigo')
+            if _TECH.search(texto):
+                roles.append('tecnologias')
+            if texto.strip().upper().startswith('SECTOR'):
+                roles.append('sector')
+            textos.append(texto)
+            if roles:
+                nombre = _NOMBRE.search(forma.group(0))
+                formas.append({
+                    'id': int(nombre.group(1)) if nombre else None,
+                    'nombre': unescape(nombre.group(2)) if nombre else None,
+                    'inicio': anclaje.start() + forma.start(),
+                    'fin': anclaje.start() + forma.end(),
+                    'roles': roles,
+                })
+        if formas:
+            nombre = unescape(nombre_grupo.group(2)) if nombre_grupo else None
+            grupos.append({'nombre': nombre, 'antena': _antena_de_grupo(nombre, textos), 'formas': formas})
+    return grupos
+
+
+def formas_vigentes(xml, grupos):
+    """True si cada forma del análisis sigue en su posición del XML (mismo id)"""
+    for grupo in grupos:
+        for forma in grupo['formas']:
+            inicio, fin = forma['inicio'], forma['fin']
+            if not (xml.startswith('<', inicio) and xml.endswith('sp>', 0, fin)):
+                return False
+            nombre = _NOMBRE.search(xml, inicio, fin)
+            if nombre is None or int(nombre.group(1)) != forma['id']:
+                return False
+    return True
+
+
+class SustitucionTextosAntenas:
+    """
+    Títulos y sectores de los grupos de antenas escritos directamente en el XML
+    del dibujo de la hoja de antenas, en una sola pasada y sin Excel:
+
+    - XXX -> código de sitio
+    - TECH{n} -> tecnologías de la antena n, en negrita azul
+    - SECTOR ... -> línea "(tecnologías)" del sector, solo en antenas cuyos
+      sectores tienen tecnologías distintas
+    """
+
+    def __init__(self, codigo_sitio, manifiesto):
+        self.codigo_sitio = codigo_sitio.upper()
+        self.manifiesto = manifiesto
+
+    def aplicar(self, xml_dibujo, grupos=None):
+        """
+        XML del dibujo (bytes) con los textos sustituidos. grupos es el análisis
+        precalculado del mismo XML (mapa_plantilla); sin él, o si no coincide, se analiza aquí.
+        """
+        xml = xml_dibujo.decode('utf-8')
+        if grupos is not None and not formas_vigentes(xml, grupos):
+            print("⚠️ El mapa de la plantilla no coincide con el dibujo; se analiza de nuevo")
+            grupos = None
+        if grupos is None:
+            grupos = analizar_grupos(xml)
+
+        cambios = {}  # inicio -> (fin, forma nueva)
+        for grupo in grupos:
+            antena = grupo['antena']
+            if antena is None:
+                print(f"✖ No se encontró número de antena en el grupo {grupo['nombre']}")
+                continue
+            # Cada cuadro SECTOR corresponde al sector en esa posición de todos los del TSS,
+            # igual que las fotos (tabla_posiciones_antenas); los que la antena no tiene quedan vacíos
+            sectores = iter(self.manifiesto.todos_los_sectores() if self.manifiesto.sectores_diferentes(antena) else ())
+            for forma in grupo['formas']:
+                original = xml[forma['inicio']:forma['fin']]
+                nueva = self._sustituir_forma(original, forma['roles'], antena, sectores)
+                if nueva != original:
+                    cambios[forma['inicio']] = (forma['fin'], nueva)
+
+        piezas, posicion = [], 0
+        for inicio in sorted(cambios):
+            fin, nueva = cambios[inicio]
+            piezas.append(xml[posicion:inicio])
+            piezas.append(nueva)
+            posicion = fin
+        piezas.append(xml[posicion:])
+        return ''.join(piezas).encode('utf-8')
+
+    def _sustituir_forma(self, forma, roles, antena, sectores):
+        if 'codigo' in roles:
+            forma = _reemplazar(forma, CODIGO_SITIO, self.codigo_sitio)
+            print(f"✓ Código actualizado en antena {antena}")
+
+        if 'tecnologias' in roles:
+            tecnologias = self.manifiesto.tecnologias_antena(antena)
+            patron = f"TECH{antena}"
+            if tecnologias and patron in texto_forma(forma):
+                forma = _formato_tecnologias(_reemplazar(forma, patron, ' + '.join(tecnologias)))
+                print(f"✓ Tecnologías actualizadas: {patron} → {' + '.join(tecnologias)}")
+
+        if 'sector' in roles:
+            sector = next(sectores, None)
+            tecnologias = self.manifiesto.tecnologias_sector(antena, sector) if sector is not None else []
+            if tecnologias:
+                forma = _agregar_parrafo(forma, f"({' + '.join(tecnologias)})")
+                print(f"✅ Antena {antena} - Sector {sector}: ({' + '.join(tecnologias)})")
+        return forma
+
+
+def sustituir_en_archivo(xlsx_path, sheet_index, sustitucion):
+    """
+    Aplica la sustitución al dibujo de una hoja de un xlsx ya guardado (escritor
+    de Excel), reescribiendo el zip una vez. Devuelve False si la hoja no tiene dibujo.
+    """
+    with zipfile.ZipFile(xlsx_path) as origen:
+        dibujo = dibujo_de_hoja(origen, resolver_hojas(origen)[sheet_index])
+        if dibujo is None:
+            return False
+        nuevo = sustitucion.aplicar(origen.read(dibujo))
+        temporal = f"{xlsx_path}.tmp"
+        with zipfile.ZipFile(temporal, 'w', zipfile.ZIP_DEFLATED) as destino:
+            for info in origen.infolist():
+                if info.filename == dibujo:
+                    destino.writestr(info.filename, nuevo)
+                else:
+                    copiar_entrada_cruda(origen, destino, info)
+    os.replace(temporal, xlsx_path)
+    return True
@@ -1,102 +1,91 @@
-import glob
+import argparse
 import io
 import os
-import json
-import re
 import shutil
-import traceback
 import warnings
 from collections import defaultdict
+from concurrent.futures import as_completed
 from datetime import timedelta
 
-import win32com
-from PIL import Image, ImageGrab
+from PIL import Image
 import openpyxl
-import xlwings as xw
-import win32com.client as win32
-import win32gui
-import win32con
+# xlwings solo hace falta para el escritor 'excel' del SID
+try:
+    import xlwings as xw
+except ImportError:
+    xw = None
 import time
 
-from openpyxl import load_workbook
 from openpyxl.utils import get_column_letter
+from openpyxl.utils.cell import coordinate_to_tuple
+
+from cache_extraccion import CACHE_MAX_MB, CacheExtraccion, hash_archivo
+from manifiesto_lote import ManifiestoLote
+from manifiesto_tecnologias import MANIFIESTO_TECNOLOGIAS, ManifiestoTecnologias
+from capturas_rangos import BACKENDS_CAPTURA, crear_captura
+from copia_celdas import BloqueCeldas
+from escritor_sid import (BACKENDS_ESCRITURA, PUNTOS_POR_CM, TAMANO_FOTO_ANTENA_CM, EscritorSIDOpenpyxl,
+                          geometrias_de, rectangulo_centrado, rectangulos_imagen, tabla_posiciones_antenas)
+from mapa_plantilla import cargar_mapa_plantilla
+from parche_ooxml import EscritorSIDOoxml
+from textos_antenas import SustitucionTextosAntenas, sustituir_en_archivo
+from imagenes import ProcesadorImagenes, metadatos_de_archivo
+from indices_hoja import etiquetas_antenas, orden_antena_sector
+from plan_extraccion import cargar_plan
+from cache_rangos import CACHE_RANGOS_MAX_MB, CacheRangos
+from render_rangos import colores_tema
+from sesion_tss import CronometroEtapas, SesionTSS
 
 warnings.filterwarnings('ignore', category=UserWarning, module='openpyxl.reader.drawings')
 
 config_path= "config.ericson.json"
 carpet_excels="TSS"
 # -*- coding: utf-8 -*-
-def listar_ventanas_office():
-    office_windows = []
-
-    def callback(hwnd, _):
-        title = win32gui.GetWindowText(hwnd)
-        class_name = win32gui.GetClassName(hwnd)
-        if (win32gui.IsWindowVisible(hwnd) and title and
-                ("Excel" in title or "Office" in title or class_name in ['NUIDialog', '#32770'])):
-            office_windows.append((hwnd, title, class_name))
-
-    win32gui.EnumWindows(callback, None)
-    return office_windows
-
-
-def cerrar_dialogos_office():
-    dialogs_closed = 0
-    windows = listar_ventanas_office()
-    for hwnd, title, class_name in windows:
-        try:
-            if class_name in ['NUIDialog', '#32770'] and "Excel" not in title:
-                win32gui.PostMessage(hwnd, win32con.WM_CLOSE, 0, 0)
-                time.sleep(2)
-                if win32gui.IsWindow(hwnd):
-                    win32gui.SendMessage(hwnd, win32con.WM_SYSCOMMAND, win32con.SC_CLOSE, 0)
-                    time.sleep(1)
-                if not win32gui.IsWindow(hwnd):
-                    dialogs_closed += 1
-        except:
-            pass
-    return dialogs_closed
-
-
-
 class TSSInstance:
     """Representa un archivo TSS individual con sus metadatos"""
-    def __init__(self, file_path,config_path=config_path):
+    def __init__(self, file_path,config_path=config_path, sesion=None, plan=None):
 
         self.file_path = file_path
         self.name = "DEFAULT_NAME"
         self.id = "DEFAULT_ID"
-        self.data = {'textos': {}, 'imagenes': {}}
+        # metadatos: ruta relativa a resultados_dir -> MetadatosImagen de cada imagen generada
+        # celdas: nombre de elemento 'rango' en modo celdas -> BloqueCeldas
+        self.data = {'textos': {}, 'imagenes': {}, 'antenas': [], 'metadatos': {}, 'celdas': {}}
+        self.tecnologias = ManifiestoTecnologias()  # Antena -> sector -> tecnologías, ver _procesar_individual
+        self.imagenes_pendientes = []  # (futuro, nombre de elemento o foto de antena), ver _recoger_imagenes
         self.resultados_dir = ""
-        self.config = _cargar_configuracion(config_path)
+        self.hash_tss = None  # Hash del contenido, lo calcula el lote una sola vez
+        # El plan se compila una vez por lote; solo se carga aquí si se usa la instancia suelta
+        self.plan = plan or cargar_plan(config_path)
+        self.config = self.plan.config
+        # Sesión compartida: el workbook se carga una sola vez para todas las etapas
+        self.sesion = sesion or SesionTSS(file_path)
+        self.celdas = {}
         self._extraer_metadatos()
 
 
     def _extraer_metadatos(self):
         """Extrae name/id al inicializar cada instancia usando la configuración"""
         try:
-            wb = openpyxl.load_workbook(self.file_path, data_only=True)
-            # Usar nombres de configuración en lugar de nombres directos de hojas
-            self.name = self._leer_celda(wb, "informacion", "H8")
-            self.id = self._leer_celda(wb, "informacion", "H7")
-            wb.close()
+            # Una sola pasada por hoja para nombre_sid.campos y todos los elementos texto
+            self.celdas = self.sesion.leer_celdas(self.plan.pedidos_celdas)
+            campos = self.config['nombre_sid']['campos']
+            self.name = self._leer_celda(campos['name']['hoja'], campos['name']['celda'])
+            self.id = self._leer_celda(campos['id']['hoja'], campos['id']['celda'])
         except Exception as e:
             print(f"⚠️ Error extrayendo metadatos de {self.file_path}: {str(e)}")
             self.name = f"ERROR_{os.path.basename(self.file_path)}"
             self.id = time.strftime('%Y%m%d%H%M%S')
 
-    def _leer_celda(self, wb, sheet_config_name, celda):
+    def _leer_celda(self, sheet_config_name, celda):
 
         global sheet_index
         try:
             # Obtener el índice de la hoja desde la configuración
             sheet_index = self._obtener_hoja_indice('tss', sheet_config_name)
 
-            # Obtener la hoja por índice
-            sheet = wb.worksheets[sheet_index]
-
-            # Leer y limpiar el valor de la celda
-            valor = sheet[celda].value
+            # Tomar el valor ya leído y limpiarlo
+            valor = self.celdas.get((sheet_index, celda))
             return str(valor).strip() if valor is not None else ""
 
         except KeyError as e:
@@ -112,24 +101,77 @@ class TSSInstance:
     def _obtener_hoja_indice(self, workbook_type, sheet_name):
         return self.config['hojas'][workbook_type][sheet_name]
 
+    def _clave_imagen(self, ruta):
+        return os.path.normpath(os.path.relpath(ruta, self.resultados_dir))
+
+    def registrar_metadatos(self, ruta, metadatos):
+        if metadatos:
+            self.data['metadatos'][self._clave_imagen(ruta)] = metadatos
+
+    def metadatos_imagen(self, ruta):
+        """Metadatos de la tabla; solo abre el archivo si la imagen no se registró al extraerla"""
+        clave = self._clave_imagen(ruta)
+        if clave not in self.data['metadatos']:
+            try:
+                self.data['metadatos'][clave] = metadatos_de_archivo(ruta)
+            except Exception as e:
+                print(f"⚠️ No se pudo leer la imagen {ruta}: {str(e)}")
+                return None
+        return self.data['metadatos'][clave]
+
 def _limpiar_texto(texto):
     """Limpio texto para usar en nombres de archivos"""
     return ''.join(c for c in texto if c not in '\\/:*?"<>|').replace(" ", "_")
 
-
-def _cargar_configuracion(config_path):
-    with open(config_path, encoding='utf-8') as f:
-        return json.load(f)
-
 OFFSET_BUSQUEDA = 12
 
 class TSSBatchProcessor:
     """Procesa múltiples archivos TSS en lote"""
 
-    def __init__(self, config_path=config_path):
-        self.config = _cargar_configuracion(config_path)
+    def __init__(self, config_path=config_path, usar_cache=True, cache_max_mb=CACHE_MAX_MB, incremental=False,
+                 captura=None, grabar_capturas=False, escritor=None, cache_rangos_max_mb=CACHE_RANGOS_MAX_MB):
+        # Configuración cargada, validada y compilada una sola vez: los errores saltan aquí
+        self.plan = cargar_plan(config_path)
+        self.plan.validar_plantilla()
+        self.config = self.plan.config
         self.tss_instances = []  # Lista de objetos TSSInstance
         self.total_time = 0
+        self.cronometro = CronometroEtapas()
+        # Backend de captura de rangos: config 'captura_rangos', sobrescrito por la CLI
+        opciones_captura = dict(self.plan.opciones_captura)
+        if captura:
+            opciones_captura['backend'] = captura
+        if grabar_capturas:
+            opciones_captura['grabar'] = True
+        # Cache de extracción por contenido del TSS y backend de captura (desactivable con --no-cache).
+        # Al grabar capturas no se usa: los rangos tienen que capturarse de verdad para grabarse
+        self.cache = None
+        if usar_cache and not opciones_captura['grabar']:
+            self.cache = CacheExtraccion(self.config, max_mb=cache_max_mb, captura=opciones_captura['backend'])
+        # Imágenes de rangos ya dibujados, por huella del contenido (mismo interruptor, límite propio)
+        self.cache_rangos = CacheRangos(max_mb=cache_rangos_max_mb) if usar_cache else None
+        self.captura = crear_captura(opciones_captura, self.cache_rangos)
+        # Escritor del SID: 'excel' (xlwings), 'openpyxl' u 'ooxml' (sin Excel); config 'escritura_sid' o CLI
+        self.escritor = escritor or self.plan.opciones_escritura['backend']
+        if self.escritor == 'excel' and xw is None:
+            raise ValueError("El escritor 'excel' requiere xlwings y Excel; usa 'openpyxl' u 'ooxml' en este equipo")
+        self.escritor_sid = None
+        if self.escritor in ('openpyxl', 'ooxml'):
+            # Grupos y cuadros de texto de la hoja de antenas: analizados una vez por versión de plantilla
+            mapa = cargar_mapa_plantilla(self.config['nombre_sid']['plantilla'], self.plan.indices_sid['antenas'])
+            escritor_sid = EscritorSIDOpenpyxl if self.escritor == 'openpyxl' else EscritorSIDOoxml
+            self.escritor_sid = escritor_sid(self.plan, mapa)
+        # Geometría de las hojas de la plantilla para colocar imágenes sin consultar a Excel
+        self.geometrias = None
+        # Pool de imágenes compartido por todo el lote; se crea en cada procesar_lote
+        self.imagenes = None
+        # Manifiesto de la última ejecución; en modo incremental se saltan los SID al día
+        self.incremental = incremental
+        self.manifiesto = ManifiestoLote(self.config, self.config['nombre_sid']['plantilla'],
+                                         opciones={'captura': opciones_captura['backend'], 'escritor': self.escritor})
+        self.omitidos = 0
+        self.regenerados = 0
+        self.fallidos = 0
 
     def procesar_lote(self, tss_folder="TSS"):
 
@@ -141,32 +183,74 @@ class TSSBatchProcessor:
         tss_files = self._encontrar_archivos_tss(tss_folder)
         total_files = len(tss_files)
         start_time_total = time.monotonic()
+        # Pool y almacén de imágenes propios de esta llamada: se cierran al terminar el lote
+        self.imagenes = ProcesadorImagenes(self.plan.opciones_imagenes)
 
-        for i, tss_path in enumerate(tss_files, 1):
-            print(f"\n📂 Procesando archivo {i} de {total_files}")
-            file_start_time = time.monotonic()
-
-            tss_instance = TSSInstance(tss_path)
-            self.tss_instances.append(tss_instance)
-            self._procesar_individual(tss_instance)
-
-            file_time = time.monotonic() - file_start_time
-            self.total_time += file_time
-            print(f"⏱️ Tiempo archivo: {timedelta(seconds=file_time)}")
+        try:
+            for i, tss_path in enumerate(tss_files, 1):
+                print(f"\n📂 Procesando archivo {i} de {total_files}")
+                file_start_time = time.monotonic()
+
+                cronometro = CronometroEtapas()
+                with cronometro.etapa('hash_tss'):
+                    hash_tss = hash_archivo(tss_path)
+
+                if self.incremental and self.manifiesto.vigente(tss_path, hash_tss):
+                    self.omitidos += 1
+                    print(f"⏭️ Sin cambios, SID al día: {os.path.basename(tss_path)}")
+                    self.cronometro.fusionar(cronometro)
+                    continue
 
-            # Estimación del tiempo restante
-            remaining_files = total_files - i
-            avg_time = self.total_time / i
-            estimated_remaining = avg_time * remaining_files
-            print(f"⏳ Estimado restante: {timedelta(seconds=estimated_remaining)}")
+                with SesionTSS(tss_path, cronometro) as sesion:
+                    with cronometro.etapa('metadatos'):
+                        tss_instance = TSSInstance(tss_path, sesion=sesion, plan=self.plan)
+                    tss_instance.hash_tss = hash_tss
+                    self.tss_instances.append(tss_instance)
+                    output_path, completo = self._procesar_individual(tss_instance)
+                cronometro.imprimir_resumen(f"ETAPAS {tss_instance.name}_{tss_instance.id}")
+                self.cronometro.fusionar(cronometro)
+
+                # Un SID con errores no queda al día: el modo incremental lo vuelve a generar
+                if completo and os.path.exists(output_path):
+                    self.regenerados += 1
+                    self.manifiesto.registrar(tss_path, hash_tss, output_path)
+                else:
+                    self.fallidos += 1
+                    self.manifiesto.olvidar(tss_path)
+
+                file_time = time.monotonic() - file_start_time
+                self.total_time += file_time
+                print(f"⏱️ Tiempo archivo: {timedelta(seconds=file_time)}")
+
+                # Estimación del tiempo restante
+                remaining_files = total_files - i
+                avg_time = self.total_time / i
+                estimated_remaining = avg_time * remaining_files
+                print(f"⏳ Estimado restante: {timedelta(seconds=estimated_remaining)}")
+        finally:
+            # También si un TSS lanza una excepción: sin hilos colgados ni almacén temporal huérfano
+            self.imagenes.cerrar()
+            self.captura.cerrar()
 
         total_elapsed = time.monotonic() - start_time_total
         print("\n" + "=" * 50)
         print(" RESUMEN DE TIEMPOS ")
         print("=" * 50)
         print(f"📊 Total archivos procesados: {total_files}")
+        print(f"🔁 Regenerados: {self.regenerados} | ⏭️ Omitidos (sin cambios): {self.omitidos} | "
+              f"⚠️ Con errores (se reintentan): {self.fallidos}")
         print(f"⏱️ Tiempo total: {timedelta(seconds=total_elapsed)}")
         print(f"⏱️ Tiempo promedio por archivo: {timedelta(seconds=total_elapsed / total_files if total_files else 0)}")
+        if self.cache:
+            print(f"🗃️ Cache de extracción: {self.cache.aciertos} aciertos, {self.cache.fallos} fallos")
+        if self.cache_rangos and self.cache_rangos.por_elemento:
+            self.cache_rangos.imprimir_resumen()
+        print(f"🖼️ Pool de imágenes: {self.plan.opciones_imagenes['hilos']} hilos, pico en vuelo "
+              f"{self.imagenes.pico_en_vuelo / 1024 / 1024:.1f} MB "
+              f"(límite {self.plan.opciones_imagenes['max_mb_en_vuelo']} MB)")
+        print(f"♻️ Imágenes duplicadas en el lote: {self.imagenes.duplicadas}, "
+              f"{self.imagenes.bytes_evitados / 1024 / 1024:.1f} MB sin volver a procesar ni escribir")
+        self.cronometro.imprimir_resumen("ETAPAS DEL LOTE")
         print("=" * 50 + "\n")
 
     def _encontrar_archivos_tss(self, folder_path):
@@ -189,7 +273,10 @@ class TSSBatchProcessor:
             return []
 
     def _procesar_individual(self, tss_instance):
-        """Procesamiento completo para un TSS"""
+        """
+        Procesamiento completo para un TSS. Devuelve (ruta del SID, completo):
+        completo es False si algún elemento no se pudo extraer o insertar
+        """
         print(f"\n🔁 Procesando {tss_instance.name}_{tss_instance.id}")
 
         # 1. Configurar rutas
@@ -210,17 +297,73 @@ class TSSBatchProcessor:
         tss_instance.resultados_dir = os.path.join("resultados", f"{tss_instance.name}_{tss_instance.id}")
         os.makedirs(tss_instance.resultados_dir, exist_ok=True)
 
-        # 2. Procesar contenido (adaptar tus métodos actuales)
-        self._extraer_datos(tss_instance)
-
-        self.procesar_fotos_antenas(tss_instance)
-
-        self._generar_sid(
-            tss_instance,
-            self.config['nombre_sid']['plantilla'],
-            output_path
-        )
-        print(f"✅ Proceso completado para {tss_instance.file_path}")
+        # 2. Procesar contenido reutilizando el workbook ya abierto en la sesión
+        sesion = tss_instance.sesion
+        cronometro = sesion.cronometro
+        try:
+            clave_cache = None
+            en_cache = False
+            completo = True  # Solo se guardan en cache extracciones completas
+            if self.cache:
+                with cronometro.etapa('cache_extraccion'):
+                    if tss_instance.hash_tss is None:
+                        tss_instance.hash_tss = hash_archivo(tss_instance.file_path)
+                    clave_cache = self.cache.clave(tss_instance.hash_tss)
+                    en_cache = self.cache.restaurar(clave_cache, tss_instance)
+                if en_cache:
+                    print(f"🗃️ Extracción recuperada de cache ({clave_cache}), directo a generar SID")
+
+            if not en_cache:
+                # Cada etapa informa si resolvió todos sus elementos; todas se ejecutan igual
+                with cronometro.etapa('extraccion_datos'):
+                    completo = self._extraer_datos(tss_instance)
+
+                with cronometro.etapa('fotos_antenas'):
+                    completo = self.procesar_fotos_antenas(tss_instance) and completo
+
+                with cronometro.etapa('espera_imagenes'):
+                    completo = self._recoger_imagenes(tss_instance) and completo
+
+                # Una extracción incompleta no se guarda: se reintenta en la próxima ejecución
+                if clave_cache and completo:
+                    with cronometro.etapa('cache_extraccion'):
+                        self.cache.guardar(clave_cache, tss_instance)
+                elif clave_cache:
+                    print("⚠️ Extracción incompleta: no se guarda en cache para reintentarla")
+        finally:
+            # El TSS ya no se necesita para generar el SID
+            sesion.cerrar()
+
+        # Manifiesto de tecnologías por antena/sector: única fuente para las etapas del SID
+        tss_instance.tecnologias = ManifiestoTecnologias.desde_fotos(tss_instance.data['antenas'])
+        tss_instance.tecnologias.guardar(os.path.join(tss_instance.resultados_dir, MANIFIESTO_TECNOLOGIAS))
+
+        with cronometro.etapa('generacion_sid'):
+            completo = self._generar_sid(
+                tss_instance,
+                self.config['nombre_sid']['plantilla'],
+                output_path
+            ) and completo
+        self._informar_tamano_sid(output_path, cronometro)
+        if completo:
+            print(f"✅ Proceso completado para {tss_instance.file_path}")
+        else:
+            print(f"⚠️ Proceso completado con errores para {tss_instance.file_path}")
+        return output_path, completo
+
+    def _informar_tamano_sid(self, output_path, cronometro):
+        """Tamaño del SID y reducción de las imágenes extraídas (no aplica si vinieron de cache)"""
+        if not os.path.exists(output_path):
+            return
+        tamano = os.path.getsize(output_path)
+        cronometro.contar('bytes_sid', tamano)
+        print(f"📦 SID: {tamano / 1024 / 1024:.1f} MB")
+
+        originales = cronometro.contadores.get('bytes_imagenes_originales', 0)
+        escritos = cronometro.contadores.get('bytes_imagenes_escritos', 0)
+        if originales:
+            print(f"🖼️ Imágenes: {originales / 1024 / 1024:.1f} MB en el TSS → {escritos / 1024 / 1024:.1f} MB "
+                  f"para el SID ({(originales - escritos) / 1024 / 1024:.1f} MB menos)")
 
     # Configuración y helpers básicos
 
@@ -234,156 +377,116 @@ class TSSBatchProcessor:
     def _extraer_datos(self, tss_instance):
         """Procesa el TSS agrupando elementos por tipo para optimización"""
         print(f"\n=== EXTRAYENDO DATOS DE {tss_instance.name}_{tss_instance.id} ===")
-        wb_tss = None
         try:
-            wb_tss = openpyxl.load_workbook(tss_instance.file_path, data_only=True)
-
-            # Organizar elementos por tipo para procesamiento eficiente
-            elementos_por_tipo = {
-                'rango': [],
-                'imagen': [],
-                'texto': []
-            }
-
-            for elemento in self.config['elementos']:
-                elementos_por_tipo[elemento['tipo']].append(elemento)
-
-            # Procesar textos primero (más rápido)
-            for elemento in elementos_por_tipo['texto']:
-                self._procesar_texto(wb_tss, tss_instance, elemento)
-
-            # Procesar rangos (requiere Excel COM)
-            if elementos_por_tipo['rango']:
-                self._procesar_rangos_agrupados(wb_tss, tss_instance, elementos_por_tipo['rango'])
-
-            # Procesar imágenes
-            for elemento in elementos_por_tipo['imagen']:
-                self._procesar_imagen(wb_tss, tss_instance, elemento)
-
-            print(f"✅ Extracción completada para {tss_instance.name}_{tss_instance.id}")
-            return True
+            # Elementos ya agrupados por tipo en el plan compilado
+            elementos_por_tipo = self.plan.por_tipo
+
+            # Procesar textos primero (ya leídos junto con los metadatos)
+            if elementos_por_tipo['texto']:
+                self._procesar_textos(tss_instance, elementos_por_tipo['texto'])
+
+            # Encolar imágenes hoja por hoja (anclas y combinadas se leen una vez por hoja);
+            # el pool las escribe mientras se capturan los rangos. Una imagen ausente del TSS
+            # es un resultado estable (None); solo un error (False) deja la extracción incompleta
+            completo = True
+            for elementos_hoja in self.plan.por_hoja_origen.values():
+                for elemento in elementos_hoja:
+                    if elemento['tipo'] == 'imagen':
+                        completo = self._procesar_imagen(tss_instance, elemento) is not False and completo
+
+            # Rangos: copia de celdas (sin rasterizar) o imagen con el backend de captura
+            rangos_por_modo = self.plan.rangos_por_modo
+            if rangos_por_modo['celdas']:
+                with tss_instance.sesion.cronometro.etapa('rangos_celdas'):
+                    completo = self._procesar_rangos_celdas(tss_instance, rangos_por_modo['celdas']) and completo
+            if rangos_por_modo['imagen']:
+                completo = self._procesar_rangos_agrupados(tss_instance, rangos_por_modo['imagen']) and completo
+
+            if completo:
+                print(f"✅ Extracción completada para {tss_instance.name}_{tss_instance.id}")
+            else:
+                print(f"⚠️ Extracción incompleta para {tss_instance.name}_{tss_instance.id}")
+            return completo
 
         except Exception as e:
             print(f"❌ Error en extracción de datos: {str(e)}")
             return False
-        finally:
-            wb_tss.close()
     # Procesamiento interno del tss
 
-    def _procesar_texto(self, wb_tss, tss_instance, elemento):
-        """Procesa un elemento de texto y lo almacena en la instancia"""
-        try:
-            sheet_index = self._obtener_hoja_indice('tss', elemento['origen']['hoja'])
-            sheet = wb_tss.worksheets[sheet_index]
-            valor = sheet[elemento['origen']['celda']].value
+    def _procesar_textos(self, tss_instance, elementos_texto):
+        """Almacena en la instancia los textos leídos en la pasada inicial de celdas"""
+        for elemento in elementos_texto:
+            valor = tss_instance.celdas.get((self.plan.indice_origen(elemento), elemento['origen']['celda']))
             tss_instance.data['textos'][elemento['nombre']] = str(valor).strip() if valor else ""
             print(f"Texto '{elemento['nombre']}' extraído: {tss_instance.data['textos'][elemento['nombre']][:50]}...")
-        except Exception as e:
-            print(f"⚠️ Error procesando texto {elemento['nombre']}: {str(e)}")
 
-    def _procesar_rangos_agrupados(self, wb_tss, tss_instance, elementos_rango):
-        """Procesa múltiples rangos usando Excel COM"""
+    def _procesar_rangos_celdas(self, tss_instance, elementos_rango):
+        """Copia valores, estilos, combinadas y medidas de los rangos en modo 'celdas'. True si se copiaron todos"""
+        sesion = tss_instance.sesion
+        tema = colores_tema(sesion.workbook)
+        completo = True
+        for elemento in elementos_rango:
+            try:
+                hoja = sesion.hoja(self.plan.indice_origen(elemento))
+                bloque = BloqueCeldas.desde_hoja(hoja, elemento['origen']['rango'], tema)
+                tss_instance.data['celdas'][elemento['nombre']] = bloque
+                print(f"✅ Rango '{elemento['nombre']}' copiado como celdas "
+                      f"({bloque.filas}x{bloque.columnas}, {len(bloque.celdas)} celdas)")
+            except Exception as e:
+                print(f"❌ No se pudo copiar el rango '{elemento['nombre']}': {str(e)}")
+                completo = False
+        return completo
+
+    def _procesar_rangos_agrupados(self, tss_instance, elementos_rango):
+        """Procesa múltiples rangos con el backend de captura configurado (ver capturas_rangos). True si se capturaron todos"""
         try:
 
             rangos_dict = {
                 elem['nombre']: {
                     'rango': elem['origen']['rango'],
-                    'hoja': elem['origen']['hoja']
+                    'hoja': elem['origen']['hoja'],
+                    'indice': self._obtener_hoja_indice('tss', elem['origen']['hoja'])
                 }
                 for elem in elementos_rango
             }
 
-            resultados = self.capturar_multiples_rangos(tss_instance, rangos_dict)
+            # Etapa con el nombre del backend para comparar tiempos entre ellos
+            with tss_instance.sesion.cronometro.etapa(f'rangos_{self.captura.nombre}'):
+                resultados = self.captura.capturar(tss_instance, rangos_dict)
 
 
-                # 4. Almacenar rutas de imágenes válidas
-            for nombre, ruta_imagen in resultados.items():
+                # 4. Almacenar rutas de imágenes válidas (el backend puede devolver menos rangos si falla)
+            completo = True
+            for nombre in rangos_dict:
+                ruta_imagen = resultados.get(nombre)
                 if ruta_imagen and os.path.exists(ruta_imagen):
                     tss_instance.data['imagenes'][nombre] = ruta_imagen
                     print(f"✅ Rango '{nombre}' guardado en {ruta_imagen}")
                 else:
                     print(f"⚠️ No se pudo capturar el rango '{nombre}' o la imagen no existe")
+                    completo = False
 
-            return True
+            return completo
 
         except Exception as e:
             print(f"❌ Error en procesamiento de rangos agrupados: {str(e)}")
             return False
 
-    def capturar_multiples_rangos(self, tss_instance, rangos_dict):
-        """Captura rangos usando Excel COM y guarda en la carpeta de la instancia"""
-        excel = None
-        resultados = {}
-        wb = None
-
-        try:
-            excel = win32.gencache.EnsureDispatch('Excel.Application')
-            excel.Visible = True
-            excel.DisplayAlerts = False
-
-            wb = excel.Workbooks.Open(os.path.abspath(tss_instance.file_path))
-            cerrar_dialogos_office()
-
-            os.makedirs(tss_instance.resultados_dir, exist_ok=True)
-
-            for nombre, config in rangos_dict.items():
-                output_path = os.path.join(tss_instance.resultados_dir, f"{nombre}.png")
-                print("outputpath resultados dir", output_path)
-                sheet_index = self._obtener_hoja_indice('tss', config['hoja']) + 1
-                sheet = wb.Sheets(sheet_index)
-
-                for intento in range(3):
-                    try:
-                        sheet.Range(config['rango']).CopyPicture(Appearance=1, Format=2)
-                        time.sleep(2)
-
-                        img = ImageGrab.grabclipboard()
-                        if img:
-                            img.save(output_path)
-                            resultados[nombre] = output_path
-                            print(f"✅ {nombre} guardado en {output_path}")
-                            break
-                    except Exception as e:
-                        print(f"⚠️ Intento {intento + 1} para {nombre}: {str(e)}")
-                        time.sleep(1)
-                else:
-                    resultados[nombre] = None
-                    print(f"❌ No se pudo capturar el rango '{nombre}'")
-
-            return resultados
-
-
-        except Exception as e:
-            print(f"❌ Error crítico en captura de rangos: {str(e)}")
-            return {}  # Retornar diccionario vacío en caso de error crítico
-
-        finally:
-            # Cerrar todo correctamente
-            try:
-                if wb is not None:
-                    wb.Close(SaveChanges=False)
-            except Exception as e:
-                print(f"⚠️ Error cerrando libro: {str(e)}")
-            try:
-                if excel is not None:
-                    excel.DisplayAlerts = False
-                    excel.Quit()
-            except Exception as e:
-                print(f"⚠️ Error cerrando Excel: {str(e)}")
-            # Liberar recursos COM
-            del wb
-            del excel
-
-    def _procesar_imagen(self, wb_tss, tss_instance, elemento):
-        """Busca imágenes mostrando el rango de celdas de búsqueda"""
+    def _procesar_imagen(self, tss_instance, elemento):
+        """
+        Busca imágenes mostrando el rango de celdas de búsqueda (leyendo anclas desde el zip).
+        Devuelve el futuro del pool, None si la imagen no está en el TSS o False si hubo un error
+        """
         try:
             sheet_index = self._obtener_hoja_indice('tss', elemento['origen']['hoja'])
-            sheet = wb_tss.worksheets[sheet_index]
-            celda = sheet[elemento['origen']['celda']]
+            medios = tss_instance.sesion.medios
+            celda = elemento['origen']['celda']
 
             # Determinar coordenadas de búsqueda
-            merged_range = self._encontrar_rango_combinado(celda, sheet)  # Pasar sheet como parámetro
+            merged_range = self._encontrar_rango_combinado(celda, medios.indice_combinados(sheet_index))
             min_row, max_row, min_col, max_col = self._obtener_rango_expandido(celda, merged_range)
+            fila_ref, col_ref = ((merged_range.min_row, merged_range.min_col) if merged_range
+                                 else coordinate_to_tuple(celda))
 
             # Convertir coordenadas numéricas a formato de letra de columna (A, B, C...)
             col_letter_start = openpyxl.utils.get_column_letter(min_col)
@@ -394,40 +497,74 @@ class TSSBatchProcessor:
                   f"(Columnas {min_col}-{max_col}, Filas {min_row}-{max_row})")
 
             # Verificar si la hoja tiene imágenes antes de intentar acceder
-            if not hasattr(sheet, '_images'):
-                print(f"⚠️ Hoja {sheet.title} no contiene imágenes")
+            if not medios.anclas(sheet_index):
+                print(f"⚠️ Hoja '{elemento['origen']['hoja']}' no contiene imágenes")
                 return None
 
-            # Buscar imagen en el rango
-            for img in sheet._images:
-                img_top = img.anchor._from.row + 1
-                img_left = img.anchor._from.col + 1
-
-                if (min_row <= img_top <= max_row) and (min_col <= img_left <= max_col):
-                    img_path = os.path.join(tss_instance.resultados_dir, f"{elemento['nombre']}.png")
-                    os.makedirs(os.path.dirname(img_path), exist_ok=True)  # Asegurar que el directorio existe
-
-                    image_bytes = img._data()
-                    image = Image.open(io.BytesIO(image_bytes))
-                    image.save(img_path)
-                    tss_instance.data['imagenes'][elemento['nombre']] = img_path
-                    print(f"✅ Imagen '{elemento['nombre']}' encontrada en posición: "
-                          f"Columna {img_left}, Fila {img_top}")
-                    return img_path
+            # Imágenes que se solapan con el rango, la más cercana primero;
+            # solo se leen los bytes de la elegida
+            candidatas = medios.indice_imagenes(sheet_index).cercanos(
+                min_row, min_col, max_row, max_col, fila_ref, col_ref)
+            if len(candidatas) > 1:
+                print(f"ℹ️ {len(candidatas)} imágenes en el rango, se usa la más cercana a {celda}")
+
+            for candidata in candidatas[:1]:
+                ancla = candidata.valor
+
+                # El pool escribe los bytes originales con su extensión real; solo se
+                # recodifica si Excel no admite el formato o si sobra resolución
+                # para el tamaño destino
+                image_bytes = medios.leer_bytes(ancla)
+                destino_cm = (elemento['destino'].get('ancho'), elemento['destino'].get('alto'))
+                futuro = self.imagenes.enviar(image_bytes,
+                                              os.path.join(tss_instance.resultados_dir, elemento['nombre']),
+                                              tss_instance.sesion.cronometro, destino_cm)
+                tss_instance.imagenes_pendientes.append((futuro, elemento['nombre']))
+                print(f"✅ Imagen '{elemento['nombre']}' encontrada en posición: "
+                      f"Columna {ancla.col}, Fila {ancla.fila}")
+                return futuro
 
             print(f"⚠️ Imagen {elemento['nombre']} no encontrada en el rango especificado")
             return None
 
         except Exception as e:
             print(f"❌ Error al buscar imagen: {str(e)}")
-            return None
+            return False
 
-    def _encontrar_rango_combinado(self, target_cell, sheet):
-        """Encontrar rango combinado para la celda objetivo"""
-        for merged_cell in sheet.merged_cells.ranges:  # Usar sheet en lugar de self.sheet_tss
-            if target_cell.coordinate in merged_cell:
-                print(f"\n ✅ Celda combinada encontrada: {merged_cell.coord}")
-                return merged_cell
+    def _recoger_imagenes(self, tss_instance):
+        """
+        Recoge las imágenes del pool a medida que terminan y completa tss_instance.data.
+        True si se guardaron todas
+        """
+        pendientes = dict(tss_instance.imagenes_pendientes)
+        tss_instance.imagenes_pendientes = []
+        completo = True
+        for futuro in as_completed(pendientes):
+            destino = pendientes[futuro]
+            try:
+                ruta, metadatos = futuro.result()
+            except Exception as e:
+                print(f"❌ Error guardando imagen {destino}: {str(e)}")
+                completo = False
+                continue
+
+            tss_instance.registrar_metadatos(ruta, metadatos)
+            if isinstance(destino, dict):
+                tss_instance.data['antenas'].append(dict(destino, archivo=ruta))
+            else:
+                tss_instance.data['imagenes'][destino] = ruta
+            print(f"Imagen guardada en: {ruta}")
+
+        tss_instance.data['antenas'].sort(key=lambda foto: orden_antena_sector((foto['antena'], foto['sector'])))
+        return completo
+
+    def _encontrar_rango_combinado(self, target_cell, indice_combinados):
+        """Encontrar rango combinado para la celda objetivo (coordenada tipo 'J55')"""
+        encontrado = indice_combinados.contenedor(*coordinate_to_tuple(target_cell))
+        if encontrado:
+            merged_cell = encontrado.valor
+            print(f"\n ✅ Celda combinada encontrada: {merged_cell.coord}")
+            return merged_cell
         print(f"\n ℹ️ Celda no está combinada")
         return None
 
@@ -437,8 +574,8 @@ class TSSBatchProcessor:
             min_row, max_row = merged_range.min_row, merged_range.max_row
             min_col, max_col = merged_range.min_col, merged_range.max_col
         else:
-            min_row = max_row = target_cell.row
-            min_col = max_col = target_cell.column
+            min_row, min_col = coordinate_to_tuple(target_cell)
+            max_row, max_col = min_row, min_col
 
         # Ampliar rango con márgenes
         return (
@@ -451,44 +588,77 @@ class TSSBatchProcessor:
     #Generacion de sid
 
     def _generar_sid(self, tss_instance, plantilla_path, output_path):
+        """
+        Genera el SID con el escritor configurado. False si alguna imagen no se pudo
+        insertar o si el escritor falló: un TSS con errores no detiene el lote
+        """
+        if self.escritor_sid is not None:
+            try:
+                return self.escritor_sid.escribir(tss_instance, plantilla_path, output_path)
+            except Exception as e:
+                print(f"\n❌ Error generando SID: {str(e)}")
+                return False
+        return self._generar_sid_excel(tss_instance, plantilla_path, output_path)
+
+    def _generar_sid_excel(self, tss_instance, plantilla_path, output_path):
         """Genera el SID con los datos extraídos, soportando múltiples celdas destino"""
         print("\n=== GENERANDO SID ===")
+        self.geometrias = geometrias_de(self.geometrias, plantilla_path)
         app = xw.App(visible=False)
 
         try:
-            wb_sid = app.books.open(plantilla_path)
-
-            # 1. Insertar textos (ahora soporta múltiples celdas destino)
-            for elemento in self.config['elementos']:
-                if elemento['tipo'] == 'texto' and elemento['nombre'] in tss_instance.data['textos']:
-                    sheet_index = self._obtener_hoja_indice('sid', elemento['destino']['hoja'])
-                    sheet = wb_sid.sheets[sheet_index]
-                    valor = tss_instance.data['textos'][elemento['nombre']]
-
-                    # Insertar el mismo valor en todas las celdas especificadas
-                    for celda in elemento['destino']['celdas']:
-                        sheet[celda].value = valor
-                        print(f"Texto '{elemento['nombre']}' insertado en {celda}")
-
-            # 2. Insertar imágenes/rangos (ya soporta múltiples celdas via _insertar_imagen)
-            for elemento in self.config['elementos']:
-                if elemento['tipo'] in ['imagen', 'rango'] and elemento['nombre'] in tss_instance.data['imagenes']:
-                    self._insertar_imagen(wb_sid,tss_instance, elemento)
-
-            self._insertar_fotos_antenas(wb_sid, tss_instance)
-            self._actualizar_titulos_antenas(wb_sid, tss_instance)
-            self._actualizar_sectores_con_tecnologias(wb_sid, tss_instance)
+            # Excel abre la plantilla desde el disco en cada SID; se mide igual que la copia de los otros escritores
+            with tss_instance.sesion.cronometro.etapa('carga_plantilla'):
+                wb_sid = app.books.open(plantilla_path)
+
+            # 1. Visitar cada hoja destino una sola vez: textos y luego imágenes/rangos
+            completo = True
+            geometrias_sid = {}  # índice de hoja -> geometría tras pegar los rangos como celdas
+            for sheet_index, elementos_hoja in self.plan.por_hoja_destino.items():
+                sheet = wb_sid.sheets[sheet_index]
+                geometria = self.geometrias.hoja(sheet_index)
+
+                for elemento in elementos_hoja:
+                    if elemento['tipo'] == 'texto' and elemento['nombre'] in tss_instance.data['textos']:
+                        valor = tss_instance.data['textos'][elemento['nombre']]
+
+                        # Insertar el mismo valor en todas las celdas especificadas
+                        for celda in elemento['destino']['celdas']:
+                            sheet[celda].value = valor
+                            print(f"Texto '{elemento['nombre']}' insertado en {celda}")
+
+                # 2. Insertar imágenes/rangos (soporta múltiples celdas via _insertar_imagen)
+                for elemento in elementos_hoja:
+                    if elemento['tipo'] == 'rango' and elemento['nombre'] in tss_instance.data['celdas']:
+                        bloque = tss_instance.data['celdas'][elemento['nombre']]
+                        for celda in elemento['destino']['celdas']:
+                            bloque.aplicar_xlwings(sheet, celda)
+                            geometria = geometria.con_bloque(celda, bloque)
+                            print(f"Rango '{elemento['nombre']}' pegado como celdas en {celda}")
+                    elif elemento['tipo'] in ['imagen', 'rango'] and elemento['nombre'] in tss_instance.data['imagenes']:
+                        completo = self._insertar_imagen(sheet, tss_instance, elemento, geometria) and completo
+                geometrias_sid[sheet_index] = geometria
+
+            self._insertar_fotos_antenas(
+                wb_sid, tss_instance, geometrias_sid.get(self._obtener_hoja_indice('sid', 'antenas')))
 
             # Guardar el resultado
             wb_sid.save(output_path)
-            print(f"\n✅ SID generado correctamente en: {os.path.abspath(output_path)}")
 
         except Exception as e:
             print(f"\n❌ Error generando SID: {str(e)}")
-            raise
+            return False
         finally:
             app.quit()
 
+        # Títulos y sectores de antenas en el XML del dibujo, sin recorrer las formas por COM
+        with tss_instance.sesion.cronometro.etapa('textos_antenas'):
+            sustitucion = SustitucionTextosAntenas(tss_instance.id, tss_instance.tecnologias)
+            if not sustituir_en_archivo(output_path, self._obtener_hoja_indice('sid', 'antenas'), sustitucion):
+                print("ℹ️ La hoja de antenas del SID no tiene dibujo")
+        print(f"\n✅ SID generado correctamente en: {os.path.abspath(output_path)}")
+        return completo
+
     def _obtener_hoja(self, wb, sheet_identifier, book_type='sid'):
         """
         Obtiene una hoja por nombre o índice, con manejo de errores mejorado
@@ -509,90 +679,59 @@ class TSSBatchProcessor:
                 f"Hojas disponibles:\n{available_sheets}"
             ) from e
 
-    def _insertar_imagen(self, wb_sid, tss_instance, elemento):
-        """Versión que soporta tamaño específico para imágenes y centrado en celda"""
+    def _insertar_imagen(self, sheet, tss_instance, elemento, geometria):
+        """
+        Versión que soporta tamaño específico para imágenes y centrado en celda.
+        Posición y tamaño se calculan con la geometría de la hoja (sin consultar
+        rangos a Excel) y cada imagen se inserta con una sola llamada.
+        """
 
         nombre = elemento['nombre']
 
         try:
             print(f"\n=== Insertando imagen '{nombre}' ===")
 
-            # 1. Verificar existencia de la imagen
+            # 1. Verificar existencia de la imagen (la tabla de metadatos evita abrirla)
             img_path = os.path.abspath(tss_instance.data['imagenes'].get(nombre))
-            if not os.path.exists(img_path):
+            metadatos = tss_instance.metadatos_imagen(img_path)
+            if metadatos is None:
                 raise FileNotFoundError(
                     f"Imagen no encontrada.\nBuscada: {img_path}")
 
-            # 2. Obtener hoja destino
-            sheet_index = self._obtener_hoja_indice('sid', elemento['destino']['hoja'])
-            sheet = wb_sid.sheets[sheet_index]
+            # 2. Hoja destino (ya resuelta por el plan)
             print(f"Hoja destino: {sheet.name} (índice {sheet.index})")
 
-            # 3. Obtener y convertir dimensiones (cm a puntos)
+            # 3. Dimensiones configuradas (cm); si falta una se mantiene la relación de aspecto
             width_cm = elemento['destino'].get('ancho')  # En cm
             height_cm = elemento['destino'].get('alto')  # En cm
-
-            # Convertir cm a puntos (1 cm = 28.35 puntos)
-            width = width_cm * 28.35 if width_cm is not None else None
-            height = height_cm * 28.35 if height_cm is not None else None
-
-            print(f"Configuración de tamaño - Ancho: {width_cm}cm ({width}pt), Alto: {height_cm}cm ({height}pt)")
+            print(f"Configuración de tamaño - Ancho: {width_cm}cm, Alto: {height_cm}cm")
 
             # 4. Procesar TODAS las celdas destino
-            for celda in elemento['destino']['celdas']:
+            completo = True
+            for celda, left, top, width, height in rectangulos_imagen(geometria, elemento['destino'], metadatos):
                 try:
-                    rango = sheet.range(celda)
-                    print(f"Insertando en celda: {rango.address}")
-
-                    # Calcular posición centrada
-                    left = rango.left + 5
-                    top = rango.top + 70
-                    # Insertar imagen
-                    picture = sheet.pictures.add(
+                    sheet.pictures.add(
                         img_path,
                         left=left,
                         top=top,
                         width=width,
                         height=height
                     )
-
-
-                    # # Mantener relación de aspecto si solo se especifica una dimensión
-                    if width is not None and height is None:
-                        # Mantener relación de aspecto basado en el ancho
-                        img = Image.open(img_path)
-                        aspect_ratio = img.height / img.width
-                        picture.height = width * aspect_ratio
-                        # Recalcular posición vertical después de ajustar altura
-                        picture.top = rango.top + (rango.height - picture.height) / 2
-                    elif height is not None and width is None:
-                        # Mantener relación de aspecto basado en el alto
-                        img = Image.open(img_path)
-                        aspect_ratio = img.width / img.height
-                        picture.width = height * aspect_ratio
-                        # Recalcular posición horizontal después de ajustar ancho
-                        picture.left = rango.left + (rango.width - picture.width) / 2
-
-                    print(f"✅ Imagen insertada en {celda} - Tamaño: {width or 'auto'}x{height or 'auto'}")
+                    print(f"✅ Imagen insertada en {celda} - Tamaño: {width:.0f}x{height:.0f} pt")
 
                 except Exception as e:
                     print(f"⚠️ Error insertando en {celda}: {type(e).__name__} - {str(e)}")
+                    completo = False
 
-            return True
+            return completo
 
         except Exception as e:
             print(f"\n❌ ERROR insertando '{nombre}': {type(e).__name__}")
             print(f"Mensaje: {str(e)}")
             return False
 
-    def obtener_tecnologias(nombre_archivo):
-        if '(' in nombre_archivo and ')' in nombre_archivo:
-            tech_part = nombre_archivo.split('(')[-1].split(')')[0]
-            return tech_part.replace('-', ' + ')
-        return ""
-
     def procesar_fotos_antenas(self, tss_instance):
-        """Procesa las fotos de antenas para una instancia TSS"""
+        """Procesa las fotos de antenas para una instancia TSS. False si la búsqueda falló"""
         try:
             print("\n=== PROCESANDO FOTOS DE ANTENAS ===")
 
@@ -600,223 +739,192 @@ class TSSBatchProcessor:
             proyecto_folder = os.path.join("resultados", f"{tss_instance.name}_{tss_instance.id}")
             os.makedirs(proyecto_folder, exist_ok=True)
 
-            # Configuración de sectores y antenas
-            lista_sectores = ['a', 'b', 'c']
-            lista_antenas = [1, 2, 3, 4]
-
-            self.buscar_antenas_por_sectores(
-                tss_instance.file_path,
-                lista_sectores,
-                lista_antenas,
-                proyecto_folder
+            # Las antenas y sectores se descubren en la hoja de torres; las fotos
+            # quedan en el pool y se recogen en _recoger_imagenes
+            tss_instance.imagenes_pendientes.extend(
+                (futuro, foto) for foto, futuro in self.buscar_antenas_por_sectores(
+                    tss_instance.sesion,
+                    proyecto_folder
+                )
             )
+            return True
 
         except Exception as e:
             print(f"⚠️ Error procesando fotos de antenas: {str(e)}")
+            return False
 
-    def buscar_antenas_por_sectores(self, excel_path, lista_sectores, lista_antenas, output_folder):
-        """Versión adaptada del método original"""
+    def buscar_antenas_por_sectores(self, sesion, output_folder):
+        """
+        Versión adaptada del método original, usando el workbook de la sesión.
+        Las etiquetas "antena N sector X" se descubren con una sola regex sobre el
+        índice de la hoja, sin listas fijas de antenas ni sectores.
+        Devuelve [(foto, futuro)]: foto = {antena, sector, descripcion} y el futuro
+        del pool de imágenes con la ruta del archivo guardado y verificado.
+        """
         global frase_busqueda
-        wb = None
-        try:
-            wb = load_workbook(excel_path, data_only=True)
-
-            # Usar índice de hoja desde configuración
-            sheet_index = self._obtener_hoja_indice('tss', 'torres')
-            sheet = wb.worksheets[sheet_index]
-
-            imagenes_dict = {}
-            for img in sheet._images:
-                pos = img.anchor._from
-                excel_row = pos.row + 1
-                excel_col = pos.col + 1
-                imagenes_dict[(excel_row, excel_col)] = img
+        fotos = []
+        # Usar índice de hoja desde configuración
+        sheet_index = self._obtener_hoja_indice('tss', 'torres')
+        medios = sesion.medios
+
+        # Una sola pasada por la hoja y una sola regex para todas las etiquetas
+        indice = sesion.indice_texto(sheet_index)
+        comparaciones_previas = indice.comparaciones
+        etiquetas = etiquetas_antenas(indice)
+        antenas = sorted({e.antena for e in etiquetas})
+        print(f"\n📡 Etiquetas encontradas: {len(etiquetas)} en {len(antenas)} antenas")
+
+        # Índices espaciales de anclas (extensión completa) y combinadas, leídos del zip;
+        # los bytes solo se leen para las fotos encontradas
+        indice_imagenes = medios.indice_imagenes(sheet_index)
+        indice_combinados = medios.indice_combinados(sheet_index)
+
+        # Crear carpetas Antena_X dentro del proyecto
+        for antena in antenas:
+            folder_path = os.path.join(output_folder, f"Antena_{antena}")
+            os.makedirs(folder_path, exist_ok=True)
+
+        # Recorrer las etiquetas encontradas, sean cuantas sean las antenas y sectores
+        for antena, sector, target_cell in etiquetas:
+            try:
+                frase_busqueda = f"foto general de la antena {antena} sector {sector}"
+                print(f"\nProcesando: {frase_busqueda}")
+                descripcion_tecnica = None
+
+                celda_encontrada = f"{get_column_letter(target_cell.col)}{target_cell.fila}"
+                print(f"Texto encontrado en la celda: {celda_encontrada}")
+
+                # Extraer descripción técnica
+                texto_completo = target_cell.valor
+                if ":" in texto_completo:
+                    _, descripcion = texto_completo.split(":", 1)
+                    descripcion_tecnica = descripcion.strip()[:30]
+                    descripcion_tecnica = descripcion_tecnica.replace("/", "-").replace("\\", "-")
+
+                # Detectar celdas combinadas
+                encontrado = indice_combinados.contenedor(target_cell.fila, target_cell.col)
+                merged_range = encontrado.valor if encontrado else None
+
+                # Definir rango de búsqueda (filas sobre la etiqueta)
+                min_fila = max(1, target_cell.fila - OFFSET_BUSQUEDA)
+                max_fila = target_cell.fila - 1
+                start_col = merged_range.min_col if merged_range else target_cell.col
+                end_col = merged_range.max_col if merged_range else target_cell.col
+
+                # Imágenes que se solapan con el rango, la más cercana a la etiqueta primero
+                candidatas = indice_imagenes.cercanos(min_fila, start_col, max_fila, end_col,
+                                                      max_fila, start_col)
+                if len(candidatas) > 1:
+                    print(f"ℹ️ {len(candidatas)} imágenes candidatas, se prueba por cercanía")
+
+                imagen_encontrada = False
+                for candidata in candidatas:
+                    img = candidata.valor
+                    folder = os.path.join(output_folder, f"Antena_{antena}")
+
+                    # Nombre del archivo (la extensión sale del formato real de la imagen)
+                    if descripcion_tecnica:
+                        filename = f"Antena_{antena}_Sector_{sector}_({descripcion_tecnica})"
+                    else:
+                        filename = f"Antena_{antena}_Sector_{sector}"
 
-            merged_ranges = list(sheet.merged_cells.ranges)
+                    try:
+                        img_data = medios.leer_bytes(img)
+
+                        # Comprobar solo la cabecera aquí para elegir candidata; la escritura,
+                        # reducción y verificación completa se hacen en el pool
+                        with Image.open(io.BytesIO(img_data)):
+                            pass
+                        futuro = self.imagenes.enviar(img_data, os.path.join(folder, filename),
+                                                      sesion.cronometro, TAMANO_FOTO_ANTENA_CM,
+                                                      verificar=True)
+
+                        fotos.append(({
+                            'antena': antena,
+                            'sector': sector,
+                            'descripcion': descripcion_tecnica,
+                        }, futuro))
+                        imagen_encontrada = True
+                        break
 
-            # Crear carpetas Antena_X dentro del proyecto
-            for antena in lista_antenas:
-                folder_path = os.path.join(output_folder, f"Antena_{antena}")
-                os.makedirs(folder_path, exist_ok=True)
+                    except Exception as e:
+                        print(f"Error guardando imagen: {str(e)}")
 
-            # Buscar todas las combinaciones
-            for sector in lista_sectores:
-                for antena in lista_antenas:
-                    try:
-                        frase_busqueda = f"foto general de la antena {antena} sector {sector}"
-                        print(f"\nBuscando: {frase_busqueda}")
-
-                        # Buscar celda con texto
-                        target_cell = None
-                        descripcion_tecnica = None
-
-                        for row in sheet.iter_rows():
-                            for cell in row:
-                                if cell.value and frase_busqueda in str(cell.value).lower():
-                                    target_cell = cell
-                                    break
-                            if target_cell:
-                                celda_encontrada = f"{get_column_letter(target_cell.column)}{target_cell.row}"
-                                print(f"Texto encontrado en la celda: {celda_encontrada}")
-
-                                # Extraer descripción técnica
-                                texto_completo = str(target_cell.value)
-                                if ":" in texto_completo:
-                                    _, descripcion = texto_completo.split(":", 1)
-                                    descripcion_tecnica = descripcion.strip()[:30]
-                                    descripcion_tecnica = descripcion_tecnica.replace("/", "-").replace("\\", "-")
-                                break
-
-                        if not target_cell:
-                            print(f"No encontrado: {frase_busqueda}")
-                            continue
+                if not imagen_encontrada:
+                    print(f"¡Imagen no encontrada en el rango especificado!")
 
-                        # Detectar celdas combinadas
-                        merged_range = None
-                        for merged in merged_ranges:
-                            if (merged.min_row <= target_cell.row <= merged.max_row and
-                                    merged.min_col <= target_cell.column <= merged.max_col):
-                                merged_range = merged
-                                break
-
-                        # Definir rango de búsqueda
-                        rango_filas = range(max(1, target_cell.row - OFFSET_BUSQUEDA), target_cell.row)
-                        start_col = merged_range.min_col if merged_range else target_cell.column
-                        end_col = merged_range.max_col if merged_range else target_cell.column
-                        rango_columnas = range(start_col, end_col + 1)
-
-                        # Buscar imagen en el diccionario
-                        imagen_encontrada = False
-                        for fila in rango_filas:
-                            for col in rango_columnas:
-                                if (fila, col) in imagenes_dict:
-                                    img = imagenes_dict[(fila, col)]
-                                    folder = os.path.join(output_folder, f"Antena_{antena}")
-
-                                    # Nombre del archivo
-                                    if descripcion_tecnica:
-                                        filename = f"Antena_{antena}_Sector_{sector}_({descripcion_tecnica}).png"
-                                    else:
-                                        filename = f"Antena_{antena}_Sector_{sector}.png"
-                                    output_path = os.path.join(folder, filename)
-
-                                    try:
-                                        img_data = img._data()
-                                        with open(output_path, "wb") as f:
-                                            f.write(img_data)
-
-                                        # Verificar imagen
-                                        with Image.open(output_path) as img_pil:
-                                            img_pil.verify()
-
-                                        print(f"Imagen guardada en: {output_path}")
-                                        imagen_encontrada = True
-                                        break
-
-                                    except Exception as e:
-                                        print(f"Error guardando imagen: {str(e)}")
-
-                            if imagen_encontrada:
-                                break
-
-                        if not imagen_encontrada:
-                            print(f"¡Imagen no encontrada en el rango especificado!")
+            except Exception as e:
+                print(f"Error procesando {frase_busqueda}: {str(e)}")
+                continue
 
-                    except Exception as e:
-                        print(f"Error procesando {frase_busqueda}: {str(e)}")
-                        continue
-        finally:
-            if wb:
-                wb.close()
+        # Costo de búsqueda: una regex por texto distinto, sin importar cuántas combinaciones haya
+        comparaciones = indice.comparaciones - comparaciones_previas
+        sesion.cronometro.contar('comparaciones_busqueda_antenas', comparaciones)
+        print(f"\n🔎 Búsqueda de antenas: {indice.total_celdas} celdas indexadas una vez + {comparaciones} "
+              f"textos evaluados con una sola regex ({len(etiquetas)} etiquetas)")
 
+        return fotos
 
-    def _insertar_fotos_antenas(self, wb_sid, tss_instance):
+    def _insertar_fotos_antenas(self, wb_sid, tss_instance, geometria=None):
         """Inserta las fotos de las antenas generando títulos individuales"""
         try:
             print("\n=== INSERTANDO FOTOS DE ANTENAS ===")
-            resultados_dir = os.path.abspath(tss_instance.resultados_dir)
-
-            if not os.path.exists(resultados_dir):
-                print(f"❌ Carpeta no encontrada: {resultados_dir}")
+            if not tss_instance.tecnologias.numeros_antenas():
+                print("ℹ️ El TSS no tiene fotos de antenas")
                 return {}
 
-            # Obtener hoja de trabajo
-            sheet = wb_sid.sheets[self._obtener_hoja_indice('sid', 'antenas')]
+            # Obtener hoja de trabajo y su geometría (la de la plantilla si no se pegaron rangos en ella)
+            sheet_index = self._obtener_hoja_indice('sid', 'antenas')
+            sheet = wb_sid.sheets[sheet_index]
+            geometria = geometria or self.geometrias.hoja(sheet_index)
 
-            # Configuración de imágenes
-            width = 9 * 28.35  # 10 cm a puntos
-            height = 14 * 28.35  # 15 cm a puntos
+            # Configuración de imágenes (cm a puntos)
+            width = TAMANO_FOTO_ANTENA_CM[0] * PUNTOS_POR_CM
+            height = TAMANO_FOTO_ANTENA_CM[1] * PUNTOS_POR_CM
 
-            posiciones_base = {
-                1: ("B20", "G20", "L20"),
-                2: ("C74", "H74", "M74"),
-                3: ("C124", "H124", "M124"),
-                4: ("C174", "H174", "M174")
-            }
+            # Tabla de posiciones según las antenas y sectores del manifiesto de tecnologías
+            manifiesto = tss_instance.tecnologias
+            posiciones = tabla_posiciones_antenas(manifiesto.numeros_antenas(), manifiesto.todos_los_sectores())
 
             titulos_antenas = {}
             antenas_con_sectores_diferentes = []
 
-            for antena in range(1, 5):
-                antena_folder = os.path.join(resultados_dir, f"Antena_{antena}")
-                if not os.path.exists(antena_folder):
-                    continue
-
+            for antena, posiciones_sector in posiciones.items():
                 print(f"\n📡 Procesando Antena {antena}")
-                tecnologias_por_sector = []
-                tecnologias_totales = set()
-
-                # Procesar cada sector
-                for sector_idx, sector in enumerate(['a', 'b', 'c']):
-                    celda = posiciones_base[antena][sector_idx]
-                    patron = os.path.join(antena_folder, f"Antena_{antena}_Sector_{sector}*.png")
-
-                    sector_tecnologias = set()
-
-                    for img_path in glob.glob(patron):
-                        # Extraer tecnologías del nombre de archivo
-                        if '(' in img_path and ')' in img_path:
-                            tech_part = img_path.split('(')[1].split(')')[0]
-                            for tech in [t.strip() for t in tech_part.replace('-', ',').split(',') if t.strip()]:
-                                sector_tecnologias.add(tech)
-                                tecnologias_totales.add(tech)
-
-                        # Insertar imagen
-                        try:
-                            with Image.open(img_path) as img:
-                                img.verify()
-                                rango = sheet.range(celda)
-                                picture = sheet.pictures.add(
-                                    img_path,
-                                    left=rango.left + (rango.width - width) / 2,
-                                    top=rango.top + (rango.height - height) / 2,
-                                    width=width,
-                                    height=height
-                                )
-                                print(f"✅ Insertada {os.path.basename(img_path)} en {celda}")
-                        except Exception as e:
-                            print(f"❌ Error con {img_path}: {str(e)}")
-                    tecnologias_por_sector.append(sector_tecnologias)
-
-                sectores_diferentes = False
-                if len(tecnologias_por_sector) > 1:
-                    primer_sector = tecnologias_por_sector[0]
-                    for sector_tech in tecnologias_por_sector[1:]:
-                        if sector_tech != primer_sector:
-                            sectores_diferentes = True
-                            break
-
-                if sectores_diferentes:
+
+                # Procesar cada sector presente en el TSS
+                for sector, celda in posiciones_sector.items():
+                    entrada = manifiesto.sector(antena, sector)
+                    if not entrada:
+                        continue
+                    img_path = os.path.abspath(entrada['imagen'])
+
+                    # Insertar imagen (ya verificada al extraerla; la tabla de metadatos confirma que existe)
+                    try:
+                        if not tss_instance.metadatos_imagen(img_path):
+                            continue
+                        left, top = rectangulo_centrado(geometria, celda, width, height)
+                        sheet.pictures.add(
+                            img_path,
+                            left=left,
+                            top=top,
+                            width=width,
+                            height=height
+                        )
+                        print(f"✅ Insertada {os.path.basename(img_path)} en {celda}")
+                    except Exception as e:
+                        print(f"❌ Error con {img_path}: {str(e)}")
+
+                if manifiesto.sectores_diferentes(antena):
                     print(f"🔴 Antena {antena} tiene sectores con tecnologías diferentes")
                     antenas_con_sectores_diferentes.append(antena)
                 else:
                     print(f"🟢 Antena {antena} tiene sectores con las mismas tecnologías")
 
                 # Generar título para esta antena
-                if tecnologias_totales:
-                    tech_list = sorted(tecnologias_totales)
-                    titulo = " + ".join(tech_list[:-1] + [tech_list[-1]] if len(tech_list) > 1 else tech_list)
-                    titulos_antenas[antena] = titulo[0] if isinstance(titulo, list) else titulo
+                tecnologias = manifiesto.tecnologias_antena(antena)
+                if tecnologias:
+                    titulos_antenas[antena] = " + ".join(tecnologias)
                     print(f"🔹 Tecnologías Antena {antena}: {titulos_antenas[antena]}")
                 else:
                     titulos_antenas[antena] = "Sin tecnologías"
@@ -824,7 +932,6 @@ class TSSBatchProcessor:
             if antenas_con_sectores_diferentes:
                 print("\n=== ANTENAS CON SECTORES DIFERENTES DETECTADAS ===")
                 print(f"Antenas a actualizar: {', '.join(map(str, antenas_con_sectores_diferentes))}")
-                self._actualizar_sectores_con_tecnologias(wb_sid, tss_instance)
 
             return titulos_antenas
 
@@ -832,20 +939,6 @@ class TSSBatchProcessor:
             print(f"❌ Error: {str(e)}")
             return {}
 
-    # def _actualizar_sectores_con_tecnologias(self, wb_sid, tss_instance):
-    #     """Actualiza los sectores con sus tecnologías específicas cuando son diferentes"""
-    #     try:
-    #         print("\n=== BUSCANDO SECTORES PARA ACTUALIZAR ===")
-    #         sheet = wb_sid.sheets[self._obtener_hoja_indice('sid', 'antenas')]
-    #
-    #         print("🔍 Buscando sectores en la hoja...")
-    #
-    #         # Aquí iría el resto de la lógica para actualizar los sectores
-    #         # que ya tenías implementada en tu método original
-    #
-    #     except Exception as e:
-    #         print(f"❌ Error al actualizar sectores: {str(e)}")
-
     def verificar_posicion_imagenes(sheet, celda_objetivo):
         """Muestra información de posición de todas las imágenes en la hoja"""
         print(f"\n🔍 Verificando imágenes en hoja '{sheet.name}':")
@@ -875,350 +968,35 @@ class TSSBatchProcessor:
                 else:
                     print(f"⚠️ Desplazada! Diferencia: {abs(col - openpyxl.utils.column_index_from_string(celda_objetivo[0]))} columnas, "
                           f"{abs(row - int(celda_objetivo[1:]))} filas")
-    def _actualizar_titulos_antenas(self, wb_sid, tss_instance):
-        """Actualiza los títulos de antenas en el SID con:
-        - Código de sitio (ID) en los TextBoxes con 'XXX'
-        - Tecnologías en los TextBoxes con 'TECH{num}'
-
-        Args:
-            wb_sid: Workbook de Excel (SID)
-            tss_instance: Instancia del TSS con los datos a actualizar
-        """
-        try:
-            print("\n" + "="*50)
-            print(" ACTUALIZANDO TÍTULOS DE ANTENAS ")
-            print("="*50)
-
-            # 1. Configuración inicial
-            sheet = self._obtener_hoja_antenas(wb_sid)
-            print("Nombre de la hoja "+ sheet.name)
-            codigo_sitio = tss_instance.id.upper()
 
-            # 2. Procesar cada grupo de antenas
-            for grupo in self._obtener_grupos_antenas(sheet):
-                self._procesar_grupo_antenas(grupo, codigo_sitio, tss_instance)
 
-            print("\n" + "="*50)
-            print(" RESUMEN DE ACTUALIZACIONES ")
-            print("="*50)
-            self._imprimir_resumen_actualizaciones(sheet)
-
-        except Exception as e:
-            print(f"\n❌ ERROR CRÍTICO: {str(e)}")
-            traceback.print_exc()
-
-    def _obtener_hoja_antenas(self, wb_sid):
-        """Obtiene la hoja de antenas del SID"""
-        try:
-            indice = self._obtener_hoja_indice('sid', 'antenas')
-            return wb_sid.sheets[indice]
-        except Exception as e:
-            raise Exception(f"No se pudo obtener la hoja de antenas: {str(e)}")
-
-    def _obtener_grupos_antenas(self, sheet):
-        """Generador que devuelve cada grupo de antenas en la hoja"""
-        for shape in sheet.shapes:
-            if shape.type == 'group':
-                yield shape
-
-    def _procesar_grupo_antenas(self, grupo, codigo_sitio, tss_instance):
-        """Procesa un grupo de antenas modificando solo TECH{num}"""
-        try:
-            # 1. Extraer número de antena
-            num_antena = self._extraer_num_antena(grupo)
-            if num_antena is None:
-                print("✖ No se encontró número de antena")
-                return
-
-            print(f"🔧 Procesando antena {num_antena}")
-
-            # 2. Buscar y modificar solo los TextBoxes relevantes
-            for item in grupo.api.GroupItems:
-                if item.Type == 17:  # Solo TextBoxes
-                    text_range = item.TextFrame2.TextRange
-                    original_text = text_range.Text
-                    modified = False
-
-                    # Reemplazar XXX por código de sitio (si existe)
-                    if "XXX" in original_text:
-                        new_text = original_text.replace("XXX", codigo_sitio)
-                        text_range.Text = new_text
-                        modified = True
-                        print(f"✓ Código actualizado en antena {num_antena}")
-
-                    # Buscar el patrón exacto TECH{num}
-                    tech_pattern = f"TECH{num_antena}"
-                    if tech_pattern in new_text:
-                        folder_antena = os.path.join(tss_instance.resultados_dir, f"Antena_{num_antena}")
-                        if os.path.exists(folder_antena):
-                            tecnologias = self._extraer_tecnologias(folder_antena)
-                            if tecnologias:
-                                # Reemplazo selectivo manteniendo saltos de línea
-                                tech_index = new_text.find(tech_pattern)
-                                before_tech = new_text[:tech_index]
-                                after_tech = new_text[tech_index + len(tech_pattern):]
-
-                                new_text = f"{before_tech}{' + '.join(tecnologias)}{after_tech}"
-
-                                # Aplicar formato
-                                text_range.Text = new_text
-                                text_range.Font.Fill.ForeColor.RGB = (160 << 16) | (75 << 8) | 1
-                                text_range.Font.Bold = True
-                                print(f"✓ Tecnologías actualizadas: {tech_pattern} → {' + '.join(tecnologias)}")
-
-                if not modified:
-                        print(f"ℹ️ TextBox sin cambios: {original_text[:30]}...")
-
-        except Exception as e:
-            print(f"⚠️ Error crítico: {str(e)}")
-            raise  # Re-lanza la excepción para debugging
-
-    def _extraer_tecnologias(self, folder_path):
-        """Extrae tecnologías de nombres de archivo"""
-        tecnologias = set()
-        for filename in os.listdir(folder_path):
-            if filename.endswith('.png') and '(' in filename:
-                tech_part = filename.split('(')[1].split(')')[0]
-                tecnologias.update(t.strip() for t in re.split(r'[, \-+]', tech_part) if t.strip())
-        return sorted(tecnologias)
-
-    def _actualizar_textbox_tecnologias(self, textbox, tecnologias):
-        """Formatea el TextBox de tecnologías"""
-        texto = " + ".join(tecnologias)
-        text_range = textbox.TextFrame2.TextRange
-        text_range.Text = texto
-        text_range.Font.Fill.ForeColor.RGB = (160 << 16) | (75 << 8) | 1  # RGB(1, 75, 160) → BGR(160, 75, 1)
-        text_range.Font.Bold = True
-
-    def _extraer_num_antena(self, grupo):
-        """Extrae el número de antena del TextBox TECH - Versión robusta"""
-        try:
-            if not hasattr(grupo, 'api'):
-                print("⚠️ El objeto grupo no tiene atributo 'api'")
-                return None
-
-            group_items = grupo.api.GroupItems
-            item_count = group_items.Count
-
-            print(f"🔍 Analizando grupo con {item_count} items...")
-
-            for i in range(1, item_count + 1):
-                try:
-                    item = group_items.Item(i)
-
-                    if item.Type == 17:  # Tipo TextBox
-                        text_content = str(item.TextFrame2.TextRange.Text).strip()
-                        print(f"📄 Texto encontrado: '{text_content}'")
-
-                        # Buscar TECH seguido de números (ej. TECH1, TECH 2, TECH-3)
-                        tech_index = text_content.upper().find("TECH")
-                        if tech_index >= 0:
-                            # Tomar la parte después de TECH
-                            num_part = text_content[tech_index + 4:].strip()
-                            # Extraer solo los dígitos
-                            num_str = ''.join(filter(str.isdigit, num_part))
-
-                            if num_str:
-                                print(f"✅ Número extraído: {num_str}")
-                                return int(num_str)
-                            else:
-                                print("ℹ️ TECH encontrado pero sin número asociado")
-
-                except Exception as e:
-                    print(f"⚠️ Error procesando item {i}: {str(e)}")
-                    continue
-
-            print("🔍 No se encontró ningún item con 'TECH' y número válido")
-            return None
-
-        except Exception as e:
-            print(f"❌ Error inesperado al procesar grupo: {str(e)}")
-            return None
-    def _clasificar_componentes(self, grupo):
-        """Clasifica los TextBoxes del grupo en códigos y tecnologías"""
-        componentes = {
-            'codigos': [],
-            'tecnologias': []
-        }
-
-        for item in grupo.api.GroupItems:
-            if item.Type == 17:  # Es TextBox
-                texto = item.TextFrame2.TextRange.Text.strip()
-                print("Se pillo textbox "+item)
-                if "XXX" in texto:
-                    componentes['codigos'].append(item)
-                elif "TECH" in texto:
-                    componentes['tecnologias'].append(item)
-
-        return componentes
-
-    def _actualizar_codigos(self, textboxes, codigo):
-        """Actualiza todos los TextBoxes de código con el ID del sitio"""
-        for tb in textboxes:
-            try:
-                texto_original = tb.TextFrame2.TextRange.Text
-                nuevo_texto = texto_original.replace("XXX", codigo)
-                tb.TextFrame2.TextRange.Text = nuevo_texto
-                print(f"✓ Código actualizado en {tb.Name}")
-            except Exception as e:
-                print(f"⚠️ Error actualizando código en {tb.Name}: {str(e)}")
-
-    def _actualizar_tecnologias(self, textboxes, tss_instance):
-        """Actualiza los TextBoxes de tecnología con datos de las fotos"""
-        for tb in textboxes:
-            try:
-                # Extraer número de antena del nombre (ej: "TECH1" -> 1)
-                num_antena = int(re.search(r"TECH(\d+)", tb.Name).group(1))
-
-                # Obtener tecnologías de las fotos
-                folder_antena = os.path.join(tss_instance.resultados_dir, f"Antena_{num_antena}")
-                tecnologias = self._extraer_tecnologias(folder_antena)
-
-                if tecnologias:
-                    self._aplicar_formato_tecnologias(tb, tecnologias)
-                    print(f"✓ Tecnologías actualizadas en Antena {num_antena}: {', '.join(tecnologias)}")
-                else:
-                    print(f"⚠️ Antena {num_antena}: No se encontraron tecnologías")
-
-            except Exception as e:
-                print(f"⚠️ Error actualizando tecnologías en {tb.Name}: {str(e)}")
-
-    def _extraer_tecnologias(self, folder_path):
-        """Extrae tecnologías únicas de los nombres de archivo PNG"""
-        tecnologias = set()
-
-        if os.path.exists(folder_path):
-            for filename in os.listdir(folder_path):
-                if filename.endswith('.png') and '(' in filename:
-                    # Extraer texto entre paréntesis
-                    tech_str = filename.split('(')[1].split(')')[0]
-                    # Dividir por separadores comunes
-                    for tech in re.split(r'[,\-+]', tech_str):
-                        tech_limpia = tech.strip()
-                        if tech_limpia:
-                            tecnologias.add(tech_limpia)
-
-        return sorted(tecnologias)  # Orden alfabético
-
-    def _aplicar_formato_tecnologias(self, textbox, tecnologias):
-        """Aplica formato al TextBox de tecnologías"""
-        texto = " + ".join(tecnologias)
-        text_range = textbox.TextFrame2.TextRange
-        text_range.Text = texto
-
-        # Formato azul corporativo
-        # text_range.Font.Fill.ForeColor.RGB = 0x0170c0
-        # text_range.Font.Bold = True
-        # text_range.Font.Size = 10  # Tamaño consistente
-
-    def _imprimir_resumen_actualizaciones(self, sheet):
-        """Muestra resumen de cambios realizados"""
-        for shape in sheet.shapes:
-            if shape.type == 'group':
-                print(f"\nGrupo: {shape.name}")
-                for item in shape.api.GroupItems:
-                    if item.Type == 17:  # TextBox
-                        texto = item.TextFrame2.TextRange.Text.strip()
-                        print(f"  ├─ {item.Name}: {texto[:50]}...")
-    def _extraer_tecnologias_de_fotos(self, folder_path):
-        """Extrae tecnologías de los nombres de archivo en la carpeta de antena"""
-        tecnologias = set()
-        if os.path.exists(folder_path):
-            for filename in os.listdir(folder_path):
-                if filename.endswith('.png') and '(' in filename and ')' in filename:
-                    tech_part = filename.split('(')[1].split(')')[0]
-                    tecnologias.update(t.strip() for t in tech_part.replace('-', ',').split(',') if t.strip())
-        return tecnologias
-    # Métodos auxiliares (ya existentes)
-    def _obtener_textboxes_antenas(self, sheet):
-        """Recopila TextBox de antenas en grupos (8.1, 8.2, etc.)"""
-        textboxes = {}
-        for shape in sheet.shapes:
-            if shape.type == 'group':
-                try:
-                    for sub_shape in shape.api.GroupItems:
-                        if sub_shape.Type == 17:  # TextBox
-                            texto = sub_shape.TextFrame2.TextRange.Text
-                            match = re.search(r"8\.(\d+)", texto)
-                            if match:
-                                textboxes[int(match.group(1))] = sub_shape
-                except Exception as e:
-                    print(f"⚠️ Error en grupo {shape.name}: {str(e)}")
-        return textboxes
-
-    def _imprimir_textboxes_actualizados(self, sheet):
-        """Imprime el contenido de todos los TextBox tipo 17 en grupos"""
-        for shape in sheet.shapes:
-            if shape.type == 'group':
-                try:
-                    print(f"\n🔍 Grupo: {shape.name}")
-                    for i, sub_shape in enumerate(shape.api.GroupItems):
-                        if sub_shape.Type == 17:  # TextBox
-                            texto = sub_shape.TextFrame2.TextRange.Text.strip()
-                            print(f"  📝 TextBox {i + 1}:")
-                            print(f"     {texto}")
-                except Exception as e:
-                    print(f"⚠️ Error leyendo grupo {shape.name}: {str(e)}")
-
-    def _actualizar_sectores_con_tecnologias(self, wb_sid, tss_instance):
-        """Actualiza los TextBox tipo 1 (sectores) con tecnologías correspondientes"""
-        try:
-            print("\n=== ACTUALIZANDO SECTORES CON TECNOLOGÍAS ===")
-            sheet = wb_sid.sheets[self._obtener_hoja_indice('sid', 'antenas')]
-
-            # Procesar cada grupo en la hoja
-            for shape in sheet.shapes:
-                if shape.type == 'group':
-                    try:
-                        # Buscar TextBox de sectores (tipo 1) en el grupo
-                        sectores = []
-                        for sub_shape in shape.api.GroupItems:
-                            if sub_shape.Type == 1:  # TextBox tipo 1
-                                texto = sub_shape.TextFrame2.TextRange.Text.strip()
-                                if texto.startswith("SECTOR"):
-                                    sectores.append(sub_shape)
-
-                        # Si encontramos los 3 sectores
-                        if len(sectores) == 3:
-                            # Extraer número de antena del grupo (ej: "Group 10" -> antena 1)
-                            try:
-                                antena_num = int(re.search(r'\d+', shape.name).group()) % 10
-                                if antena_num == 0:
-                                    antena_num = 10
-                            except:
-                                continue
-
-                            # Procesar cada sector
-                            for i, sector_shape in enumerate(sectores, 1):
-                                sector_folder = os.path.join(tss_instance.resultados_dir, f"Antena_{antena_num}")
-                                patron = os.path.join(sector_folder, f"Antena_{antena_num}_Sector_{i}*.png")
-
-                                # Extraer tecnologías de los archivos
-                                tecnologias = set()
-                                for img_path in glob.glob(patron):
-                                    if '(' in img_path and ')' in img_path:
-                                        tech_part = img_path.split('(')[1].split(')')[0]
-                                        tecnologias.update(
-                                            t.strip() for t in tech_part.replace('-', ',').split(',') if t.strip())
-
-                                # Actualizar texto del sector
-                                if tecnologias:
-                                    texto_original = sector_shape.TextFrame2.TextRange.Text.strip()
-                                    nuevo_texto = f"{texto_original}\n({' + '.join(sorted(tecnologias))})"
-                                    sector_shape.TextFrame2.TextRange.Text = nuevo_texto
-                                    print(f"✅ Antena {antena_num} - Sector {i}: {nuevo_texto}")
-
-                    except Exception as e:
-                        print(f"⚠️ Error procesando grupo {shape.name}: {str(e)}")
-
-        except Exception as e:
-            print(f"❌ Error general: {str(e)}")
 # Uso del sistema
 if __name__ == "__main__":
-    processor = TSSBatchProcessor(config_path)
+    parser = argparse.ArgumentParser(description="Genera SIDs a partir de los TSS de una carpeta")
+    parser.add_argument("--config", default=config_path, help="Archivo de configuración JSON")
+    parser.add_argument("--tss", default=carpet_excels, help="Carpeta con los TSS")
+    parser.add_argument("--no-cache", action="store_true", help="Ignora las caches de extracción y de rangos")
+    parser.add_argument("--cache-max-mb", type=float, default=CACHE_MAX_MB,
+                        help="Tamaño máximo de la cache de extracción en MB")
+    parser.add_argument("--cache-rangos-max-mb", type=float, default=CACHE_RANGOS_MAX_MB,
+                        help="Tamaño máximo de la cache de rangos dibujados en MB (aparte de la de extracción)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Solo procesa TSS nuevos/cambiados o cuyo SID falta (según el manifiesto)")
+    parser.add_argument("--captura", choices=BACKENDS_CAPTURA,
+                        help="Backend de captura de rangos (por defecto 'captura_rangos.backend' del config)")
+    parser.add_argument("--grabar-capturas", action="store_true",
+                        help="Guarda las capturas de rangos para reproducirlas con --captura replay")
+    parser.add_argument("--escritor", choices=BACKENDS_ESCRITURA,
+                        help="Escritor del SID (por defecto 'escritura_sid.backend' del config)")
+    args = parser.parse_args()
+
+    processor = TSSBatchProcessor(args.config, usar_cache=not args.no_cache, cache_max_mb=args.cache_max_mb,
+                                  incremental=args.incremental, captura=args.captura,
+                                  grabar_capturas=args.grabar_capturas, escritor=args.escritor,
+                                  cache_rangos_max_mb=args.cache_rangos_max_mb)
 
     # Procesar todos los TSS encontrados
-    processor.procesar_lote("TSS")
+    processor.procesar_lote(args.tss)
 
     # Alternativa para procesar uno específico
     # tss_instance = TSSInstance("ruta/especifica.xlsx")